@@ -1,20 +1,22 @@
 import mediapipe as mp
 import cv2
 import numpy as np
-import torch
+from .detection import detector
+from .image_buffer import DecodedImage
+from .landmarks import pose_landmarks
+from .model_registry import registry
+from .timing import stage, timed
+
+# Bump whenever the rules or thresholds change, cached results are keyed by it
+RULES_VERSION = 1
 
 class AdvancedPostureAnalyzer:
     def __init__(self):
         # Initialize MediaPipe Pose
         self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=True,
-            model_complexity=2,
-            min_detection_confidence=0.6,
-            min_tracking_confidence=0.6
-        )
-        # Initialize YOLO model for chair detection
-        self.chair_model = torch.hub.load('ultralytics/yolov5', 'yolov5s', pretrained=True)
+        # Pose graph and YOLO chair detector are shared through the model registry
+        registry.get('pose_complexity2')
+        registry.get(detector.model_name)
         
         # Define thresholds
         self.DISTANCE_THRESHOLDS = {
@@ -27,18 +29,15 @@ class AdvancedPostureAnalyzer:
         }
         self.SIDE_VIEW_THRESHOLD = 100  # pixels for shoulder width
 
-    def detect_chair(self, image):
+    def detect_chair(self, image, detections=None):
         """
-        Enhanced chair detection using YOLO
+        Enhanced chair detection using YOLO, or the image's detections from an earlier batched pass
         """
-        results = self.chair_model(image)
-        chairs = results.pandas().xyxy[0][results.pandas().xyxy[0]['name'] == 'chair']
+        # Get the chair with highest confidence
+        best_chair = detector.best(image, ['chair'], detections=detections)
         
-        if chairs.empty:
+        if best_chair is None:
             return None
-            
-        # Get the chair with highest confidence
-        best_chair = chairs.loc[chairs['confidence'].idxmax()]
         
         chair_bbox = {
             'x1': int(best_chair['xmin']),
@@ -50,30 +49,26 @@ class AdvancedPostureAnalyzer:
         
         return chair_bbox
 
-    def detect_body_landmarks(self, image):
+    def detect_body_landmarks(self, image, landmarks=None):
         """
-        Enhanced body landmark detection
+        Enhanced body landmark detection, reusing landmarks from an earlier pose pass when given
         """
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        results = self.pose.process(image_rgb)
+        image = DecodedImage.coerce(image)
+        if landmarks is None:
+            landmarks = pose_landmarks(image)
         
-        if not results.pose_landmarks:
+        if landmarks is None:
             return None
             
         h, w = image.shape[:2]
-        landmarks = results.pose_landmarks.landmark
+        scale = np.array([w, h])
         
         body_points = {
-            'nose': np.array([landmarks[self.mp_pose.PoseLandmark.NOSE].x * w,
-                            landmarks[self.mp_pose.PoseLandmark.NOSE].y * h]),
-            'left_shoulder': np.array([landmarks[self.mp_pose.PoseLandmark.LEFT_SHOULDER].x * w,
-                                     landmarks[self.mp_pose.PoseLandmark.LEFT_SHOULDER].y * h]),
-            'right_shoulder': np.array([landmarks[self.mp_pose.PoseLandmark.RIGHT_SHOULDER].x * w,
-                                      landmarks[self.mp_pose.PoseLandmark.RIGHT_SHOULDER].y * h]),
-            'left_hip': np.array([landmarks[self.mp_pose.PoseLandmark.LEFT_HIP].x * w,
-                                landmarks[self.mp_pose.PoseLandmark.LEFT_HIP].y * h]),
-            'right_hip': np.array([landmarks[self.mp_pose.PoseLandmark.RIGHT_HIP].x * w,
-                                 landmarks[self.mp_pose.PoseLandmark.RIGHT_HIP].y * h])
+            'nose': landmarks[self.mp_pose.PoseLandmark.NOSE, :2] * scale,
+            'left_shoulder': landmarks[self.mp_pose.PoseLandmark.LEFT_SHOULDER, :2] * scale,
+            'right_shoulder': landmarks[self.mp_pose.PoseLandmark.RIGHT_SHOULDER, :2] * scale,
+            'left_hip': landmarks[self.mp_pose.PoseLandmark.LEFT_HIP, :2] * scale,
+            'right_hip': landmarks[self.mp_pose.PoseLandmark.RIGHT_HIP, :2] * scale
         }
         
         return body_points
@@ -135,23 +130,27 @@ class AdvancedPostureAnalyzer:
             'is_side_view': bool(is_side_view)   # Convert to native Python bool
         }
 
-    def analyze_image(self, image):
+    def analyze_image(self, image, landmarks=None, detections=None):
         """
-        Complete posture analysis
+        Complete posture analysis, optionally on (33, 3) pose landmarks and YOLO detections already computed for the image
         """
         try:
+            # Decode once, chair detection and pose share the pixel buffer
+            image = DecodedImage.coerce(image)
+            
             # Detect chair
-            chair_bbox = self.detect_chair(image)
+            chair_bbox = self.detect_chair(image, detections)
             if chair_bbox is None:
                 return None, "No chair detected in image", None, None
             
             # Detect body landmarks
-            body_points = self.detect_body_landmarks(image)
+            body_points = self.detect_body_landmarks(image, landmarks)
             if body_points is None:
                 return None, "Could not detect body landmarks", None, None
                 
             # Calculate metrics
-            metrics = self.calculate_posture_metrics(body_points, chair_bbox)
+            with stage('rules'):
+                metrics = self.calculate_posture_metrics(body_points, chair_bbox)
             
             # Analyze posture
             status = []
@@ -178,12 +177,13 @@ class AdvancedPostureAnalyzer:
             print(f"Error in analyze_image: {str(e)}")
             return None, f"Error analyzing image: {str(e)}", None, None
 
+    @timed('annotate')
     def visualize_results(self, image, body_points, chair_bbox, metrics):
         """
         Create visualization of analysis
         """
         try:
-            vis_image = image.copy()
+            vis_image = DecodedImage.coerce(image).bgr.copy()
             
             # Draw chair bbox
             cv2.rectangle(vis_image, 
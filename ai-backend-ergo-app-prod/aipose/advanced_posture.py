@@ -1,23 +1,17 @@
 import mediapipe as mp
 import cv2
 import numpy as np
-import torch
-import os
-from django.conf import settings
+from .detection import detector
+from .image_buffer import DecodedImage
+from .model_registry import registry
 
 class AdvancedPostureAnalyzer:
     def __init__(self):
         # Initialize MediaPipe Pose
         self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(
-            static_image_mode=True,
-            model_complexity=2,
-            min_detection_confidence=0.6,
-            min_tracking_confidence=0.6
-        )
-        # Initialize YOLO model for chair detection
-        model_path = os.path.join(settings.BASE_DIR, 'models', 'yolov5')
-        self.chair_model = torch.hub.load('ultralytics/yolov5', 'yolov5s', pretrained=True)
+        # Pose graph and YOLO chair detector are shared through the model registry
+        registry.get('pose_complexity2')
+        registry.get(detector.model_name)
         
         # Define thresholds
         self.DISTANCE_THRESHOLDS = {
@@ -34,14 +28,11 @@ class AdvancedPostureAnalyzer:
         """
         Enhanced chair detection using YOLO
         """
-        results = self.chair_model(image)
-        chairs = results.pandas().xyxy[0][results.pandas().xyxy[0]['name'] == 'chair']
+        # Get the chair with highest confidence
+        best_chair = detector.best(image, ['chair'])
         
-        if chairs.empty:
+        if best_chair is None:
             return None
-            
-        # Get the chair with highest confidence
-        best_chair = chairs.loc[chairs['confidence'].idxmax()]
         
         chair_bbox = {
             'x1': int(best_chair['xmin']),
@@ -57,8 +48,9 @@ class AdvancedPostureAnalyzer:
         """
         Enhanced body landmark detection
         """
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        results = self.pose.process(image_rgb)
+        image = DecodedImage.coerce(image)
+        with registry.checkout('pose_complexity2') as pose:
+            results = pose.process(image.inference_rgb)
         
         if not results.pose_landmarks:
             return None
@@ -130,6 +122,9 @@ class AdvancedPostureAnalyzer:
         """
         Complete posture analysis
         """
+        # Decode once, chair detection and pose share the pixel buffer
+        image = DecodedImage.coerce(image)
+        
         # Detect chair
         chair_bbox = self.detect_chair(image)
         if chair_bbox is None:
@@ -168,7 +163,7 @@ class AdvancedPostureAnalyzer:
         """
         Create visualization of analysis
         """
-        vis_image = image.copy()
+        vis_image = DecodedImage.coerce(image).bgr.copy()
         
         # Draw chair bbox
         cv2.rectangle(vis_image, 
@@ -0,0 +1,103 @@
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+
+class PooledInstance:
+    """One model or analyzer instance owned by a pool, with its own lock."""
+
+    def __init__(self, instance):
+        self.instance = instance
+        self.lock = threading.Lock()
+
+
+class AnalyzerPool:
+    """Bounded pool of interchangeable model or analyzer instances.
+
+    Instances are created lazily, up to `size`, the first time every existing
+    one is busy. A caller borrows an instance with checkout() and gets it back
+    into the pool when the block exits, so N threads can run N inferences at
+    once without ever sharing a MediaPipe graph.
+    """
+
+    def __init__(self, name, factory, size):
+        """Defines the parameters to be used in the operations for this class.
+
+        Args:
+            name (String): Name used in logs
+            factory (Callable): Zero-argument function returning a new instance
+            size (int): Upper bound on live instances
+        """
+        self.name = name
+        self.factory = factory
+        self.size = max(1, int(size))
+        self._idle = queue.LifoQueue()
+        self._instances = []
+        self._create_lock = threading.Lock()
+        self.load_time = None
+
+    def __len__(self):
+        return len(self._instances)
+
+    def _create(self):
+        """Loads a new instance if the pool is below its size, returns None otherwise."""
+        with self._create_lock:
+            if len(self._instances) >= self.size:
+                return None
+            start = time.perf_counter()
+            pooled = PooledInstance(self.factory())
+            elapsed = time.perf_counter() - start
+            if self.load_time is None:
+                self.load_time = elapsed
+            self._instances.append(pooled)
+            logger.info(f"Loaded '{self.name}' instance {len(self._instances)}/{self.size} in {elapsed:.2f}s")
+            return pooled
+
+    def first(self):
+        """Returns the first instance, loading it if needed (for warm-up, not for inference)."""
+        if not self._instances:
+            pooled = self._create()
+            if pooled is not None:
+                self._idle.put(pooled)
+        return self._instances[0].instance
+
+    def fill(self):
+        """Loads instances until the pool is full."""
+        while len(self._instances) < self.size:
+            pooled = self._create()
+            if pooled is None:
+                break
+            self._idle.put(pooled)
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """Borrows an instance for exclusive use by the calling thread.
+
+        Args:
+            timeout (float): Seconds to wait for a free instance, None waits forever
+
+        Raises:
+            TimeoutError: Triggered when no instance is returned within the timeout
+
+        Yields:
+            object: An instance nobody else holds until the block exits
+        """
+        try:
+            pooled = self._idle.get_nowait()
+        except queue.Empty:
+            pooled = self._create()
+            if pooled is None:
+                try:
+                    pooled = self._idle.get(timeout=timeout)
+                except queue.Empty:
+                    raise TimeoutError(f"No '{self.name}' instance free after {timeout}s")
+        try:
+            with pooled.lock:
+                yield pooled.instance
+        finally:
+            self._idle.put(pooled)
@@ -0,0 +1,326 @@
+import logging
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseNotModified
+from django.views import View
+from rest_framework import status
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .assessment import ASSESSMENT_CHECKS, run_assessment
+from .batch import BATCH_CHECKS, run_batch
+from .image_buffer import DecodedImage
+from .jobs import JOB_GATES, JOB_KINDS, JOB_OPTIONS, get_job, submit
+from .llm import analyze_workspace
+from .media_store import DEFAULT_QUALITY, THUMBNAIL_DIM, render
+from .quality_gate import gate
+from .report import get_report
+from .timing import render_metrics, stage
+from .tracking import VIDEO_CHECKS, analyze_burst, analyze_clip
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+
+def decode_uploads(uploads):
+    """Decodes each distinct upload once, even when it backs several checks.
+
+    Args:
+        uploads (dict): Check name to UploadedFile
+
+    Raises:
+        ValueError: Triggered when an upload is not a readable image
+
+    Returns:
+        dict: Check name to DecodedImage
+    """
+    decoded = {}
+    images = {}
+    for check, upload in uploads.items():
+        if id(upload) not in decoded:
+            decoded[id(upload)] = DecodedImage.from_upload(upload)
+        images[check] = decoded[id(upload)]
+    return images
+
+
+class FullAssessment(APIView):
+    """Runs every posture check on one upload set in a single request.
+
+    Each check reads the upload named after it (seatedposture, handposition,
+    deskposition, backangle, armscreen) and falls back to the `image` field,
+    so a single photo can be scored by every check with one pose pass.
+    """
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request, *args, **kwargs):
+        with stage('upload'):
+            fallback = request.FILES.get('image')
+        uploads = {}
+        for check in ASSESSMENT_CHECKS:
+            upload = request.FILES.get(check, fallback)
+            if upload is not None:
+                uploads[check] = upload
+        if not uploads:
+            return Response({'error': 'No image provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            images = decode_uploads(uploads)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(run_assessment(images), status=status.HTTP_200_OK)
+
+
+class AnthropicAnalysis(APIView):
+    """Asks the Anthropic model where the keyboard and mouse sit on the desk.
+
+    The upload goes in the `image` field. The call goes through
+    llm.analyze_workspace, so the picture is shrunk before it is sent, the
+    process-wide client and its concurrency limit are shared, and a re-posted
+    photo is answered from the result cache.
+    """
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request, *args, **kwargs):
+        with stage('upload'):
+            upload = request.FILES.get('image')
+        if upload is None:
+            return Response({'error': 'No image provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = analyze_workspace(DecodedImage.from_upload(upload))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ImproperlyConfigured as e:
+            logger.error(f"Workspace analysis is not configured: {e}")
+            return Response({'error': 'Workspace analysis is not available'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        except Exception as e:
+            # The client already retried rate limits, overloads and connection errors
+            logger.error(f"Workspace analysis failed: {e}")
+            return Response({'error': 'Workspace analysis failed, please try again later'},
+                            status=status.HTTP_502_BAD_GATEWAY)
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class BatchAnalysis(APIView):
+    """Runs a chosen set of checks on many uploads in one request.
+
+    Uploads come in repeated `images` fields and the checks in a comma
+    separated `checks` field or query parameter (any of seatedposture,
+    handposition, deskposition, backangle, armscreen and objects, every
+    assessment check by default). YOLO and Mask2Former run batched over the
+    images, see batch.run_batch. Results come back per image in upload order,
+    with errors reported per image and check.
+    """
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request, *args, **kwargs):
+        with stage('upload'):
+            uploads = request.FILES.getlist('images')
+        if not uploads:
+            return Response({'error': 'No image provided'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(uploads) > settings.BATCH_MAX_IMAGES:
+            return Response({'error': f'At most {settings.BATCH_MAX_IMAGES} images per batch'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        requested = request.data.get('checks', request.query_params.get('checks'))
+        checks = [check.strip() for check in requested.split(',') if check.strip()] if requested else list(ASSESSMENT_CHECKS)
+        unknown = [check for check in checks if check not in BATCH_CHECKS]
+        if unknown or not checks:
+            return Response({'error': f"Unknown checks {unknown}, use any of {', '.join(BATCH_CHECKS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        images = []
+        for upload in uploads:
+            try:
+                images.append(DecodedImage.from_upload(upload))
+            except ValueError as e:
+                images.append(str(e))
+
+        items = run_batch(images, checks)
+        for item, upload in zip(items, uploads):
+            item['name'] = upload.name
+        return Response({'checks': checks, 'items': items}, status=status.HTTP_200_OK)
+
+
+class VideoAnalysis(APIView):
+    """Scores a short clip (`video`) or a burst of photos (repeated `frames`) as one sitting.
+
+    Pose and hands are tracked from frame to frame instead of being detected
+    in every frame, frames are sampled adaptively and the verdicts are voted
+    over time, see tracking.analyze_frames. `checks` is a comma separated
+    subset of seatedposture, deskposition and handposition (the first two by
+    default); `interval_ms` is the time between burst photos.
+    """
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request, *args, **kwargs):
+        with stage('upload'):
+            video = request.FILES.get('video')
+            frames = request.FILES.getlist('frames')
+        if video is None and not frames:
+            return Response({'error': 'No video or frames provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+        requested = request.data.get('checks', request.query_params.get('checks'))
+        checks = [check.strip() for check in requested.split(',') if check.strip()] if requested else ['seatedposture', 'deskposition']
+        unknown = [check for check in checks if check not in VIDEO_CHECKS]
+        if unknown or not checks:
+            return Response({'error': f"Unknown checks {unknown}, use any of {', '.join(VIDEO_CHECKS)}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            if video is not None:
+                video.seek(0)
+                result = analyze_clip(video.read(), checks)
+            else:
+                if len(frames) > settings.VIDEO_MAX_FRAMES:
+                    return Response({'error': f'At most {settings.VIDEO_MAX_FRAMES} frames per burst'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+                try:
+                    interval_ms = int(request.data.get('interval_ms', settings.BURST_INTERVAL_MS))
+                except ValueError:
+                    return Response({'error': 'interval_ms must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+                if interval_ms <= 0:
+                    return Response({'error': 'interval_ms must be a positive number of milliseconds'},
+                                    status=status.HTTP_400_BAD_REQUEST)
+                result = analyze_burst([DecodedImage.from_upload(frame) for frame in frames], interval_ms, checks)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class JobSubmit(APIView):
+    """Queues a heavy analysis and returns its job id without waiting for it.
+
+    The kind comes from the URL (arm_screen, annotate_object, ...) and the
+    options the kind accepts come from form fields or query parameters (for
+    annotate_object: mode=panoptic|boxes and classes). Unreadable uploads,
+    invalid options and, for kinds with a quality gate, photos the gate
+    rejects get a 400 before anything is queued. Follow the job by polling
+    JobStatus or over the WebSocket at `ws/jobs/<job_id>/`.
+    """
+    parser_classes = (MultiPartParser, FormParser)
+
+    def post(self, request, kind, *args, **kwargs):
+        if kind not in JOB_KINDS:
+            return Response({'error': f'Unknown job kind: {kind}'}, status=status.HTTP_404_NOT_FOUND)
+        with stage('upload'):
+            upload = request.FILES.get('image') or request.FILES.get('image_file')
+        if upload is None:
+            return Response({'error': 'No image provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+        upload.seek(0)
+        data = upload.read()
+        try:
+            image = DecodedImage.from_bytes(data)
+            if JOB_GATES[kind] and settings.QUALITY_GATE:
+                rejected = gate(image, JOB_GATES[kind])
+            else:
+                # A reduced decode proves the pixels are readable before a worker picks the job up
+                image.thumbnail(settings.QUALITY_GATE_EDGE)
+                rejected = {}
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if rejected:
+            return Response({'error': next(iter(rejected.values()))}, status=status.HTTP_400_BAD_REQUEST)
+        options = {}
+        for name in JOB_OPTIONS[kind]:
+            value = request.data.get(name, request.query_params.get(name))
+            if value is not None:
+                options[name] = value
+        try:
+            with stage('submit'):
+                job = submit(kind, data, **options)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'job_id': job['id'],
+            'status': job['status'],
+            'status_url': request.build_absolute_uri(f"/api/jobs/{job['id']}/"),
+            'websocket_path': f"/ws/jobs/{job['id']}/",
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class JobStatus(APIView):
+    """Returns the state of a queued job, with its result once it is done."""
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_job(job_id)
+        if job is None:
+            return Response({'error': 'Unknown job'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job, status=status.HTTP_200_OK)
+
+
+class StoredImage(View):
+    """Serves an annotated image from the media store in the encoding the client picks.
+
+    Query parameters: format (jpeg, webp or png), quality (1-100), max_dim
+    (longest side in pixels) and thumb=1 for a small preview. Stored images
+    never change, so responses are cacheable forever.
+    """
+
+    def get(self, request, image_id, *args, **kwargs):
+        try:
+            quality = int(request.GET.get('quality', DEFAULT_QUALITY))
+            max_dim = int(request.GET['max_dim']) if 'max_dim' in request.GET else None
+        except ValueError:
+            return HttpResponseBadRequest('quality and max_dim must be integers')
+        if not 1 <= quality <= 100:
+            return HttpResponseBadRequest('quality must be between 1 and 100')
+        if max_dim is not None and max_dim <= 0:
+            return HttpResponseBadRequest('max_dim must be a positive number of pixels')
+        if request.GET.get('thumb') in ('1', 'true'):
+            max_dim = min(max_dim or THUMBNAIL_DIM, THUMBNAIL_DIM)
+
+        try:
+            with stage('encode'):
+                data, content_type = render(image_id, request.GET.get('format', 'jpeg'), quality, max_dim)
+        except KeyError:
+            raise Http404('Unknown image')
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+
+        response = HttpResponse(data, content_type=content_type)
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+
+class ReportPDF(APIView):
+    """Renders the assessment report PDF for a set of analyzer verdicts.
+
+    The JSON body maps categories (or assessment check names) to verdicts, e.g.
+    {"answers": {"seatedposture": ["Positive", "Neutral"]}}. Identical answers
+    are served from the report cache. The PDF is rendered in full before it is
+    sent, so it goes out in one response with its Content-Length and its
+    content hash as ETag.
+    """
+
+    def post(self, request, *args, **kwargs):
+        try:
+            key, data = get_report(request.data.get('answers'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        etag = f'"{key}"'
+        if request.headers.get('If-None-Match') == etag:
+            return HttpResponseNotModified()
+        response = HttpResponse(data, content_type='application/pdf')
+        response['Content-Length'] = len(data)
+        response['Content-Disposition'] = 'attachment; filename="assessment_report.pdf"'
+        response['ETag'] = etag
+        return response
+
+
+class Metrics(View):
+    """Prometheus scrape endpoint with per-endpoint stage histograms of this worker process.
+
+    Only served when METRICS_ENABLED is on, see aipose/timing.py.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if not settings.METRICS_ENABLED:
+            raise Http404('Metrics are disabled')
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
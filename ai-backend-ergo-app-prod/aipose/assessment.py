@@ -0,0 +1,128 @@
+import logging
+
+from . import BackAngle, armpose, bodypose, deskpose, handpose
+from .BackAngle import AdvancedPostureAnalyzer
+from .armpose import detect_arm_and_screen
+from .handpose import NO_HANDS_MESSAGE, detect_hands
+from .landmarks import pose_landmarks
+from .media_store import store_and_link
+from .quality_gate import gate
+from .result_cache import analysis_version, result_cache
+from .timing import stage
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+# Upload field names, one per check the React client used to call separately
+ASSESSMENT_CHECKS = ('seatedposture', 'handposition', 'deskposition', 'backangle', 'armscreen')
+
+
+def run_assessment(images, rejected=None, detections=None):
+    """Runs every requested check, with a single pose pass per distinct image.
+
+    Each distinct image first goes through the quality gate, and the checks it
+    rejects report the reason without touching a model. Pose landmarks are
+    computed once per image and shared by the seated posture, desk posture,
+    back angle and arm/screen rules, and only when one of those checks misses
+    the result cache. Hand landmarks and YOLO boxes are computed once per image
+    as well (the detector caches by image hash), unless the caller already has
+    the boxes from a batched YOLO pass.
+
+    Args:
+        images (dict): Check name to DecodedImage, the same image may back several checks
+        rejected (dict): Quality gate verdicts (check name to message) when the
+            caller already gated the images, None runs the gate here
+        detections (dict): Image key to every YOLO detection of that image,
+            images missing from it go through the detector
+
+    Returns:
+        dict: Results per check, plus an errors dict for checks that could not be scored
+    """
+    landmarks = {}
+    detections = detections or {}
+
+    def landmarks_for(image):
+        if image.key not in landmarks:
+            landmarks[image.key] = pose_landmarks(image)
+        return landmarks[image.key]
+
+    def posture_rules(rules):
+        # The rules are pure functions of the landmarks, no analyzer or graph is needed
+        def check(image):
+            landmarks = landmarks_for(image)
+            with stage('rules'):
+                verdicts = rules.evaluate_landmarks(landmarks)
+            if verdicts is None:
+                return None, rules.IMPROPER_PICTURE_MESSAGE
+            return verdicts, None
+        return check
+
+    def hand_position(image):
+        hands = detect_hands(image)
+        if not hands:
+            return None, NO_HANDS_MESSAGE
+        with stage('rules'):
+            return [verdict for hand in hands for verdict in handpose.evaluate_landmarks(hand)], None
+
+    def back_angle(image):
+        analyzer = AdvancedPostureAnalyzer()
+        metrics, status, chair_bbox, body_points = analyzer.analyze_image(
+            image, landmarks_for(image), detections.get(image.key))
+        if metrics is None:
+            return None, status
+        result_image = store_and_link(analyzer.visualize_results(image, body_points, chair_bbox, metrics))
+        return {
+            'metrics': metrics,
+            'status': status,
+            'chair_bbox': chair_bbox,
+            'result_image_id': result_image['id'],
+            'result_image_url': result_image['url']
+        }, None
+
+    def arm_screen(image):
+        result = detect_arm_and_screen(image, landmarks_for(image), detections.get(image.key))
+        if result['success']:
+            return result, None
+        return None, result['error']
+
+    checks = {
+        'seatedposture': (posture_rules(bodypose), bodypose.RULES_VERSION),
+        'handposition': (hand_position, handpose.RULES_VERSION),
+        'deskposition': (posture_rules(deskpose), deskpose.RULES_VERSION),
+        'backangle': (back_angle, BackAngle.RULES_VERSION),
+        'armscreen': (arm_screen, armpose.RULES_VERSION),
+    }
+
+    response = {}
+    errors = {check: message for check, message in (rejected or {}).items() if check in images}
+
+    if rejected is None:
+        by_image = {}
+        for check, image in images.items():
+            by_image.setdefault(image.key, (image, []))[1].append(check)
+        for image, image_checks in by_image.values():
+            try:
+                errors.update(gate(image, image_checks))
+            except ValueError as e:
+                # The header parsed but the pixels do not decode, e.g. a truncated upload
+                errors.update({check: str(e) for check in image_checks})
+
+    for check, (run_check, rules_version) in checks.items():
+        if check not in images or check in errors:
+            continue
+        image = images[check]
+        # Results are cached per image, so a re-posted photo skips every model pass
+        try:
+            result, error = result_cache.get_or_compute(
+                image.key, 'assessment', check, analysis_version(rules_version),
+                lambda: run_check(image))
+        except ValueError as e:
+            result, error = None, str(e)
+        if error:
+            errors[check] = error
+        else:
+            response[check] = result
+
+    logger.info(f"Assessment ran {len(images)} checks with {len(landmarks)} pose passes")
+    response['errors'] = errors
+    return response
@@ -0,0 +1,128 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .assessment import ASSESSMENT_CHECKS, run_assessment
+from .detection import detector
+from .quality_gate import gate
+from .timing import collecting, merge_timings, run_timed
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+# Checks a batch can ask for: the assessment checks plus Mask2Former object boxes
+BATCH_CHECKS = ASSESSMENT_CHECKS + ('objects',)
+
+# Assessment checks reading YOLO boxes, whose detections are computed for a whole chunk at once
+YOLO_CHECKS = ('backangle', 'armscreen')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool():
+    """Returns the thread pool running the per-image MediaPipe work, started on first use.
+
+    Threads borrow pose and hand graphs from the model registry, so at most
+    MODEL_POOL_SIZE images of a model run at once whatever BATCH_WORKERS is.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.BATCH_WORKERS, thread_name_prefix='batch')
+    return _pool
+
+
+def _assess(image, checks, detections):
+    try:
+        # Only checks the image already passed the gate for reach here
+        return run_assessment({check: image for check in checks}, rejected={}, detections=detections)
+    except Exception as e:
+        logger.error(f"Batch assessment failed: {e}")
+        return {'errors': {check: str(e) for check in checks}}
+
+
+def run_batch(images, checks):
+    """Runs a set of checks on many images, batching the model passes that allow it.
+
+    Every image first goes through the quality gate, and a check it rejects
+    is reported without the image reaching that check's models. Images are
+    processed in chunks of BATCH_SIZE. For each chunk YOLO runs once over
+    every image and Mask2Former once when object boxes are requested. The
+    checks of each image then run on the batch thread pool, with that image's
+    YOLO boxes passed to the back angle and arm/screen checks, while the next
+    chunk goes through the batched models.
+
+    Args:
+        images (List): DecodedImage per upload, or an error message for uploads that could not be decoded
+        checks (List): Names from BATCH_CHECKS
+
+    Returns:
+        List: One dict per image in input order, with index, results per check
+        and errors per check
+    """
+    items = [{'index': index, 'results': {}, 'errors': {}} for index in range(len(images))]
+    decoded = []
+    for item, image in zip(items, images):
+        if isinstance(image, str):
+            item['errors']['image'] = image
+            continue
+        try:
+            item['errors'].update(gate(image, checks))
+        except ValueError as e:
+            # The header parsed but the pixels do not decode, e.g. a truncated upload
+            item['errors']['image'] = str(e)
+            continue
+        decoded.append((item, image, [check for check in checks if check not in item['errors']]))
+
+    # Each task times its stages in a dict of its own, merged into the request's Server-Timing below
+    timed_tasks = collecting()
+    futures = []
+    for start in range(0, len(decoded), settings.BATCH_SIZE):
+        chunk = decoded[start:start + settings.BATCH_SIZE]
+
+        yolo_images = [image for _, image, passed in chunk if any(check in YOLO_CHECKS for check in passed)]
+        detections = {}
+        if yolo_images:
+            try:
+                for image, boxes in zip(yolo_images, detector.detect_batch(yolo_images, classes=None)):
+                    detections[image.key] = boxes
+            except Exception as e:
+                # The checks fall back to one forward pass per image
+                logger.warning(f"Batched YOLO pass failed: {e}")
+
+        object_items = [(item, image) for item, image, passed in chunk if 'objects' in passed]
+        if object_items:
+            from .segmentation import BOX_CLASSES, detect_object_boxes_batch
+            try:
+                boxes_per_image = detect_object_boxes_batch([image for _, image in object_items], BOX_CLASSES)
+                for (item, _), boxes in zip(object_items, boxes_per_image):
+                    item['results']['objects'] = boxes
+            except Exception as e:
+                logger.error(f"Batched Mask2Former pass failed: {e}")
+                for item, _ in object_items:
+                    item['errors']['objects'] = str(e)
+
+        for item, image, passed in chunk:
+            assessment_checks = [check for check in passed if check in ASSESSMENT_CHECKS]
+            if assessment_checks:
+                # Only this image's boxes, not the detector cache they may have been evicted from
+                image_detections = {image.key: detections[image.key]} if image.key in detections else None
+                if timed_tasks:
+                    future = pool().submit(run_timed, _assess, image, assessment_checks, image_detections)
+                else:
+                    future = pool().submit(_assess, image, assessment_checks, image_detections)
+                futures.append((item, future))
+
+    for item, future in futures:
+        result = future.result()
+        if timed_tasks:
+            result, timings = result
+            merge_timings(timings)
+        item['errors'].update(result.pop('errors'))
+        item['results'].update(result)
+
+    logger.info(f"Batch ran {', '.join(checks)} on {len(images)} images, {len(images) - len(decoded)} unreadable")
+    return items
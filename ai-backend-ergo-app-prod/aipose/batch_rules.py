@@ -0,0 +1,262 @@
+import logging
+
+import numpy as np
+
+from . import bodypose, deskpose, handpose
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+# Desk rules read the first 13 keypoints in this order (not the MediaPipe numbering)
+DESK_POINTS = {
+    'nose': 0, 'left_eye': 1, 'right_eye': 2, 'left_ear': 3, 'right_ear': 4,
+    'left_shoulder': 5, 'right_shoulder': 6, 'left_elbow': 7, 'right_elbow': 8,
+    'left_wrist': 9, 'right_wrist': 10, 'left_hip': 11, 'right_hip': 12,
+}
+
+
+def stack_landmarks(landmarks, points=33):
+    """Stacks per image landmark arrays into one tensor.
+
+    Args:
+        landmarks (List): (points, 3) arrays, None where nothing was detected
+        points (int): 33 for pose landmarks, 21 for hand landmarks
+
+    Returns:
+        ndarray: (N, points, 3) array, rows of missing images filled with NaN
+    """
+    stacked = np.full((len(landmarks), points, 3), np.nan)
+    for i, item in enumerate(landmarks):
+        if item is not None:
+            stacked[i] = item
+    return stacked
+
+
+def angles(point1, point2, point3):
+    """Angle at point2 for N triplets of points, same maths as PoseAnalyzer.calculate_angle.
+
+    Args:
+        point1 (ndarray): (N, 2) x,y values
+        point2 (ndarray): (N, 2) x,y values of the vertex
+        point3 (ndarray): (N, 2) x,y values
+
+    Returns:
+        ndarray: (N,) angles in degrees, NaN where a vector has no length
+    """
+    a = point1 - point2
+    b = point3 - point2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cosine = np.einsum('ij,ij->i', a, b) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+        return np.degrees(np.arccos(cosine))
+
+
+def horizontal_angles(point1, point2):
+    """Vectorised DeskPoseAnalyzer.calculate_horizontal_angle.
+
+    Args:
+        point1 (ndarray): (N, 2) x,y values of the first point (e.g., eye)
+        point2 (ndarray): (N, 2) x,y values of the second point (e.g., ear)
+
+    Returns:
+        ndarray: (N,) angles in degrees, -100 where point1 is above point2
+    """
+    vector = point1 - point2
+    angle = np.degrees(np.arctan2(vector[:, 1], vector[:, 0]))
+    angle = np.where(angle > 90, angle - 180, np.where(angle < -90, angle + 180, angle))
+    return np.where(point1[:, 1] < point2[:, 1], -100.0, angle)
+
+
+def path_lengths(points):
+    """Length of N polylines at once.
+
+    Args:
+        points (ndarray): (N, K, 2) or (K, 2) x,y values along each path
+
+    Returns:
+        ndarray: (N,) lengths, or a float for a single path
+    """
+    points = np.asarray(points, dtype=float)
+    return np.linalg.norm(np.diff(points, axis=-2), axis=-1).sum(axis=-1)
+
+
+def classify_bands(angle, low, high):
+    """Vectorised bodypose.classify_band: Neutral inside [low, high], Positive below, Negative above."""
+    return np.where((angle >= low) & (angle <= high), 'Neutral',
+                    np.where(angle < low, 'Positive', 'Negative'))
+
+
+def facing_sides(keypoints, nose, left_ear, right_ear):
+    """Compares the nose to ear distances of N images.
+
+    Returns:
+        ndarray: (N,) 1 when the nose is nearer the left ear, -1 when nearer the right ear, 0 when ambiguous
+    """
+    to_left = np.abs(keypoints[:, nose, 0] - keypoints[:, left_ear, 0])
+    to_right = np.abs(keypoints[:, nose, 0] - keypoints[:, right_ear, 0])
+    return np.nan_to_num(np.sign(to_right - to_left)).astype(int)
+
+
+def usable(landmarks, indices, thresholds):
+    """Mask of images that have landmarks and enough confident keypoints among indices."""
+    scores = landmarks[:, indices, 2]
+    low_confidence = np.sum(scores < thresholds['confidence'], axis=1) / len(indices)
+    return ~np.isnan(landmarks).all(axis=(1, 2)) & (low_confidence <= thresholds['low_confidence_ratio'])
+
+
+def score_seated(landmarks, thresholds=bodypose.THRESHOLDS):
+    """Seated posture rules of bodypose.evaluate_landmarks for N images in one pass.
+
+    Args:
+        landmarks (ndarray): (N, 33, 3) pose landmarks, NaN rows for images without a pose
+        thresholds (dict): Rule thresholds, defaults to bodypose.THRESHOLDS
+
+    Returns:
+        dict: valid and ambiguous masks, hip_angle and knee_angle in degrees, and (N, 2) verdicts
+    """
+    landmarks = np.asarray(landmarks, dtype=float)
+    keypoints = landmarks[:, :, :2]
+    Landmark = bodypose.PoseLandmark
+
+    facing = facing_sides(keypoints, Landmark.NOSE, Landmark.LEFT_EAR, Landmark.RIGHT_EAR)
+    # Facing left reads the right side of the body, facing right the left side
+    use_right = (facing > 0)[:, None]
+    shoulder, hip, knee, ankle = (
+        np.where(use_right, keypoints[:, Landmark['RIGHT_' + name]], keypoints[:, Landmark['LEFT_' + name]])
+        for name in ('SHOULDER', 'HIP', 'KNEE', 'ANKLE')
+    )
+
+    hip_angle = angles(shoulder, hip, knee)
+    knee_angle = angles(hip, knee, ankle)
+    return {
+        'valid': usable(landmarks, np.arange(landmarks.shape[1]), thresholds),
+        'ambiguous': facing == 0,
+        'hip_angle': hip_angle,
+        'knee_angle': knee_angle,
+        'verdicts': np.stack([classify_bands(hip_angle, *thresholds['hip_angle']),
+                              classify_bands(knee_angle, *thresholds['knee_angle'])], axis=1),
+    }
+
+
+def elbow_positions(facing, shoulder, hip, elbow, wrist):
+    """Vectorised DeskPoseAnalyzer.is_elbow_behind_shoulder_hip_line.
+
+    Args:
+        facing (ndarray): (N,) 1 for the 'right' desk side, -1 for the 'left' one
+        shoulder, hip, elbow, wrist (ndarray): (N, 2) x,y values
+
+    Returns:
+        ndarray: (N,) -1, 0 or 1 as the scalar rule returns them
+    """
+    shoulder_to_hip = hip - shoulder
+    shoulder_to_elbow = elbow - shoulder
+    elbow_to_wrist = wrist - elbow
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cross_product = shoulder_to_hip[:, 0] * shoulder_to_elbow[:, 1] - shoulder_to_hip[:, 1] * shoulder_to_elbow[:, 0]
+        distance = np.abs(cross_product) / np.linalg.norm(shoulder_to_hip, axis=1)
+        shoulder_elbow_unit = shoulder_to_elbow / np.linalg.norm(shoulder_to_elbow, axis=1, keepdims=True)
+        elbow_wrist_unit = elbow_to_wrist / np.linalg.norm(elbow_to_wrist, axis=1, keepdims=True)
+        angle = np.degrees(np.arccos(np.clip(np.einsum('ij,ij->i', shoulder_elbow_unit, elbow_wrist_unit), -1.0, 1.0)))
+
+    # The elbow sits on the line when the cross product points towards the facing side
+    on_line = np.where(facing > 0, cross_product > 0, cross_product < 0) & (distance < 0.035)
+    bent = np.where((angle >= 80) & (angle <= 130), 0, np.where(angle > 130, 1, -1))
+    # Away from the line only the 'right' side can score positive, as in the scalar rule
+    away = np.where((facing > 0) & (cross_product > 0) & (distance > 0.03), 1, -1)
+    return np.where(on_line, bent, away)
+
+
+def score_desk(landmarks, thresholds=deskpose.THRESHOLDS):
+    """Desk posture rules of deskpose.evaluate_landmarks for N images in one pass.
+
+    Args:
+        landmarks (ndarray): (N, 33, 3) pose landmarks, NaN rows for images without a pose
+        thresholds (dict): Rule thresholds, defaults to deskpose.THRESHOLDS
+
+    Returns:
+        dict: valid and ambiguous masks, arm_angle, eye_angle, elbow_position and (N, 3) verdicts
+    """
+    landmarks = np.asarray(landmarks, dtype=float)
+    keypoints = landmarks[:, :, :2]
+    points = DESK_POINTS
+
+    facing = facing_sides(keypoints, points['nose'], points['left_ear'], points['right_ear'])
+    # Desk naming is mirrored: nose nearer the left ear is the 'right' side and reads the left points
+    use_left = (facing > 0)[:, None]
+    shoulder, elbow, wrist, hip, eye, ear = (
+        np.where(use_left, keypoints[:, points['left_' + name]], keypoints[:, points['right_' + name]])
+        for name in ('shoulder', 'elbow', 'wrist', 'hip', 'eye', 'ear')
+    )
+
+    # The scalar rule scores a zero length arm segment as a 0 degree angle
+    degenerate = (np.linalg.norm(shoulder - elbow, axis=1) == 0) | (np.linalg.norm(wrist - elbow, axis=1) == 0)
+    arm_angle = np.where(degenerate, 0.0, angles(shoulder, elbow, wrist))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        normalized_wrist = (wrist[:, 1] - shoulder[:, 1]) / shoulder[:, 1]
+    eye_angle = horizontal_angles(eye, ear)
+    elbow_position = elbow_positions(facing, shoulder, hip, elbow, wrist)
+
+    arm = np.where(arm_angle < thresholds['angle_low'], 'positive',
+                   np.where(arm_angle > thresholds['angle_high'], 'negative',
+                            np.where(normalized_wrist < thresholds['wrist_height'], 'negative', 'neutral')))
+    eye = np.where((eye_angle > thresholds['eye_angle_low']) & (eye_angle < thresholds['eye_angle_high']), 'positive',
+                   np.where(eye_angle > thresholds['eye_angle_high'], 'negative', 'neutral'))
+    elbow_verdict = np.choose(elbow_position + 1, ['negative', 'neutral', 'positive'])
+
+    return {
+        'valid': usable(landmarks, np.arange(12), thresholds),
+        'ambiguous': facing == 0,
+        'arm_angle': arm_angle,
+        'eye_angle': eye_angle,
+        'elbow_position': elbow_position,
+        'verdicts': np.stack([arm, eye, elbow_verdict], axis=1),
+    }
+
+
+def score_hands(hands, thresholds=handpose.THRESHOLDS):
+    """Hand rules of handpose.evaluate_landmarks for N hands in one pass.
+
+    Args:
+        hands (ndarray): (N, 21, 3) hand landmarks
+        thresholds (dict): Rule thresholds, defaults to handpose.THRESHOLDS
+
+    Returns:
+        dict: bent_fingers and (N, 3) verdicts for hand bend, wrist flexion and claw grip
+    """
+    hands = np.asarray(hands, dtype=float)
+    y = hands[:, :, 1]
+
+    buffer = thresholds['bend_buffer']
+    bend = np.where((y[:, 12] < y[:, 9] - buffer) & (y[:, 12] < y[:, 0] - buffer), 'Positive',
+                    np.where((y[:, 12] > y[:, 9] + buffer) & (y[:, 12] > y[:, 0] + buffer), 'Negative', 'Neutral'))
+
+    buffer = thresholds['flexion_buffer']
+    flexion = np.where((y[:, 5] < y[:, 0] - buffer) & (y[:, 17] < y[:, 0] - buffer), 'Positive',
+                       np.where((y[:, 5] > y[:, 0] + buffer) & (y[:, 17] > y[:, 0] + buffer), 'Negative', 'Neutral'))
+
+    tips = np.array([8, 12, 16, 20])
+    distances = np.linalg.norm(hands[:, tips, :2] - hands[:, tips - 2, :2], axis=2)
+    bent_fingers = np.sum(distances < thresholds['claw_distance'], axis=1)
+    claw = np.where(bent_fingers >= thresholds['claw_fingers'], 'Negative', 'Positive')
+
+    return {
+        'bent_fingers': bent_fingers,
+        'verdicts': np.stack([bend, flexion, claw], axis=1),
+    }
+
+
+def verdict_lists(scores):
+    """Turns a batch result back into what evaluate_landmarks returns image by image.
+
+    Args:
+        scores (dict): Output of score_seated, score_desk or score_hands
+
+    Returns:
+        List: None for unusable pictures, [] for ambiguous ones, otherwise the verdicts
+    """
+    valid = scores.get('valid', np.ones(len(scores['verdicts']), dtype=bool))
+    ambiguous = scores.get('ambiguous', np.zeros(len(scores['verdicts']), dtype=bool))
+    return [
+        None if not ok else [] if unclear else row.tolist()
+        for ok, unclear, row in zip(valid, ambiguous, scores['verdicts'])
+    ]
@@ -1,17 +1,33 @@
-import cv2
 import mediapipe as mp
 import numpy as np
 import logging
+from .image_buffer import DecodedImage
+from .landmarks import landmarks_array
+from .timing import stage
 
 # Initialize logger
 logger = logging.getLogger('myapp')
 
+PoseLandmark = mp.solutions.pose.PoseLandmark
+
+IMPROPER_PICTURE_MESSAGE = "Improper picture. Please provide a clearer image."
+
+# Rule thresholds. Bump RULES_VERSION whenever they change so stored landmarks get re-scored
+RULES_VERSION = 1
+THRESHOLDS = {
+    'confidence': 0.2,              # visibility below which a keypoint counts as unreliable
+    'low_confidence_ratio': 0.75,   # reject the picture above this share of unreliable keypoints
+    'hip_angle': (80, 120),         # neutral shoulder-hip-knee band in degrees
+    'knee_angle': (85, 115),        # neutral hip-knee-ankle band in degrees
+}
+
 class PoseAnalyzer:
     def __init__(self):
         """Defines the parameters to be used in the operations for this class.
         """
         self.mp_pose = mp.solutions.pose
         self.pose = self.mp_pose.Pose()
+        self.thresholds = dict(THRESHOLDS)
 
     @staticmethod
     def calculate_angle(point1, point2, point3):
@@ -39,113 +55,135 @@ class PoseAnalyzer:
         return angle_degrees
 
     @staticmethod
-    def preprocess_image(image_path):
+    def preprocess_image(image):
         """Empty method for further preprocessing of image now acts as a checker
 
         Args:
-            image_path (String): Path of image file
+            image (DecodedImage | String): Decoded upload, or path of image file
 
         Raises:
             ValueError: Triggered when the image path or the image format is not correct should be jpeg and png
 
         Returns:
-            image: the initial image at the source
+            image: the source image in RGB, downscaled to INFERENCE_LONG_EDGE
         """
-        # Read the image from the path
-        image = cv2.imread(image_path)
-        if image is None:
-            raise ValueError("Invalid image file. Please check the image path and format.")
-        # Convert the image to RGB
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        return image_rgb
-
-    def analyze_pose(self, image_path):
+        # Decoding, downscaling and the RGB conversion are shared with every other analyzer
+        return DecodedImage.coerce(image).inference_rgb
+
+    def analyze_pose(self, image):
         """Analyses the body image
 
         Args:
-            image_path (String): Path to the image to be processed
+            image (DecodedImage | String): Decoded upload, or path to the image to be processed
 
         Returns:
             String: Compilation of all the responses for the 3 conditions in one string
         """
-        global shoulder, hip, knee, ankle
+        return self.analyze_landmarks(self.detect_landmarks(image))
+
+    def detect_landmarks(self, image):
+        """Runs the pose graph only, leaving the rules to analyze_landmarks
+
+        Args:
+            image (DecodedImage | String): Decoded upload, or path to the image to be processed
+
+        Returns:
+            ndarray: (33, 3) array of normalized x, y and visibility, None when nothing was detected
+        """
         # Preprocess the image
-        image = self.preprocess_image(image_path)
-        logger.debug(f"Image preprocessed: {image_path}")
+        image = self.preprocess_image(image)
+        logger.debug(f"Image preprocessed: {image.shape}")
 
         # Process the image to get pose landmarks
-        results = self.pose.process(image)
-
-        if not results.pose_landmarks:
-            logger.warning("No pose landmarks detected.")
-            return "Improper picture. Please provide a clearer image.", None, None
-
-        # Extract keypoints and visibility scores
-        keypoints = np.array([[landmark.x, landmark.y] for landmark in results.pose_landmarks.landmark])
-        scores = np.array([landmark.visibility for landmark in results.pose_landmarks.landmark])
-        logger.debug(f"Keypoints: {keypoints}")
-        logger.debug(f"Visibility scores: {scores}")
-
-        # Check confidence levels
-        low_confidence_points = np.sum(scores < 0.2)
-        if low_confidence_points / len(scores) > 0.75:
-            logger.warning("Low confidence in more than 75% of keypoints.")
-            return "Improper picture. Please provide a clearer image.", keypoints, scores
-
-        # Create a dictionary of landmarks
-        landmarks = {landmark: keypoints[self.mp_pose.PoseLandmark[landmark].value]
-                     for landmark in self.mp_pose.PoseLandmark.__members__.keys()}
-
-        # Extract specific landmarks
-        nose = landmarks['NOSE']
-        left_ear = landmarks['LEFT_EAR']
-        right_ear = landmarks['RIGHT_EAR']
-        left_shoulder = landmarks['LEFT_SHOULDER']
-        right_shoulder = landmarks['RIGHT_SHOULDER']
-        left_hip = landmarks['LEFT_HIP']
-        right_hip = landmarks['RIGHT_HIP']
-        left_knee = landmarks['LEFT_KNEE']
-        right_knee = landmarks['RIGHT_KNEE']
-        left_ankle = landmarks['LEFT_ANKLE']
-        right_ankle = landmarks['RIGHT_ANKLE']
-
-        logger.debug(f"Landmarks extracted: {landmarks}")
-
-        analysis_results = ""
-
-        # Determine facing direction by comparing the horizontal positions of the nose and ears
-        if abs(nose[0] - left_ear[0]) < abs(nose[0] - right_ear[0]):
-            facing_side = "left"
-            shoulder, hip, knee, ankle = right_shoulder, right_hip, right_knee, right_ankle
-        elif abs(nose[0] - left_ear[0]) > abs(nose[0] - right_ear[0]):
-            facing_side = "right"
-            shoulder, hip, knee, ankle = left_shoulder, left_hip, left_knee, left_ankle
-        else:
-            facing_side = "ambiguous"
-
-        logger.info(f"Facing side determined: {facing_side}")
-
-        if facing_side != "ambiguous":
-            # Calculate angles between specific landmarks
-            shoulder_hip_knee_angle = self.calculate_angle(shoulder, hip, knee)
-            hip_knee_ankle_angle = self.calculate_angle(hip, knee, ankle)
-
-            logger.info(f"Shoulder-Hip-Knee angle: {shoulder_hip_knee_angle:.2f}")
-            logger.info(f"Hip-Knee-Ankle angle: {hip_knee_ankle_angle:.2f}")
-
-            # Determine posture based on angles
-            if 80 <= shoulder_hip_knee_angle <= 120:
-                analysis_results += "Neutral\n"
-            elif shoulder_hip_knee_angle < 80:
-                analysis_results += "Positive\n"
-            else:
-                analysis_results += "Negative\n"
-
-            if 85 <= hip_knee_ankle_angle <= 115:
-                analysis_results += "Neutral\n"
-            elif hip_knee_ankle_angle < 85:
-                analysis_results += "Positive\n"
-            else:
-                analysis_results += "Negative\n"
-
-        return analysis_results.strip()
+        with stage('pose'):
+            results = self.pose.process(image)
+        return landmarks_array(results.pose_landmarks)
+
+    def analyze_landmarks(self, landmarks):
+        """Applies the seated posture rules to landmarks from any pose pass
+
+        Args:
+            landmarks (ndarray): (33, 3) array of normalized x, y and visibility, or None
+
+        Returns:
+            String: Compilation of all the responses for the 3 conditions in one string
+        """
+        with stage('rules'):
+            verdicts = evaluate_landmarks(landmarks, self.thresholds)
+        if verdicts is None:
+            if landmarks is None:
+                return IMPROPER_PICTURE_MESSAGE, None, None
+            return IMPROPER_PICTURE_MESSAGE, landmarks[:, :2], landmarks[:, 2]
+        return "\n".join(verdicts)
+
+
+def evaluate_landmarks(landmarks, thresholds=THRESHOLDS):
+    """Scores seated posture from pose landmarks without running any model
+
+    Args:
+        landmarks (ndarray): (33, 3) array of normalized x, y and visibility, or None
+        thresholds (dict): Rule thresholds, defaults to THRESHOLDS
+
+    Returns:
+        List: Neutral/Positive/Negative for the hip and knee angles (empty when the
+        facing side is ambiguous), None when the picture is unusable
+    """
+    if landmarks is None:
+        logger.warning("No pose landmarks detected.")
+        return None
+
+    # Extract keypoints and visibility scores
+    keypoints = landmarks[:, :2]
+    scores = landmarks[:, 2]
+    logger.debug(f"Keypoints: {keypoints}")
+    logger.debug(f"Visibility scores: {scores}")
+
+    # Check confidence levels
+    low_confidence_points = np.sum(scores < thresholds['confidence'])
+    if low_confidence_points / len(scores) > thresholds['low_confidence_ratio']:
+        logger.warning("Low confidence in more than 75% of keypoints.")
+        return None
+
+    # Extract specific landmarks
+    nose = keypoints[PoseLandmark.NOSE]
+    left_ear = keypoints[PoseLandmark.LEFT_EAR]
+    right_ear = keypoints[PoseLandmark.RIGHT_EAR]
+
+    verdicts = []
+
+    # Determine facing direction by comparing the horizontal positions of the nose and ears
+    if abs(nose[0] - left_ear[0]) < abs(nose[0] - right_ear[0]):
+        facing_side = "left"
+        side = ('RIGHT_SHOULDER', 'RIGHT_HIP', 'RIGHT_KNEE', 'RIGHT_ANKLE')
+    elif abs(nose[0] - left_ear[0]) > abs(nose[0] - right_ear[0]):
+        facing_side = "right"
+        side = ('LEFT_SHOULDER', 'LEFT_HIP', 'LEFT_KNEE', 'LEFT_ANKLE')
+    else:
+        facing_side = "ambiguous"
+
+    logger.info(f"Facing side determined: {facing_side}")
+
+    if facing_side != "ambiguous":
+        shoulder, hip, knee, ankle = (keypoints[PoseLandmark[name]] for name in side)
+
+        # Calculate angles between specific landmarks
+        shoulder_hip_knee_angle = PoseAnalyzer.calculate_angle(shoulder, hip, knee)
+        hip_knee_ankle_angle = PoseAnalyzer.calculate_angle(hip, knee, ankle)
+
+        logger.info(f"Shoulder-Hip-Knee angle: {shoulder_hip_knee_angle:.2f}")
+        logger.info(f"Hip-Knee-Ankle angle: {hip_knee_ankle_angle:.2f}")
+
+        # Determine posture based on angles
+        verdicts.append(classify_band(shoulder_hip_knee_angle, *thresholds['hip_angle']))
+        verdicts.append(classify_band(hip_knee_ankle_angle, *thresholds['knee_angle']))
+
+    return verdicts
+
+
+def classify_band(angle, low, high):
+    """Neutral inside [low, high], Positive below it, Negative above it"""
+    if low <= angle <= high:
+        return "Neutral"
+    elif angle < low:
+        return "Positive"
+    return "Negative"
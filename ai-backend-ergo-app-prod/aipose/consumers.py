@@ -0,0 +1,145 @@
+import asyncio
+import time
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+
+from .jobs import FINISHED, get_job
+from .live import LIVE_RULES
+
+
+class JobConsumer(AsyncJsonWebsocketConsumer):
+    """Streams the state of one job to a WebSocket client until it finishes.
+
+    Jobs run in spawned worker processes, which the in-memory channel layer
+    does not reach, so the consumer relies only on re-reading the job's state
+    file every JOB_POLL_INTERVAL seconds and pushes each new status.
+    """
+
+    async def connect(self):
+        self.job_id = self.scope['url_route']['kwargs']['job_id']
+        self.last_status = None
+        await self.accept()
+        self.watcher = asyncio.ensure_future(self.watch())
+
+    async def disconnect(self, code):
+        if hasattr(self, 'watcher'):
+            self.watcher.cancel()
+
+    async def watch(self):
+        while True:
+            job = await sync_to_async(get_job)(self.job_id)
+            if job is None:
+                await self.send_json({'id': self.job_id, 'error': 'Unknown job'})
+                await self.close()
+                return
+            await self.push(job)
+            if job['status'] in FINISHED:
+                return
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+
+    async def push(self, job):
+        """Sends a job state once per status, closing the socket when the job is finished."""
+        if job['status'] == self.last_status:
+            return
+        self.last_status = job['status']
+        await self.send_json(job)
+        if job['status'] in FINISHED:
+            await self.close()
+
+
+class LivePostureConsumer(AsyncJsonWebsocketConsumer):
+    """Scores webcam frames sent as binary JPEG messages and pushes verdict changes back.
+
+    Frames are never queued. A frame that arrives while another one is waiting
+    replaces it, a frame older than LIVE_STALE_MS when a worker gets to it is
+    dropped, and at most `fps` frames per second (LIVE_MAX_FPS at most) are
+    analysed, so every session stays real-time however fast its client sends.
+    The query string picks the checks (`checks=seatedposture,deskposition`,
+    both by default) and the frame rate (`fps`).
+
+    A message is sent only when something changed: the new stable verdicts of
+    a check, or `person` when someone appeared or left the picture, along with
+    the frames analysed and dropped so far and the latency of the frame.
+    """
+
+    async def connect(self):
+        from .live import LiveSession, executor
+
+        self.session = None
+        await self.accept()
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        requested = params.get('checks', [''])[0]
+        checks = [check.strip() for check in requested.split(',') if check.strip()] or list(LIVE_RULES)
+        unknown = [check for check in checks if check not in LIVE_RULES]
+        try:
+            fps = min(float(params.get('fps', [settings.LIVE_MAX_FPS])[0]), settings.LIVE_MAX_FPS)
+        except ValueError:
+            fps = 0
+        if unknown or fps <= 0:
+            await self.send_json({'error': f"Unknown checks {unknown} or bad fps, use any of {', '.join(LIVE_RULES)}"})
+            await self.close(code=4400)
+            return
+
+        try:
+            self.session = await asyncio.get_running_loop().run_in_executor(executor(), LiveSession, checks)
+        except TimeoutError:
+            await self.send_json({'error': 'Too many live sessions, please try again later'})
+            await self.close(code=1013)
+            return
+        self.interval = 1.0 / fps
+        self.latest = None
+        self.frame_ready = asyncio.Event()
+        self.analyzed = 0
+        self.dropped = 0
+        self.worker = asyncio.ensure_future(self.analyze())
+
+    async def disconnect(self, code):
+        from .live import executor
+
+        if hasattr(self, 'worker'):
+            self.worker.cancel()
+        if self.session is not None:
+            await asyncio.get_running_loop().run_in_executor(executor(), self.session.close)
+
+    async def receive(self, text_data=None, bytes_data=None, **kwargs):
+        if self.session is None:
+            return
+        if bytes_data is None:
+            await self.send_json({'error': 'Send frames as binary JPEG messages'})
+            return
+        # Latest frame wins: a frame still waiting for the worker is never analysed
+        if self.latest is not None:
+            self.dropped += 1
+        self.latest = (time.monotonic(), bytes_data)
+        self.frame_ready.set()
+
+    async def analyze(self):
+        """Analyses the newest frame, at most once per interval, until the socket closes."""
+        from .live import executor
+
+        loop = asyncio.get_running_loop()
+        next_at = 0.0
+        while True:
+            await self.frame_ready.wait()
+            # Frames arriving while we wait for the frame rate budget replace this one
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+            self.frame_ready.clear()
+            received_at, data = self.latest
+            self.latest = None
+            next_at = time.monotonic() + self.interval
+            try:
+                changes = await loop.run_in_executor(executor(), self.session.process, data, received_at)
+            except ValueError as e:
+                await self.send_json({'error': str(e)})
+                continue
+            if changes is None:
+                self.dropped += 1
+                continue
+            self.analyzed += 1
+            if changes:
+                latency_ms = round((time.monotonic() - received_at) * 1000, 1)
+                await self.send_json({**changes, 'analyzed': self.analyzed, 'dropped': self.dropped,
+                                      'latency_ms': latency_ms})
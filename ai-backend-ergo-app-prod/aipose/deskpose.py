@@ -1,12 +1,28 @@
 from math import dist
-import cv2
 import mediapipe as mp
 import numpy as np
 import logging
+from .image_buffer import DecodedImage
+from .landmarks import landmarks_array
+from .timing import stage
 
 # Initialize logger
 logger = logging.getLogger('myapp')
 
+IMPROPER_PICTURE_MESSAGE = "Improper picture. Please take a better picture."
+
+# Rule thresholds. Bump RULES_VERSION whenever they change so stored landmarks get re-scored
+RULES_VERSION = 1
+THRESHOLDS = {
+    'confidence': 0.2,              # visibility below which a keypoint counts as unreliable
+    'low_confidence_ratio': 0.75,   # reject the picture above this share of unreliable keypoints
+    'angle_low': 45,                # shoulder-elbow-wrist angle below which the arm is too bent
+    'angle_high': 135,              # shoulder-elbow-wrist angle above which the arm is too straight
+    'wrist_height': 0.15,           # normalized wrist height under which the wrist sits too high
+    'eye_angle_low': 10,            # eye-ear angle band flagged as looking slightly down
+    'eye_angle_high': 35,           # eye-ear angle above which the head is tilted too far
+}
+
 class DeskPoseAnalyzer:
     def __init__(self):
         """Defines the parameters to be used in the operations for this class."""
@@ -14,9 +30,10 @@ class DeskPoseAnalyzer:
         # Initialize the pose estimator with specific parameters
         self.pose = self.mp_pose.Pose(static_image_mode=True, model_complexity=1, enable_segmentation=False)
         # Define confidence and angle thresholds
-        self.CONFIDENCE_THRESHOLD = 0.2
-        self.ANGLE_THRESHOLD_LOW = 45
-        self.ANGLE_THRESHOLD_HIGH = 135
+        self.thresholds = dict(THRESHOLDS)
+        self.CONFIDENCE_THRESHOLD = THRESHOLDS['confidence']
+        self.ANGLE_THRESHOLD_LOW = THRESHOLDS['angle_low']
+        self.ANGLE_THRESHOLD_HIGH = THRESHOLDS['angle_high']
         self.BODY_TOLERANCE = 0.2
         self.EYE_ANGLE_THRESHOLD_HIGH = 50
         self.EYE_ANGLE_THRESHOLD_LOW = -50
@@ -137,118 +154,153 @@ class DeskPoseAnalyzer:
             return 1 if cross_product > 0 and distance > 0.03 else -1
 
     @staticmethod
-    def preprocess_image(image_path):
+    def preprocess_image(image):
         """Empty method for further preprocessing of image now acts as a checker.
 
         Args:
-            image_path (String): Path of image file.
+            image (DecodedImage | String): Decoded upload, or path of image file.
 
         Raises:
             ValueError: Triggered when the image path or the image format is not correct should be jpeg and png.
 
         Returns:
-            image: the initial image at the source.
+            DecodedImage: the initial image at the source.
         """
-        # Read the image from the path
-        image = cv2.imread(image_path)
-        if image is None:
-            raise ValueError("Invalid image file. Please check the image path and format.")
-        return image
+        return DecodedImage.coerce(image)
 
-    def analyze_pose(self, image_path):
+    def analyze_pose(self, image):
         """Analyses the body image.
 
         Args:
-            image_path (String): Path to the image to be processed.
+            image (DecodedImage | String): Decoded upload, or path to the image to be processed.
 
         Returns:
             String: Compilation of all the responses for the 3 conditions in one string.
         """
+        return self.analyze_landmarks(self.detect_landmarks(image))
+
+    def detect_landmarks(self, image):
+        """Runs the pose graph only, leaving the rules to analyze_landmarks.
+
+        Args:
+            image (DecodedImage | String): Decoded upload, or path to the image to be processed.
+
+        Returns:
+            ndarray: (33, 3) array of normalized x, y and visibility, None when nothing was detected.
+        """
         # Preprocess the image
-        image = self.preprocess_image(image_path)
-        image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        logger.debug(f"Image preprocessed: {image_path}")
-
-        with self.mp_pose.Pose(static_image_mode=True, model_complexity=1, enable_segmentation=False) as pose:
-            # Process the image to get pose landmarks
-            results = pose.process(image_rgb)
-
-            if not results.pose_landmarks:
-                logger.warning("No pose landmarks detected.")
-                return "Improper picture. Please take a better picture.", None, None
-
-            # Extract keypoints and visibility scores
-            keypoints_with_scores = np.array([[lm.x, lm.y, lm.visibility] for lm in results.pose_landmarks.landmark])
-            keypoints = keypoints_with_scores[:, :2]
-            scores = keypoints_with_scores[:, 2]
-            logger.debug(f"Keypoints: {keypoints}")
-            logger.debug(f"Visibility scores: {scores}")
-
-            # Define keypoints of interest
-            keypoints_of_interest_indices = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]
-            low_confidence_points = np.sum(scores[keypoints_of_interest_indices] < self.CONFIDENCE_THRESHOLD)
-            if low_confidence_points / len(keypoints_of_interest_indices) > 0.75:
-                logger.warning("Low confidence in more than 75% of keypoints.")
-                return "Improper picture. Please take a better picture.", keypoints_with_scores, scores
-
-            # Extract specific landmarks
-            nose, left_eye, right_eye, left_ear, right_ear, left_shoulder, right_shoulder, left_elbow, right_elbow, left_wrist, right_wrist, left_hip, right_hip = \
-                keypoints[[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]]
-
-            # Determine facing direction by comparing the horizontal positions of the nose and ears
-            facing_side = "right" if abs(nose[0] - left_ear[0]) < abs(nose[0] - right_ear[0]) else "left" if abs(
-                nose[0] - left_ear[0]) > abs(nose[0] - right_ear[0]) else "ambiguous"
-
-            logger.info(f"Facing side determined: {facing_side}")
-
-            results_text = ""
-
-            if facing_side != "ambiguous":
-                # Select shoulder, elbow, wrist, hip, eye, and ear based on facing direction
-                shoulder, elbow, wrist, hip, eye, ear = (
-                    (right_shoulder, right_elbow, right_wrist, right_hip, right_eye, right_ear) 
-                    if facing_side == "left" else 
-                    (left_shoulder, left_elbow, left_wrist, left_hip, left_eye, left_ear)
-                )
-
-                # Calculate angles between specific landmarks
-                shoulder_elbow_wrist_angle = self.calculate_angle(shoulder, elbow, wrist)
-                eye_angle = self.calculate_horizontal_angle(eye, ear)
-                
-                logger.info(f"Shoulder-Elbow-Wrist angle: {shoulder_elbow_wrist_angle:.2f}")
-                logger.info(f"Eye angle: {eye_angle:.2f}")
-                
-                # Normalize wrist coordinates by subtracting shoulder coordinates
-                normalized_wrist = [(wrist[0] - shoulder[0])/shoulder[0], (wrist[1] - shoulder[1])/shoulder[1]]
-                logger.debug(f"Normalized wrist coordinates: {normalized_wrist}")
-                
-                # Determine posture based on angles
-                if shoulder_elbow_wrist_angle < self.ANGLE_THRESHOLD_LOW:
-                    results_text += "positive\n"
-                elif shoulder_elbow_wrist_angle > self.ANGLE_THRESHOLD_HIGH:
-                    results_text += "negative\n"
-                else:
-                    # Check if the normalized wrist coordinates are higher than the normalized shoulder coordinates
-                    if normalized_wrist[1] < 0.15:  # Assuming a lower y-coordinate means higher in your coordinate system
-                        results_text += "negative\n"
-                    else:
-                        results_text += "neutral\n"
-                
-                # Determine eye angle posture
-                if eye_angle > 10 and eye_angle<35:
-                    results_text += "positive\n"
-                elif eye_angle > 35:
-                    results_text += "negative\n"
-                else:
-                    results_text += "neutral\n"
-
-                # Check elbow position relative to shoulder-hip line
-                elbow_position = self.is_elbow_behind_shoulder_hip_line(facing_side, shoulder, hip, elbow, wrist)
-                if elbow_position == 0:
-                    side = "neutral"
-                elif elbow_position == 1:
-                    side = "positive"
-                else:
-                    side = "negative"
-                results_text += f"{side}\n"
-            return results_text
+        image = self.preprocess_image(image)
+        logger.debug(f"Image preprocessed: {image.shape}")
+
+        # Process the image to get pose landmarks
+        rgb = image.inference_rgb
+        with stage('pose'):
+            results = self.pose.process(rgb)
+        return landmarks_array(results.pose_landmarks)
+
+    def analyze_landmarks(self, landmarks):
+        """Applies the desk posture rules to landmarks from any pose pass.
+
+        Args:
+            landmarks (ndarray): (33, 3) array of normalized x, y and visibility, or None.
+
+        Returns:
+            String: Compilation of all the responses for the 3 conditions in one string.
+        """
+        with stage('rules'):
+            verdicts = evaluate_landmarks(landmarks, self.thresholds)
+        if verdicts is None:
+            if landmarks is None:
+                return IMPROPER_PICTURE_MESSAGE, None, None
+            return IMPROPER_PICTURE_MESSAGE, landmarks, landmarks[:, 2]
+        return "".join(f"{verdict}\n" for verdict in verdicts)
+
+
+def evaluate_landmarks(landmarks, thresholds=THRESHOLDS):
+    """Scores desk posture from pose landmarks without running any model.
+
+    Args:
+        landmarks (ndarray): (33, 3) array of normalized x, y and visibility, or None.
+        thresholds (dict): Rule thresholds, defaults to THRESHOLDS.
+
+    Returns:
+        List: neutral/positive/negative for arm angle, eye angle and elbow position (empty
+        when the facing side is ambiguous), None when the picture is unusable.
+    """
+    if landmarks is None:
+        logger.warning("No pose landmarks detected.")
+        return None
+
+    # Extract keypoints and visibility scores
+    keypoints = landmarks[:, :2]
+    scores = landmarks[:, 2]
+    logger.debug(f"Keypoints: {keypoints}")
+    logger.debug(f"Visibility scores: {scores}")
+
+    # Define keypoints of interest
+    keypoints_of_interest_indices = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11]
+    low_confidence_points = np.sum(scores[keypoints_of_interest_indices] < thresholds['confidence'])
+    if low_confidence_points / len(keypoints_of_interest_indices) > thresholds['low_confidence_ratio']:
+        logger.warning("Low confidence in more than 75% of keypoints.")
+        return None
+
+    # Extract specific landmarks
+    nose, left_eye, right_eye, left_ear, right_ear, left_shoulder, right_shoulder, left_elbow, right_elbow, left_wrist, right_wrist, left_hip, right_hip = \
+        keypoints[[0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]]
+
+    # Determine facing direction by comparing the horizontal positions of the nose and ears
+    facing_side = "right" if abs(nose[0] - left_ear[0]) < abs(nose[0] - right_ear[0]) else "left" if abs(
+        nose[0] - left_ear[0]) > abs(nose[0] - right_ear[0]) else "ambiguous"
+
+    logger.info(f"Facing side determined: {facing_side}")
+
+    verdicts = []
+
+    if facing_side != "ambiguous":
+        # Select shoulder, elbow, wrist, hip, eye, and ear based on facing direction
+        shoulder, elbow, wrist, hip, eye, ear = (
+            (right_shoulder, right_elbow, right_wrist, right_hip, right_eye, right_ear) 
+            if facing_side == "left" else 
+            (left_shoulder, left_elbow, left_wrist, left_hip, left_eye, left_ear)
+        )
+
+        # Calculate angles between specific landmarks
+        shoulder_elbow_wrist_angle = DeskPoseAnalyzer.calculate_angle(shoulder, elbow, wrist)
+        eye_angle = DeskPoseAnalyzer.calculate_horizontal_angle(eye, ear)
+        
+        logger.info(f"Shoulder-Elbow-Wrist angle: {shoulder_elbow_wrist_angle:.2f}")
+        logger.info(f"Eye angle: {eye_angle:.2f}")
+        
+        # Normalize wrist coordinates by subtracting shoulder coordinates
+        normalized_wrist = [(wrist[0] - shoulder[0])/shoulder[0], (wrist[1] - shoulder[1])/shoulder[1]]
+        logger.debug(f"Normalized wrist coordinates: {normalized_wrist}")
+        
+        # Determine posture based on angles
+        if shoulder_elbow_wrist_angle < thresholds['angle_low']:
+            verdicts.append("positive")
+        elif shoulder_elbow_wrist_angle > thresholds['angle_high']:
+            verdicts.append("negative")
+        else:
+            # Check if the normalized wrist coordinates are higher than the normalized shoulder coordinates
+            if normalized_wrist[1] < thresholds['wrist_height']:  # Assuming a lower y-coordinate means higher in your coordinate system
+                verdicts.append("negative")
+            else:
+                verdicts.append("neutral")
+        
+        # Determine eye angle posture
+        if eye_angle > thresholds['eye_angle_low'] and eye_angle < thresholds['eye_angle_high']:
+            verdicts.append("positive")
+        elif eye_angle > thresholds['eye_angle_high']:
+            verdicts.append("negative")
+        else:
+            verdicts.append("neutral")
+
+        # Check elbow position relative to shoulder-hip line
+        elbow_position = DeskPoseAnalyzer.is_elbow_behind_shoulder_hip_line(facing_side, shoulder, hip, elbow, wrist)
+        if elbow_position == 0:
+            verdicts.append("neutral")
+        elif elbow_position == 1:
+            verdicts.append("positive")
+        else:
+            verdicts.append("negative")
+    return verdicts
@@ -0,0 +1,189 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from .image_buffer import DecodedImage, pixel_digest
+from .model_registry import registry
+from .timing import stage
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+SCREEN_CLASSES = ('laptop', 'monitor', 'tv')
+FURNITURE_CLASSES = ('chair',) + SCREEN_CLASSES
+
+
+class ObjectDetector:
+    """Single YOLOv5 detection service shared by every analyzer in the process.
+
+    The network runs once per distinct image and all of its boxes are kept in a
+    small LRU cache keyed by the image hash, so BackAngle, advanced_posture and
+    armpose analysing the same upload only pay for one forward pass.
+    """
+
+    def __init__(self, model_name='yolov5s', cache_size=32):
+        """Defines the parameters to be used in the operations for this class.
+
+        Args:
+            model_name (String): Registry key of the YOLO model
+            cache_size (int): Number of images whose detections are kept
+        """
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    image_key = staticmethod(pixel_digest)
+
+    def _cached(self, key):
+        with self._cache_lock:
+            detections = self._cache.get(key)
+            if detections is not None:
+                self._cache.move_to_end(key)
+            return detections
+
+    def _count(self, hits=0, misses=0):
+        # Gunicorn threads and the batch pool share the detector, so the metrics counters take the cache lock
+        with self._cache_lock:
+            self.hits += hits
+            self.misses += misses
+
+    def _store(self, key, detections):
+        with self._cache_lock:
+            self._cache[key] = detections
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _run(self, image, key):
+        """Runs one forward pass and converts the boxes to plain dicts."""
+        with registry.checkout(self.model_name) as model:
+            # A concurrent request for the same image may have filled the cache while we waited
+            detections = self._cached(key)
+            if detections is not None:
+                self._count(hits=1)
+                return detections
+            self._count(misses=1)
+            with stage('yolo'):
+                results = model(image)
+        detections = self._detections(results, 0)
+        self._store(key, detections)
+        return detections
+
+    @staticmethod
+    def _detections(results, index):
+        """Converts the boxes of one image of a YOLO result to plain dicts, most confident first."""
+        names = results.names
+        detections = []
+        for xmin, ymin, xmax, ymax, confidence, cls in results.xyxy[index].cpu().numpy().tolist():
+            detections.append({
+                'name': names[int(cls)],
+                'confidence': float(confidence),
+                'xmin': float(xmin),
+                'ymin': float(ymin),
+                'xmax': float(xmax),
+                'ymax': float(ymax),
+            })
+        detections.sort(key=lambda d: d['confidence'], reverse=True)
+        return detections
+
+    @staticmethod
+    def select(detections, classes=FURNITURE_CLASSES, min_confidence=0.0):
+        """Keeps the detections of the given classes above a confidence, most confident first.
+
+        Args:
+            detections (List): Detections as detect() or detect_batch() returned them
+            classes (List): Class names to keep, None keeps every class
+            min_confidence (float): Boxes below this confidence are dropped
+
+        Returns:
+            List: The matching detections, in their original order
+        """
+        return [d for d in detections
+                if (classes is None or d['name'] in classes) and d['confidence'] > min_confidence]
+
+    def detect(self, image, classes=FURNITURE_CLASSES, min_confidence=0.0, key=None):
+        """Detects objects in an image, reusing earlier results for the same image.
+
+        Args:
+            image (DecodedImage | ndarray): Decoded upload or BGR image as read by OpenCV
+            classes (List): Class names to keep, None keeps every class
+            min_confidence (float): Boxes below this confidence are dropped
+            key (String): Precomputed image hash, computed from the pixels if omitted
+
+        Returns:
+            List: Detections sorted by confidence, each a dict with name,
+            confidence, xmin, ymin, xmax and ymax
+        """
+        if isinstance(image, DecodedImage):
+            key = key or image.key
+            image = image.bgr
+        key = key or self.image_key(image)
+        detections = self._cached(key)
+        if detections is None:
+            detections = self._run(image, key)
+        else:
+            self._count(hits=1)
+            logger.debug(f"Detection cache hit for image {key}")
+        return self.select(detections, classes, min_confidence)
+
+    def detect_batch(self, images, classes=FURNITURE_CLASSES, min_confidence=0.0):
+        """Detects objects in several images with a single forward pass.
+
+        Images already in the cache are not run again, and an image appearing
+        twice is run once. The boxes of every image are cached, so analyzers
+        that later call detect() on one of these images skip the model.
+
+        Args:
+            images (List): DecodedImage per picture
+            classes (List): Class names to keep, None keeps every class
+            min_confidence (float): Boxes below this confidence are dropped
+
+        Returns:
+            List: Detections of each image in input order, as detect() returns them
+        """
+        found = {}
+        pending = {}
+        for image in images:
+            detections = self._cached(image.key)
+            if detections is not None:
+                found[image.key] = detections
+            elif image.key not in found:
+                pending[image.key] = image
+
+        if pending:
+            with registry.checkout(self.model_name) as model:
+                self._count(misses=len(pending))
+                with stage('yolo'):
+                    results = model([image.bgr for image in pending.values()])
+            for index, key in enumerate(pending):
+                found[key] = self._detections(results, index)
+                self._store(key, found[key])
+        self._count(hits=len(images) - len(pending))
+
+        return [self.select(found[image.key], classes, min_confidence) for image in images]
+
+    def best(self, image, classes, min_confidence=0.0, key=None, detections=None):
+        """Returns the most confident detection among the given classes.
+
+        Args:
+            image (DecodedImage | ndarray): Decoded upload or BGR image as read by OpenCV
+            classes (List): Class names to consider
+            min_confidence (float): Boxes below this confidence are ignored
+            key (String): Precomputed image hash
+            detections (List): Every detection of the image from an earlier
+                detect_batch(classes=None), skips the cache and the model
+
+        Returns:
+            dict: The best detection or None when nothing was found
+        """
+        if detections is not None:
+            detections = self.select(detections, classes, min_confidence)
+        else:
+            detections = self.detect(image, classes=classes, min_confidence=min_confidence, key=key)
+        return detections[0] if detections else None
+
+
+detector = ObjectDetector()
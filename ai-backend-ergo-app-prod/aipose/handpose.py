@@ -1,37 +1,44 @@
-import mediapipe as mp
 import numpy as np
-import os
-import requests
-from mediapipe.tasks import python
-from mediapipe.tasks.python import vision
 import logging
+from .image_buffer import DecodedImage
+from .model_registry import registry
+from .timing import stage
 
 # Initialize logger
 logger = logging.getLogger('myapp')
 
-def download_model(url, save_path):
-    """Download the AI model if not present on system.
+NO_HANDS_MESSAGE = "No hands detected. Please take another picture."
+
+# Rule thresholds. Bump RULES_VERSION whenever they change so stored landmarks get re-scored
+RULES_VERSION = 1
+THRESHOLDS = {
+    'bend_buffer': 0.05,        # neutral band around the wrist and middle MCP height
+    'flexion_buffer': 0.05,     # neutral band around the wrist height
+    'claw_distance': 0.15,      # fingertip to PIP distance under which a finger counts as bent
+    'claw_fingers': 3,          # bent fingers from which the grip counts as a claw
+}
+
+
+def hand_landmarks_array(landmarks):
+    """Converts MediaPipe hand landmarks into a plain array.
 
     Args:
-        url (String): Location where model is on the web
-        save_path (String): Path to save the model after download
+        landmarks (List | ndarray): 21 NormalizedLandmark of one hand, or an array already converted
+
+    Returns:
+        ndarray: (21, 3) array of normalized x, y and z
     """
-    if not os.path.exists(save_path):
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            with open(save_path, 'wb') as file:
-                file.write(response.content)
-            logger.info(f"Model downloaded and saved as {save_path}")
-        except requests.RequestException as e:
-            logger.error(f"An error occurred while downloading the model: {e}")
-
-
-def analyze_hand_bend(landmarks):
+    if isinstance(landmarks, np.ndarray):
+        return landmarks
+    return np.array([[lm.x, lm.y, lm.z] for lm in landmarks])
+
+
+def analyze_hand_bend(landmarks, thresholds=THRESHOLDS):
     """Checks if the hands are bent 
 
     Args:
-        landmarks (Array): Contains an array of all the points and their x and y coordinates
+        landmarks (ndarray): (21, 3) array of normalized x, y and z, or the MediaPipe landmarks of one hand
+        thresholds (dict): Rule thresholds, defaults to THRESHOLDS
 
     Returns:
         String: Positive, negative, neutral depending on how the hand is.
@@ -40,15 +47,16 @@ def analyze_hand_bend(landmarks):
         No bend is neutral.
     """
     # Extract relevant landmarks
+    landmarks = hand_landmarks_array(landmarks)
     wrist = landmarks[0]
     middle_mcp = landmarks[9]
     middle_tip = landmarks[12]
 
-    buffer = 0.05  # Adjusted buffer for neutral category
-    if middle_tip.y < middle_mcp.y - buffer and middle_tip.y < wrist.y - buffer:
+    buffer = thresholds['bend_buffer']  # Adjusted buffer for neutral category
+    if middle_tip[1] < middle_mcp[1] - buffer and middle_tip[1] < wrist[1] - buffer:
         logger.info(f"Hand bend detected: Overbend (Positive) - Wrist: {wrist}, Middle MCP: {middle_mcp}, Middle Tip: {middle_tip}")
         return "Positive\n"
-    elif middle_tip.y > middle_mcp.y + buffer and middle_tip.y > wrist.y + buffer:
+    elif middle_tip[1] > middle_mcp[1] + buffer and middle_tip[1] > wrist[1] + buffer:
         logger.info(f"Hand bend detected: Underbend (Negative) - Wrist: {wrist}, Middle MCP: {middle_mcp}, Middle Tip: {middle_tip}")
         return "Negative\n"
     else:
@@ -56,11 +64,12 @@ def analyze_hand_bend(landmarks):
         return "Neutral\n"
 
 
-def analyze_wrist_flexion(landmarks):
+def analyze_wrist_flexion(landmarks, thresholds=THRESHOLDS):
     """Checks if the hands are flexed
 
     Args:
-        landmarks (Array): Contains an array of all the points and their x and y coordinates
+        landmarks (ndarray): (21, 3) array of normalized x, y and z, or the MediaPipe landmarks of one hand
+        thresholds (dict): Rule thresholds, defaults to THRESHOLDS
 
     Returns:
         String: Positive, negative, neutral depending on how the hand is.
@@ -69,15 +78,16 @@ def analyze_wrist_flexion(landmarks):
         No flexion is neutral.
     """
     # Extract relevant landmarks
+    landmarks = hand_landmarks_array(landmarks)
     wrist = landmarks[0]
     index_mcp = landmarks[5]
     pinky_mcp = landmarks[17]
 
-    buffer = 0.05  # Adjusted buffer for neutral category
-    if index_mcp.y < wrist.y - buffer and pinky_mcp.y < wrist.y - buffer:
+    buffer = thresholds['flexion_buffer']  # Adjusted buffer for neutral category
+    if index_mcp[1] < wrist[1] - buffer and pinky_mcp[1] < wrist[1] - buffer:
         logger.info(f"Wrist flexion detected: Overflexion (Positive) - Wrist: {wrist}, Index MCP: {index_mcp}, Pinky MCP: {pinky_mcp}")
         return "Positive\n"
-    elif index_mcp.y > wrist.y + buffer and pinky_mcp.y > wrist.y + buffer:
+    elif index_mcp[1] > wrist[1] + buffer and pinky_mcp[1] > wrist[1] + buffer:
         logger.info(f"Wrist flexion detected: Underflexion (Negative) - Wrist: {wrist}, Index MCP: {index_mcp}, Pinky MCP: {pinky_mcp}")
         return "Negative\n"
     else:
@@ -85,25 +95,65 @@ def analyze_wrist_flexion(landmarks):
         return "Neutral\n"
 
 
-def analyze_claw_grip(landmarks):
+def analyze_claw_grip(landmarks, thresholds=THRESHOLDS):
     """Checks if hand is like a claw when operating mouse
 
     Args:
-        landmarks (Array): Contains an array of all the points and their x and y coordinates
+        landmarks (ndarray): (21, 3) array of normalized x, y and z, or the MediaPipe landmarks of one hand
+        thresholds (dict): Rule thresholds, defaults to THRESHOLDS
     Returns:
          String: Positive, negative depending on how the hand is.
         No claw grip is positive,
         Claw grip is negative.
     """
-    threshold = 0.15  # Slightly increased threshold for neutral category
-    bent_fingers = sum(
-        np.linalg.norm(np.array([landmarks[tip_index].x, landmarks[tip_index].y]) -
-                       np.array([landmarks[tip_index - 2].x, landmarks[tip_index - 2].y])) < threshold
-        for tip_index in [8, 12, 16, 20]
-    )
+    landmarks = hand_landmarks_array(landmarks)
+    threshold = thresholds['claw_distance']  # Slightly increased threshold for neutral category
+    tips = [8, 12, 16, 20]
+    distances = np.linalg.norm(landmarks[tips, :2] - landmarks[[tip - 2 for tip in tips], :2], axis=1)
+    bent_fingers = int(np.sum(distances < threshold))
+    is_claw = bent_fingers >= thresholds['claw_fingers']
+
+    logger.info(f"Claw grip detected: {'Claw grip (Negative)' if is_claw else 'No claw grip (Positive)'} - Bent fingers: {bent_fingers}")
+    return "Negative\n" if is_claw else "Positive\n"
 
-    logger.info(f"Claw grip detected: {'Claw grip (Negative)' if bent_fingers >= 3 else 'No claw grip (Positive)'} - Bent fingers: {bent_fingers}")
-    return "Negative\n" if bent_fingers >= 3 else "Positive\n"
+
+def evaluate_landmarks(landmarks, thresholds=THRESHOLDS):
+    """Scores one hand from its landmarks without running any model
+
+    Args:
+        landmarks (ndarray): (21, 3) array of normalized x, y and z
+        thresholds (dict): Rule thresholds, defaults to THRESHOLDS
+
+    Returns:
+        List: Positive/Negative/Neutral for hand bend, wrist flexion and claw grip
+    """
+    return [
+        analyze_hand_bend(landmarks, thresholds).strip(),
+        analyze_wrist_flexion(landmarks, thresholds).strip(),
+        analyze_claw_grip(landmarks, thresholds).strip(),
+    ]
+
+
+def detect_hands(image):
+    """Runs the pooled hand landmarker only, leaving the rules to evaluate_landmarks
+
+    Args:
+        image (DecodedImage | String): Decoded upload, or location of the image
+
+    Returns:
+        List: (21, 3) landmark array for each detected hand
+    """
+    # Reuse the upload decoded for the other analyzers
+    image = DecodedImage.coerce(image).mp_image
+    # Detect hand landmarks in the image
+    with registry.checkout('hand_landmarker') as detector, stage('hands'):
+        detection_result = detector.detect(image)
+
+    hands = []
+    for i, handedness_list in enumerate(detection_result.handedness):
+        for _ in handedness_list:
+            hands.append(hand_landmarks_array(detection_result.hand_landmarks[i]))
+    return hands
 
 
 def get_landmarks_string(detection_result):
@@ -118,11 +168,9 @@ def get_landmarks_string(detection_result):
     results = ""
     for i, handedness_list in enumerate(detection_result.handedness):
         for _ in handedness_list:
-            landmarks = detection_result.hand_landmarks[i]
+            landmarks = hand_landmarks_array(detection_result.hand_landmarks[i])
             # Analyze hand bend, wrist flexion, and claw grip for each detected hand
-            results += analyze_hand_bend(landmarks)
-            results += analyze_wrist_flexion(landmarks)
-            results += analyze_claw_grip(landmarks)
+            results += "".join(f"{verdict}\n" for verdict in evaluate_landmarks(landmarks))
     return results
 
 
@@ -138,41 +186,49 @@ class HandPoseAnalyzer:
     def __init__(self):
         """Defines the parameters to be used in the operations for this class.
         """
-        self.detector = None
-        self.options = None
-        self.model_url = ('https://storage.googleapis.com/mediapipe-models/hand_landmarker/hand_landmarker/float16/1'
-                          '/hand_landmarker.task')
-        self.model_path = 'hand_landmarker.task'
-        # Download the model if not already present
-        download_model(self.model_url, self.model_path)
         # Set up the hand detector
         self.setup_detector()
 
     def setup_detector(self):
-        """Start up the hand detector.
+        """Start up the hand detector pool, shared by every analyzer in the process.
         """
-        base_options = python.BaseOptions(model_asset_path=self.model_path)
-        self.options = vision.HandLandmarkerOptions(base_options=base_options, num_hands=2)
-        self.detector = vision.HandLandmarker.create_from_options(self.options)
+        registry.get('hand_landmarker')
 
-    def analyze_hand_pose(self, image_path):
+    def analyze_hand_pose(self, image):
         """Analyzes the hand image
 
         Args:
-            image_path (String): Location of the image
+            image (DecodedImage | String): Decoded upload, or location of the image
 
         Returns:
             String: Compilation of all the responses for flexion, bend, claw grip in one string
         """
-        # Read the image from the file
-        image = mp.Image.create_from_file(image_path)
-        # Detect hand landmarks in the image
-        detection_result = self.detector.detect(image)
+        return self.analyze_landmarks(self.detect_landmarks(image))
+
+    def detect_landmarks(self, image):
+        """Runs the hand landmarker only, leaving the rules to analyze_landmarks
+
+        Args:
+            image (DecodedImage | String): Decoded upload, or location of the image
+
+        Returns:
+            List: (21, 3) landmark array for each detected hand
+        """
+        return detect_hands(image)
 
-        if not detection_result.hand_landmarks:
+    def analyze_landmarks(self, hands):
+        """Applies the hand rules to landmarks from any hand landmarker pass
+
+        Args:
+            hands (List): (21, 3) landmark array for each detected hand
+
+        Returns:
+            String: Compilation of all the responses for flexion, bend, claw grip in one string
+        """
+        if not len(hands):
             logger.warning("No hands detected.")
-            return "No hands detected. Please take another picture."
+            return NO_HANDS_MESSAGE
 
         # Get the analysis results for the detected hand landmarks
-        results = get_landmarks_string(detection_result)
-        return results
+        with stage('rules'):
+            return "".join(f"{verdict}\n" for hand in hands for verdict in evaluate_landmarks(hand))
@@ -0,0 +1,291 @@
+import hashlib
+import io
+import os
+
+import cv2
+import numpy as np
+from django.conf import settings
+from PIL import Image, UnidentifiedImageError
+
+from .timing import stage
+
+# EXIF tag holding the camera orientation of a photo
+ORIENTATION_TAG = 0x0112
+
+
+def pixel_digest(image):
+    """Hashes the pixel buffer of an image.
+
+    Args:
+        image (ndarray): Image array
+
+    Returns:
+        String: Hex digest identifying the image content
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str((image.shape, image.dtype.str)).encode())
+    digest.update(np.ascontiguousarray(image).data)
+    return digest.hexdigest()
+
+
+# OpenCV flags decoding a JPEG at 1/8, 1/4 and 1/2 of its size through libjpeg DCT scaling
+REDUCED_DECODE_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+
+# EXIF orientations that rotate the picture by 90 degrees, swapping width and height
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+# Formats PIL identifies that cv2.imdecode can also read; GIF, ICO, TGA and the like are rejected up front
+DECODABLE_FORMATS = ('JPEG', 'PNG', 'WEBP', 'BMP', 'TIFF', 'PPM', 'JPEG2000')
+
+
+def probe_size(data):
+    """Reads the size of an encoded image from its header, without decoding the pixels.
+
+    Args:
+        data (bytes): JPEG or PNG file contents
+
+    Raises:
+        ValueError: Triggered when the bytes are not a readable image, or in a
+            format OpenCV cannot decode
+
+    Returns:
+        tuple: (width, height) after EXIF orientation, as OpenCV decodes it
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+            orientation = image.getexif().get(ORIENTATION_TAG, 1)
+            image_format = image.format
+    except (UnidentifiedImageError, OSError, SyntaxError):
+        raise ValueError("Invalid image file. Please check the image path and format.")
+    if image_format not in DECODABLE_FORMATS:
+        raise ValueError(f"Unsupported image format {image_format}. Please upload a JPEG or PNG photo.")
+    if orientation in TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+    return width, height
+
+
+def decode_reduced(data, factor):
+    """Decodes an image at the coarsest DCT scale not exceeding a reduction factor.
+
+    Args:
+        data (bytes): JPEG or PNG file contents (PNG has no DCT scaling and is
+            decoded at full size, then reduced by OpenCV)
+        factor (float): Largest acceptable reduction, e.g. 3.1 decodes at 1/2
+
+    Raises:
+        ValueError: Triggered when the bytes are not a readable image
+
+    Returns:
+        ndarray: BGR image with EXIF orientation applied
+    """
+    flag = cv2.IMREAD_COLOR
+    for scale, reduced_flag in REDUCED_DECODE_FLAGS:
+        if factor >= scale:
+            flag = reduced_flag
+            break
+    with stage('decode'):
+        bgr = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), flag)
+    if bgr is None:
+        raise ValueError("Invalid image file. Please check the image path and format.")
+    return bgr
+
+
+def shrink(image, long_edge):
+    """Resizes an image so its long edge is long_edge, keeping the aspect ratio.
+
+    An integer INTER_AREA step removes most of the pixels and a second
+    INTER_AREA step the remainder; INTER_AREA at a fractional ratio is
+    several times slower on large buffers, but cheap once the image is within
+    2x of the target.
+    """
+    height, width = image.shape[:2]
+    if max(height, width) <= long_edge:
+        return image
+    scale = long_edge / max(height, width)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    factor = int(max(height, width) / long_edge)
+    if factor >= 2:
+        image = cv2.resize(image, (width // factor, height // factor), interpolation=cv2.INTER_AREA)
+    return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+
+class DecodedImage:
+    """An uploaded image decoded once and shared by every analyzer.
+
+    The encoded upload is kept and decoded on demand. bgr is the full
+    resolution buffer OpenCV decodes (EXIF orientation applied), rgb_view is a
+    zero-copy view of it and rgb a contiguous RGB copy (converted at most once).
+    inference_rgb is the copy MediaPipe runs on, no larger than
+    INFERENCE_LONG_EDGE; it is decoded straight from the JPEG at a reduced DCT
+    scale, so pose and hand analysis of a 12 MP upload never pays for the full
+    decode. mp_image wraps it for the MediaPipe tasks API. MediaPipe returns
+    normalized coordinates, so landmarks found on the small copy map straight
+    back onto the full resolution bgr buffer.
+    """
+
+    def __init__(self, bgr=None, digest=None, data=None, size=None):
+        """Defines the parameters to be used in the operations for this class.
+
+        Args:
+            bgr (ndarray): HxWx3 uint8 image in OpenCV channel order, decoded from data when omitted
+            digest (String): SHA-256 of the encoded upload, if known
+            data (bytes): Encoded upload, required when bgr is omitted
+            size (tuple): (width, height) of the upload after EXIF orientation
+        """
+        self._bgr = bgr
+        self.digest = digest
+        self._data = data
+        self._size = size
+        self._rgb = None
+        self._inference_rgb = None
+        self._mp_image = None
+        self._key = None
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Wraps an encoded image, reading only its header until pixels are needed.
+
+        Args:
+            data (bytes): JPEG or PNG file contents
+
+        Raises:
+            ValueError: Triggered when the bytes are not a readable image
+
+        Returns:
+            DecodedImage: The image, decoded lazily
+        """
+        return cls(data=data, digest=hashlib.sha256(data).hexdigest(), size=probe_size(data))
+
+    @classmethod
+    def from_upload(cls, upload):
+        """Decodes a multipart upload without saving it under media/.
+
+        Args:
+            upload (UploadedFile): File from request.FILES
+
+        Returns:
+            DecodedImage: The decoded image
+        """
+        upload.seek(0)
+        return cls.from_bytes(upload.read())
+
+    @classmethod
+    def from_path(cls, image_path):
+        """Compatibility shim for callers that still pass a file path.
+
+        Args:
+            image_path (String): Path of image file
+
+        Raises:
+            ValueError: Triggered when the file is missing or not a readable image
+
+        Returns:
+            DecodedImage: The decoded image
+        """
+        if not os.path.isfile(image_path):
+            raise ValueError("Invalid image file. Please check the image path and format.")
+        with open(image_path, 'rb') as image_file:
+            return cls.from_bytes(image_file.read())
+
+    @classmethod
+    def coerce(cls, image):
+        """Accepts whatever an analyzer was given and returns a DecodedImage.
+
+        Args:
+            image (DecodedImage | String | ndarray): Decoded image, file path or BGR array
+
+        Returns:
+            DecodedImage: The decoded image
+        """
+        if isinstance(image, cls):
+            return image
+        if isinstance(image, np.ndarray):
+            return cls(image)
+        return cls.from_path(os.fspath(image))
+
+    @property
+    def bgr(self):
+        """Full resolution BGR buffer, decoded on first use."""
+        if self._bgr is None:
+            with stage('decode'):
+                bgr = cv2.imdecode(np.frombuffer(self._data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if bgr is None:
+                raise ValueError("Invalid image file. Please check the image path and format.")
+            self._bgr = bgr
+        return self._bgr
+
+    @property
+    def shape(self):
+        """(height, width, 3) of the full resolution image, known without decoding it."""
+        if self._bgr is None and self._size is not None:
+            return (self._size[1], self._size[0], 3)
+        return self.bgr.shape
+
+    @property
+    def key(self):
+        """Content hash used to share detector and analysis results between callers."""
+        if self._key is None:
+            self._key = self.digest or pixel_digest(self.bgr)
+        return self._key
+
+    @property
+    def rgb_view(self):
+        """Zero-copy RGB view of the BGR buffer (not contiguous)."""
+        return self.bgr[..., ::-1]
+
+    @property
+    def rgb(self):
+        """Contiguous RGB copy, converted once and shared by every analyzer."""
+        if self._rgb is None:
+            with stage('convert'):
+                self._rgb = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB)
+        return self._rgb
+
+    @property
+    def inference_rgb(self):
+        """Contiguous RGB copy whose long edge is at most INFERENCE_LONG_EDGE, for the pose and hand models.
+
+        Large uploads are decoded at the coarsest JPEG scale (1/2, 1/4 or 1/8)
+        that keeps the long edge at or above the target, so decode time and
+        memory follow the target resolution rather than the upload. The
+        remaining shrink happens before the colour conversion. Smaller images
+        are not upscaled.
+        """
+        if self._inference_rgb is None:
+            height, width = self.shape[:2]
+            long_edge = settings.INFERENCE_LONG_EDGE
+            if not long_edge or max(height, width) <= long_edge:
+                self._inference_rgb = self.rgb
+            else:
+                if self._data is not None:
+                    small = decode_reduced(self._data, max(height, width) / long_edge)
+                else:
+                    small = self.bgr
+                with stage('downscale'):
+                    small = shrink(small, long_edge)
+                with stage('convert'):
+                    self._inference_rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        return self._inference_rgb
+
+    def thumbnail(self, long_edge):
+        """Small BGR copy whose long edge is at most long_edge, for checks that must not pay for a full decode.
+
+        Like inference_rgb, a JPEG upload is decoded at a reduced DCT scale
+        unless the full buffer is already decoded. The copy is not kept.
+        """
+        height, width = self.shape[:2]
+        if self._bgr is None and self._data is not None:
+            small = decode_reduced(self._data, max(height, width) / long_edge)
+        else:
+            small = self.bgr
+        with stage('downscale'):
+            return shrink(small, long_edge)
+
+    @property
+    def mp_image(self):
+        """MediaPipe image wrapping the inference RGB pixels."""
+        if self._mp_image is None:
+            import mediapipe as mp
+            self._mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=self.inference_rgb)
+        return self._mp_image
@@ -0,0 +1,334 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+# Job states, a job only moves forward through them
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+FINISHED = (DONE, FAILED)
+
+# Job kind to handler, to the version its results are cached under, to
+# the options clients may pass at submit time, to the function checking them
+# and to the assessment checks its upload must pass the quality gate for, see
+# register_job
+JOB_KINDS = {}
+JOB_VERSIONS = {}
+JOB_OPTIONS = {}
+JOB_VALIDATORS = {}
+JOB_GATES = {}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def register_job(kind, version=None, options=(), validate=None, gate=()):
+    """Registers a handler for a kind of job.
+
+    The handler runs in a job worker process and receives the job directory
+    (holding the uploaded `input` file) plus the options given at submit time.
+    It returns a JSON-serializable result; images go to the media store.
+
+    Args:
+        kind (String): Name the job is submitted with
+        version (Callable): Returns the version results are cached under, None disables caching
+        options (tuple): Names of the keyword arguments clients may set when submitting
+        validate (Callable): Called with the options at submit time, raises ValueError for invalid ones
+        gate (tuple): Checks of quality_gate.gate the upload is screened for before the job is queued
+    """
+    def decorator(handler):
+        JOB_KINDS[kind] = handler
+        JOB_OPTIONS[kind] = tuple(options)
+        if validate is not None:
+            JOB_VALIDATORS[kind] = validate
+        JOB_GATES[kind] = tuple(gate)
+        if version is not None:
+            JOB_VERSIONS[kind] = version
+        return handler
+    return decorator
+
+
+def _cache_key(kind, image_key, options):
+    """Result cache key of a job, None for kinds that are not cached."""
+    if kind not in JOB_VERSIONS:
+        return None
+    from .result_cache import ResultCache
+    return ResultCache.make_key(image_key, f"job:{kind}", json.dumps(options, sort_keys=True), JOB_VERSIONS[kind]())
+
+
+def job_dir(job_id):
+    return os.path.join(settings.JOBS_ROOT, job_id)
+
+
+def _state_path(job_id):
+    return os.path.join(job_dir(job_id), 'state.json')
+
+
+def _write_state(state):
+    """Writes a job state atomically so pollers never read a half-written file."""
+    path = _state_path(state['id'])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as state_file:
+        json.dump(state, state_file)
+    os.replace(tmp_path, path)
+
+
+def get_job(job_id):
+    """Reads the current state of a job.
+
+    Args:
+        job_id (String): Id returned by submit
+
+    Returns:
+        dict: Job state (id, kind, status, timestamps, result or error), None when unknown
+    """
+    try:
+        with open(_state_path(job_id)) as state_file:
+            return json.load(state_file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _init_worker():
+    """Prepares a freshly spawned worker process to load models."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aipose.settings')
+    import django
+    django.setup()
+
+
+def executor():
+    """Returns the process pool draining the job queue, started on first use.
+
+    Workers are spawned rather than forked so they never inherit MediaPipe or
+    torch threads from the web process. Each worker loads its own models once
+    and keeps them for every job it runs. A pool broken by a crashed worker is
+    replaced, see _discard_executor.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.JOB_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker)
+    return _executor
+
+
+def _discard_executor(broken):
+    """Drops a pool a worker died in (OOM kill, segfault in MediaPipe or torch), so the next job starts a new one."""
+    global _executor
+    with _executor_lock:
+        if _executor is not broken:
+            return
+        _executor = None
+    logger.error("A job worker died, restarting the job pool")
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _fail_lost_job(job_id, error):
+    """Marks a job the dead pool took with it as failed, unless its worker finished it first."""
+    state = get_job(job_id)
+    if state is None or state['status'] in FINISHED:
+        return
+    state.update(status=FAILED, error=error, finished_at=time.time())
+    _write_state(state)
+
+
+def _watch(job_id, pool):
+    """Done callback of a queued job: only a broken pool needs handling, run_job records everything else."""
+    def done(future):
+        if not future.cancelled() and not isinstance(future.exception(), BrokenProcessPool):
+            return
+        _discard_executor(pool)
+        _fail_lost_job(job_id, "The job worker stopped unexpectedly. Please submit the job again.")
+    return done
+
+
+def run_job(job_id):
+    """Runs one queued job, called inside a job worker process.
+
+    Args:
+        job_id (String): Id returned by submit
+    """
+    state = get_job(job_id)
+    state.update(status=RUNNING, started_at=time.time())
+    _write_state(state)
+
+    try:
+        handler = JOB_KINDS[state['kind']]
+        state.update(status=DONE, result=handler(job_dir(job_id), **state['options']))
+        cache_key = _cache_key(state['kind'], state['image_key'], state['options'])
+        if cache_key is not None:
+            from .result_cache import result_cache
+            result_cache.put(cache_key, state['result'])
+    except Exception as e:
+        logger.error(f"Job {job_id} ({state['kind']}) failed: {e}")
+        state.update(status=FAILED, error=str(e))
+    finally:
+        state['finished_at'] = time.time()
+        _write_state(state)
+
+
+def submit(kind, data, **options):
+    """Queues a job and returns at once.
+
+    Args:
+        kind (String): Registered job kind
+        data (bytes): Uploaded file, stored as the job input
+        **options: JSON-serializable arguments for the handler
+
+    Raises:
+        KeyError: Triggered when no handler is registered for the kind
+        ValueError: Triggered when the kind's validator rejects the options
+
+    Returns:
+        dict: Initial job state, including the job id
+    """
+    if kind not in JOB_KINDS:
+        raise KeyError(f"Unknown job kind '{kind}'")
+    if kind in JOB_VALIDATORS:
+        JOB_VALIDATORS[kind](**options)
+    purge_expired()
+
+    job_id = uuid.uuid4().hex
+    os.makedirs(job_dir(job_id))
+    with open(os.path.join(job_dir(job_id), 'input'), 'wb') as input_file:
+        input_file.write(data)
+
+    state = {
+        'id': job_id,
+        'kind': kind,
+        'status': QUEUED,
+        'options': options,
+        # Same digest as DecodedImage.from_bytes, so jobs share the analysis result cache
+        'image_key': hashlib.sha256(data).hexdigest(),
+        'created_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+        'result': None,
+        'error': None,
+    }
+
+    # A photo analysed before finishes at once without reaching a worker
+    cache_key = _cache_key(kind, state['image_key'], options)
+    if cache_key is not None:
+        from .result_cache import result_cache
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            state.update(status=DONE, result=cached, started_at=state['created_at'], finished_at=time.time())
+            _write_state(state)
+            logger.info(f"Served {kind} job {job_id} from the result cache")
+            return state
+
+    _write_state(state)
+    pool = executor()
+    try:
+        future = pool.submit(run_job, job_id)
+    except BrokenProcessPool:
+        # The pool broke between two jobs; its own callbacks fail the jobs it lost
+        _discard_executor(pool)
+        pool = executor()
+        future = pool.submit(run_job, job_id)
+    future.add_done_callback(_watch(job_id, pool))
+    logger.info(f"Queued {kind} job {job_id}")
+    return state
+
+
+def purge_expired():
+    """Deletes job directories older than JOB_TTL_SECONDS."""
+    if not os.path.isdir(settings.JOBS_ROOT):
+        return
+    cutoff = time.time() - settings.JOB_TTL_SECONDS
+    for job_id in os.listdir(settings.JOBS_ROOT):
+        path = job_dir(job_id)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                shutil.rmtree(path, ignore_errors=True)
+        except OSError:
+            pass
+
+
+def _read_input(directory):
+    from .image_buffer import DecodedImage
+    return DecodedImage.from_path(os.path.join(directory, 'input'))
+
+
+def _arm_screen_version():
+    from .armpose import RULES_VERSION
+    from .result_cache import analysis_version
+    return analysis_version(RULES_VERSION)
+
+
+def _annotate_object_version():
+    from django.conf import settings
+    from .segmentation import SEGMENTATION_MODEL
+    return f"{SEGMENTATION_MODEL}/{settings.SEGMENTATION_BACKEND}/{settings.SEGMENTATION_BOXES_EDGE}"
+
+
+@register_job('arm_screen', version=_arm_screen_version, gate=('armscreen',))
+def arm_screen_job(directory):
+    """Holistic + YOLO arm and screen measurement, see armpose.detect_arm_and_screen."""
+    from .armpose import detect_arm_and_screen
+
+    result = detect_arm_and_screen(_read_input(directory))
+    if not result['success']:
+        raise ValueError(result['error'])
+    return result
+
+
+def _box_classes(classes):
+    """Parses the comma separated classes of a boxes job, segmentation.BOX_CLASSES when none are given."""
+    from .segmentation import BOX_CLASSES, COCO_THING_CLASSES
+
+    if not classes:
+        return BOX_CLASSES
+    names = tuple(name.strip() for name in classes.split(',') if name.strip())
+    unknown = [name for name in names if name not in COCO_THING_CLASSES]
+    if unknown or not names:
+        raise ValueError(f"Unknown classes {unknown}, use COCO object classes such as {', '.join(BOX_CLASSES)}")
+    return names
+
+
+def _annotate_object_options(mode='panoptic', classes=None):
+    if mode not in ('panoptic', 'boxes'):
+        raise ValueError(f"Unknown mode '{mode}', use panoptic or boxes")
+    if mode == 'boxes':
+        _box_classes(classes)
+
+
+@register_job('annotate_object', version=_annotate_object_version, options=('mode', 'classes'),
+              validate=_annotate_object_options)
+def annotate_object_job(directory, mode='panoptic', classes=None):
+    """Mask2Former object annotation.
+
+    mode=panoptic renders the full segment map (segmentation.annotate_objects).
+    mode=boxes only returns boxes for the comma separated classes (default
+    segmentation.BOX_CLASSES) from a reduced size pass, see
+    segmentation.detect_object_boxes.
+    """
+    from .media_store import store_and_link
+    from .segmentation import annotate_objects, detect_object_boxes
+
+    _annotate_object_options(mode, classes)
+    if mode == 'boxes':
+        return {'mode': mode, 'boxes': detect_object_boxes(_read_input(directory), _box_classes(classes))}
+
+    png, segments = annotate_objects(_read_input(directory))
+    annotated = store_and_link(png)
+    return {
+        'mode': mode,
+        'segments': segments,
+        'annotated_image_id': annotated['id'],
+        'annotated_image_url': annotated['url'],
+    }
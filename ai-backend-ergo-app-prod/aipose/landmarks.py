@@ -0,0 +1,35 @@
+import numpy as np
+from .image_buffer import DecodedImage
+from .model_registry import registry
+from .timing import stage
+
+
+def landmarks_array(landmark_list):
+    """Converts MediaPipe pose landmarks into a plain array.
+
+    Args:
+        landmark_list (NormalizedLandmarkList): pose_landmarks of a MediaPipe result
+
+    Returns:
+        ndarray: (33, 3) array of normalized x, y and visibility, None when nothing was detected
+    """
+    if not landmark_list:
+        return None
+    return np.array([[lm.x, lm.y, lm.visibility] for lm in landmark_list.landmark])
+
+
+def pose_landmarks(image, model='pose_complexity2'):
+    """Runs a shared pose graph once on an image.
+
+    Args:
+        image (DecodedImage | String | ndarray): Image to process
+        model (String): Registry key of the pose graph
+
+    Returns:
+        ndarray: (33, 3) array of normalized x, y and visibility, None when nothing was detected
+    """
+    image = DecodedImage.coerce(image)
+    rgb = image.inference_rgb
+    with registry.checkout(model) as pose, stage('pose'):
+        results = pose.process(rgb)
+    return landmarks_array(results.pose_landmarks)
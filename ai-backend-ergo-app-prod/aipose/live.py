@@ -0,0 +1,129 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+
+from . import bodypose, deskpose
+from .image_buffer import DecodedImage
+from .landmarks import landmarks_array
+from .model_registry import registry
+from .timing import stage
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+# Rules of each check a live session can stream, applied to one frame at a time
+LIVE_RULES = {'seatedposture': bodypose.evaluate_landmarks, 'deskposition': deskpose.evaluate_landmarks}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    """Returns the thread pool running the inference of every live session, started on first use.
+
+    A session never has more than one frame in it, so LIVE_WORKERS bounds the
+    CPU all sessions take together and a slow session cannot hold up the
+    event loop.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.LIVE_WORKERS, thread_name_prefix='live')
+    return _executor
+
+
+class LiveSession:
+    """Pose tracking state of one webcam connection.
+
+    The session borrows a tracking graph from the pose_live pool until close(),
+    so the person detector only runs again when tracking is lost. A verdict is
+    reported as changed once the same value was seen on LIVE_STABLE_FRAMES
+    analysed frames in a row, which keeps single-frame flicker off the socket.
+    """
+
+    def __init__(self, checks):
+        """Defines the parameters to be used in the operations for this class.
+
+        Args:
+            checks (List): Names from LIVE_RULES
+
+        Raises:
+            TimeoutError: Triggered when LIVE_MAX_SESSIONS sessions are already open
+        """
+        self.checks = checks
+        self.reported = {check: [] for check in checks}
+        self.person = None
+        self._streaks = {check: [] for check in checks}
+        self._lock = threading.Lock()
+        self._closed = False
+        self._models = ExitStack()
+        self.pose = self._models.enter_context(registry.checkout('pose_live', timeout=0))
+        # Tracking state must not leak from the previous session of this graph
+        self.pose.reset()
+
+    def _settle(self, check, verdicts):
+        """Updates the streak of each verdict and returns the stable verdicts if they changed, else None."""
+        streaks = self._streaks[check]
+        if len(streaks) != len(verdicts):
+            streaks[:] = [(None, 0)] * len(verdicts)
+        reported = self.reported[check]
+        stable = list(reported) if len(reported) == len(verdicts) else [None] * len(verdicts)
+        for position, verdict in enumerate(verdicts):
+            value, count = streaks[position]
+            streaks[position] = (verdict, count + 1 if verdict == value else 1)
+            if streaks[position][1] >= settings.LIVE_STABLE_FRAMES:
+                stable[position] = verdict
+        if None in stable or stable == reported:
+            return None
+        self.reported[check] = stable
+        return stable
+
+    def process(self, data, received_at):
+        """Tracks the pose in one frame and returns what changed since the last report.
+
+        Args:
+            data (bytes): JPEG or PNG frame
+            received_at (float): time.monotonic() when the frame arrived
+
+        Raises:
+            ValueError: Triggered when the frame is not a readable image
+
+        Returns:
+            dict: New verdicts of the checks whose stable verdicts changed, and
+            `person` when a person appeared or left the picture. None when the
+            frame was older than LIVE_STALE_MS once a worker got to it, or the
+            session was closed meanwhile.
+        """
+        if (time.monotonic() - received_at) * 1000 > settings.LIVE_STALE_MS:
+            return None
+        with self._lock:
+            if self._closed:
+                return None
+            rgb = DecodedImage.from_bytes(data).inference_rgb
+            with stage('pose'):
+                landmarks = landmarks_array(self.pose.process(rgb).pose_landmarks)
+
+        changes = {}
+        if (landmarks is not None) != self.person:
+            self.person = landmarks is not None
+            changes['person'] = self.person
+        if landmarks is None:
+            return changes
+        with stage('rules'):
+            for check in self.checks:
+                verdicts = LIVE_RULES[check](landmarks)
+                if verdicts:
+                    stable = self._settle(check, verdicts)
+                    if stable is not None:
+                        changes[check] = stable
+        return changes
+
+    def close(self):
+        """Returns the tracking graph to the pool, once any frame still in it is done."""
+        with self._lock:
+            self._closed = True
+            self._models.close()
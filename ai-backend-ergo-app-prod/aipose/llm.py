@@ -0,0 +1,211 @@
+import asyncio
+import base64
+import logging
+import threading
+from concurrent.futures import Future
+
+import cv2
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+from .image_buffer import shrink
+from .result_cache import result_cache
+from .timing import stage
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+# Bump when WORKSPACE_PROMPT changes, so cached answers to the old prompt are not served
+PROMPT_VERSION = 1
+
+WORKSPACE_PROMPT = (
+    "Please analyze this workspace image and provide:\n"
+    "1. Location of keyboard relative to table edges\n"
+    "2. Location of mouse relative to table edges\n"
+    "3. Whether keyboard and mouse are aligned\n"
+    "4. Approximate measurements and distances"
+)
+
+# The API bills an image at about width * height / 750 input tokens
+PIXELS_PER_TOKEN = 750
+
+_usage = {'requests': 0, 'errors': 0, 'input_tokens': 0, 'output_tokens': 0}
+_usage_lock = threading.Lock()
+
+
+def usage():
+    """Messages API requests, failures and tokens billed by this process so far."""
+    with _usage_lock:
+        return dict(_usage)
+
+
+class LLMClient:
+    """Async Anthropic client shared by every request of the process.
+
+    The client and its connection pool live on one event loop running in a
+    background thread, so views, job workers and consumers all reuse the same
+    keep-alive connections whatever thread or loop they run on. At most
+    max_concurrency requests are in flight at once; the SDK retries rate
+    limits, overloads and connection errors up to max_retries times with
+    exponential backoff, honouring retry-after.
+    """
+
+    def __init__(self, api_key, base_url=None, max_concurrency=4, max_retries=3, timeout=60.0):
+        """Defines the parameters to be used in the operations for this class.
+
+        Args:
+            api_key (String): Anthropic API key
+            base_url (String): API root, None for the public API (a stub server in benchmarks)
+            max_concurrency (int): Requests allowed in flight at once
+            max_retries (int): Retries of a failed request, with backoff
+            timeout (float): Seconds before one attempt is abandoned
+        """
+        import anthropic
+
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = anthropic.AsyncAnthropic(api_key=api_key, base_url=base_url,
+                                                max_retries=max_retries, timeout=timeout)
+        self._thread = threading.Thread(target=self._loop.run_forever, name='llm', daemon=True)
+        self._thread.start()
+
+    async def _create(self, request):
+        async with self._semaphore:
+            try:
+                message = await self._client.messages.create(**request)
+            except Exception:
+                with _usage_lock:
+                    _usage['errors'] += 1
+                raise
+        with _usage_lock:
+            _usage['requests'] += 1
+            _usage['input_tokens'] += message.usage.input_tokens
+            _usage['output_tokens'] += message.usage.output_tokens
+        return message
+
+    def create(self, request):
+        """Sends one Messages API request from any thread and waits for the reply.
+
+        Args:
+            request (dict): Keyword arguments of messages.create
+
+        Returns:
+            Message: The reply, after any retries
+        """
+        return asyncio.run_coroutine_threadsafe(self._create(request), self._loop).result()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def client():
+    """Returns the process-wide LLMClient, created on first use.
+
+    Raises:
+        ImproperlyConfigured: Triggered when ANTHROPIC_API_KEY is not set
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            if not settings.ANTHROPIC_API_KEY:
+                raise ImproperlyConfigured("ANTHROPIC_API_KEY is not set")
+            _client = LLMClient(settings.ANTHROPIC_API_KEY, settings.ANTHROPIC_BASE_URL,
+                                settings.LLM_MAX_CONCURRENCY, settings.LLM_MAX_RETRIES, settings.LLM_TIMEOUT_SECONDS)
+    return _client
+
+
+def prepare_image(image, long_edge, quality):
+    """Shrinks and recompresses a picture before it is sent to the model.
+
+    Tokens, upload size and model latency all grow with the pixel count, and
+    the API downsizes anything above about 1.15 megapixels anyway.
+
+    Args:
+        image (DecodedImage): The upload
+        long_edge (int): Long edge of the picture sent, 0 keeps the upload size
+        quality (int): JPEG quality of the picture sent
+
+    Returns:
+        tuple: (JPEG bytes, width, height)
+    """
+    bgr = image.bgr
+    if long_edge:
+        with stage('downscale'):
+            bgr = shrink(bgr, long_edge)
+    with stage('encode'):
+        ok, encoded = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Image could not be encoded for analysis.")
+    return encoded.tobytes(), bgr.shape[1], bgr.shape[0]
+
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _shared(key, compute):
+    """Runs compute once for concurrent callers asking for the same key, handing them all its result."""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if not owner:
+        return future.result()
+    try:
+        result = compute()
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _ask_workspace(image):
+    data, width, height = prepare_image(image, settings.LLM_IMAGE_EDGE, settings.LLM_IMAGE_QUALITY)
+    request = {
+        'model': settings.LLM_MODEL,
+        'max_tokens': settings.LLM_MAX_TOKENS,
+        'messages': [{
+            'role': 'user',
+            'content': [
+                {'type': 'text', 'text': WORKSPACE_PROMPT},
+                {'type': 'image', 'source': {'type': 'base64', 'media_type': 'image/jpeg',
+                                             'data': base64.b64encode(data).decode()}},
+            ],
+        }],
+    }
+    with stage('llm'):
+        message = client().create(request)
+    logger.info(f"Workspace analysis of a {width}x{height} image took {message.usage.input_tokens} input "
+                f"and {message.usage.output_tokens} output tokens")
+    return {
+        'analysis': message.content[0].text,
+        'model': message.model,
+        'usage': {'input_tokens': message.usage.input_tokens, 'output_tokens': message.usage.output_tokens},
+    }
+
+
+def analyze_workspace(image):
+    """Asks the model where the keyboard and mouse sit on the desk.
+
+    Answers are cached by the hash of the upload and the prompt version, and
+    concurrent requests for the same picture share one API call.
+
+    Args:
+        image (DecodedImage): Photo of the workspace
+
+    Raises:
+        ImproperlyConfigured: Triggered when ANTHROPIC_API_KEY is not set
+        ValueError: Triggered when the upload is not a readable image
+
+    Returns:
+        dict: analysis text, model and token usage of the call that produced it
+    """
+    version = f"{PROMPT_VERSION}/{settings.LLM_MODEL}/{settings.LLM_IMAGE_EDGE}/{settings.LLM_IMAGE_QUALITY}"
+    return _shared(image.key, lambda: result_cache.get_or_compute(
+        image.key, 'anthropic-analysis', 'workspace', version, lambda: _ask_workspace(image)))
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from aipose.model_registry import registry
+# Registers mask2former, which is otherwise only registered once a segmentation job runs
+import aipose.segmentation  # noqa: F401
+
+
+class Command(BaseCommand):
+    """Cold-loads every registered model from the local bundle and reports the time taken.
+
+    Fails when a model cannot be loaded offline or the total load time exceeds
+    MODEL_LOAD_BUDGET_SECONDS.
+    """
+    help = 'Load every model from the local bundle and check the cold-start budget'
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        failed = registry.warm_up()
+        total = time.perf_counter() - start
+
+        for name, seconds in sorted(registry.load_times.items()):
+            self.stdout.write(f"{name}: {seconds:.2f}s")
+        self.stdout.write(f"total: {total:.2f}s (budget {settings.MODEL_LOAD_BUDGET_SECONDS:.0f}s)")
+
+        if failed:
+            raise CommandError(f"Could not load: {', '.join(failed)}")
+        if total > settings.MODEL_LOAD_BUDGET_SECONDS:
+            raise CommandError('Cold start exceeded MODEL_LOAD_BUDGET_SECONDS')
@@ -0,0 +1,35 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from aipose.model_bundle import ModelBundleError, model_dir, model_path
+
+
+class Command(BaseCommand):
+    """Exports bundled PyTorch models to the graphs the optimized CPU backends load.
+
+    Run at image build time after fetch_models. YOLOv5s is exported to ONNX with
+    YOLOv5's own export script from the bundled code, next to the weights.
+    """
+    help = 'Export YOLOv5s to ONNX for YOLO_BACKEND=onnx'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--imgsz', type=int, default=640, help='input size the graph is exported for')
+
+    def handle(self, *args, **options):
+        try:
+            code_dir = model_dir('yolov5_code')
+            weights = model_path('yolov5s')
+        except ModelBundleError as e:
+            raise CommandError(str(e))
+
+        sys.path.insert(0, code_dir)
+        try:
+            import export
+            # A dynamic batch axis lets the batch endpoint run several images in one pass
+            (onnx_path,) = export.run(weights=weights, include=('onnx',), imgsz=(options['imgsz'], options['imgsz']),
+                                      dynamic=True, device='cpu')
+        finally:
+            sys.path.remove(code_dir)
+        self.stdout.write(f"yolov5s: {onnx_path} ({os.path.getsize(onnx_path) / 1e6:.1f} MB)")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from aipose.model_bundle import (MEDIAPIPE_SOLUTION_ASSETS, ModelBundleError, fetch, fetch_mediapipe_assets,
+                                 load_manifest, unpinned)
+
+
+class Command(BaseCommand):
+    """Downloads the model bundle listed in models/manifest.json.
+
+    Run at image build time so that workers never need the network to load a model.
+    Every entry must carry a pinned SHA-256, otherwise nothing is downloaded.
+    """
+    help = 'Download and verify every model listed in models/manifest.json'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Models to fetch, defaults to all of them')
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(load_manifest()['models'])
+        try:
+            missing = unpinned(names)
+        except ModelBundleError as e:
+            raise CommandError(str(e))
+        if missing:
+            raise CommandError(f"No pinned sha256 in models/manifest.json for: {', '.join(missing)}. "
+                               f"Add the digest published for each artifact before fetching.")
+        for name in names:
+            try:
+                digest = fetch(name)
+            except ModelBundleError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"{name}: {digest}")
+        if any(name in MEDIAPIPE_SOLUTION_ASSETS for name in names):
+            try:
+                fetch_mediapipe_assets()
+            except ModelBundleError as e:
+                raise CommandError(str(e))
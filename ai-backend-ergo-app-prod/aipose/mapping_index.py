@@ -0,0 +1,164 @@
+import hashlib
+import io
+import json
+import logging
+import os
+from types import MappingProxyType
+
+from django.conf import settings
+from PIL import Image
+
+from .datajson import mappings
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+# Scenarios every mapping item defines, in the casing the index is keyed by
+SCENARIOS = ('negative', 'positive', 'neutral')
+
+# Assessment check name to the mappings category its verdicts index into
+CHECK_CATEGORIES = {
+    'seatedposture': 'seated_posture',
+    'handposition': 'hand_position',
+    'deskposition': 'desk_position',
+}
+
+# Fields of a scenario copied into the response fragment
+FRAGMENT_FIELDS = ('risk', 'affected_parts', 'conditions', 'current', 'current_summary',
+                   'recommendation', 'recommendation_summary')
+
+
+class ReportImage:
+    """An image_path asset decoded and resized once, ready to embed in a report.
+
+    data holds the resized JPEG, width and height its size in pixels.
+    """
+    __slots__ = ('path', 'data', 'width', 'height')
+
+    def __init__(self, path, data, width, height):
+        self.path = path
+        self.data = data
+        self.width = width
+        self.height = height
+
+
+class MappingEntry:
+    """One compiled (category, item id, scenario) of datajson.mappings.
+
+    fragment is the read-only response fragment of the scenario (lists turned
+    into tuples, empty conditions dropped) and fragment_json the same fragment
+    already serialized. image is the preloaded ReportImage, or None when the
+    scenario has no picture or its file is missing.
+    """
+    __slots__ = ('category', 'item_id', 'scenario', 'fragment', 'fragment_json', 'image')
+
+    def __init__(self, category, item_id, scenario, fragment, image):
+        self.category = category
+        self.item_id = item_id
+        self.scenario = scenario
+        self.fragment = MappingProxyType(fragment)
+        self.fragment_json = json.dumps(fragment)
+        self.image = image
+
+    def __repr__(self):
+        return f"MappingEntry({self.category!r}, {self.item_id!r}, {self.scenario!r})"
+
+
+def load_report_image(image_path, max_edge):
+    """Reads an image_path asset and shrinks it to at most max_edge pixels.
+
+    Args:
+        image_path (String): Path relative to the project root, as in datajson
+        max_edge (int): Long edge of the resized image (0 keeps the file size)
+
+    Returns:
+        ReportImage: The resized asset, or None when the file cannot be read
+    """
+    path = os.path.join(settings.BASE_DIR, image_path)
+    try:
+        with Image.open(path) as image:
+            image = image.convert('RGB')
+            if max_edge:
+                image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=85, optimize=True)
+    except OSError as e:
+        logger.warning(f"Report image {image_path} could not be loaded: {e}")
+        return None
+    return ReportImage(image_path, buffer.getvalue(), image.width, image.height)
+
+
+def compile_mappings(questions, max_edge):
+    """Flattens the nested mappings into a read-only index.
+
+    Each distinct image_path is read and resized once, however many scenarios
+    share it.
+
+    Args:
+        questions (List): The `questions` list of datajson.mappings
+        max_edge (int): Long edge of the preloaded report images
+
+    Returns:
+        MappingProxyType: (category, item id, scenario) to MappingEntry
+    """
+    images = {}
+    index = {}
+    for question in questions:
+        category = question['category']
+        for item in question['items']:
+            for scenario, details in item['scenarios'].items():
+                fragment = {
+                    field: tuple(value for value in details[field] if value) if isinstance(details[field], list)
+                    else details[field]
+                    for field in FRAGMENT_FIELDS
+                }
+                image_path = details.get('image_path')
+                if image_path and image_path not in images:
+                    images[image_path] = load_report_image(image_path, max_edge)
+                image = images.get(image_path) if image_path else None
+                index[(category, item['id'], scenario.lower())] = MappingEntry(
+                    category, item['id'], scenario.lower(), fragment, image)
+    return MappingProxyType(index)
+
+
+def lookup(category, item_id, scenario):
+    """Finds the compiled mapping of one verdict.
+
+    Args:
+        category (String): Mappings category, e.g. seated_posture
+        item_id (String | int): Item id within the category, 1-based
+        scenario (String): Verdict, in any casing (Positive, negative...)
+
+    Raises:
+        KeyError: Triggered when the category, item or scenario is not mapped
+
+    Returns:
+        MappingEntry: The compiled entry
+    """
+    return mapping_index[(category, str(item_id), scenario.lower())]
+
+
+def entries_for_verdicts(category, verdicts):
+    """Maps an analyzer's verdicts, in order, onto the items of its category.
+
+    The n-th verdict of seated posture, hand position and desk position
+    analysis answers item n of the category.
+
+    Args:
+        category (String): Mappings category
+        verdicts (List): Verdicts as returned by the analyzer
+
+    Raises:
+        KeyError: Triggered when a verdict has no mapping
+
+    Returns:
+        List: MappingEntry per verdict
+    """
+    return [lookup(category, position, verdict) for position, verdict in enumerate(verdicts, start=1)]
+
+
+# Compiled once per process, so lookups never scan the mappings or touch the disk
+mapping_index = compile_mappings(mappings['questions'], settings.REPORT_IMAGE_EDGE)
+
+# Changes whenever the mappings text does, for caches of anything rendered from them
+mapping_digest = hashlib.sha256(json.dumps(mappings, sort_keys=True).encode()).hexdigest()[:16]
@@ -0,0 +1,185 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.urls import reverse
+
+from .timing import stage
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+# Encodings clients can ask for, with their OpenCV extension and quality flag
+FORMATS = {
+    'jpeg': ('.jpg', cv2.IMWRITE_JPEG_QUALITY, 'image/jpeg'),
+    'webp': ('.webp', cv2.IMWRITE_WEBP_QUALITY, 'image/webp'),
+    'png': ('.png', None, 'image/png'),
+}
+DEFAULT_QUALITY = 80
+THUMBNAIL_DIM = 256
+# Quality of the stored master, variants are re-encoded from it
+MASTER_QUALITY = 95
+# Minimum time between two sweeps of MEDIA_STORE_ROOT for expired images
+PURGE_INTERVAL_SECONDS = 60
+
+
+class VariantCache:
+    """In-memory LRU of rendered variants, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = entry
+            self._bytes += len(entry[0])
+            while self._bytes > self.max_bytes and self._entries:
+                _, (data, _) = self._entries.popitem(last=False)
+                self._bytes -= len(data)
+
+
+_variants = VariantCache(settings.MEDIA_STORE_CACHE_BYTES)
+_last_purge = 0.0
+_purge_lock = threading.Lock()
+
+
+def _master_path(image_id, extension):
+    return os.path.join(settings.MEDIA_STORE_ROOT, image_id[:2], image_id + extension)
+
+
+def _find_master(image_id):
+    for extension in ('.jpg', '.png'):
+        path = _master_path(image_id, extension)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def purge_expired():
+    """Deletes stored images older than MEDIA_STORE_TTL_SECONDS.
+
+    Storing an image again refreshes its age, so only images no response has
+    linked to for the whole TTL are removed. Sweeps at most once per
+    PURGE_INTERVAL_SECONDS per process.
+    """
+    global _last_purge
+    now = time.time()
+    with _purge_lock:
+        if now - _last_purge < PURGE_INTERVAL_SECONDS:
+            return
+        _last_purge = now
+    if not os.path.isdir(settings.MEDIA_STORE_ROOT):
+        return
+    cutoff = now - settings.MEDIA_STORE_TTL_SECONDS
+    for prefix in os.listdir(settings.MEDIA_STORE_ROOT):
+        directory = os.path.join(settings.MEDIA_STORE_ROOT, prefix)
+        try:
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+        except OSError:
+            pass
+
+
+def store_image(image):
+    """Stores an annotated image once, under the hash of its encoded bytes.
+
+    Images expire MEDIA_STORE_TTL_SECONDS after they were last stored, see purge_expired.
+
+    Args:
+        image (ndarray | bytes): BGR image, or an already encoded JPEG or PNG
+
+    Returns:
+        String: Id of the stored image, the same for identical content
+    """
+    if isinstance(image, np.ndarray):
+        with stage('encode'):
+            _, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, MASTER_QUALITY])
+        data, extension = buffer.tobytes(), '.jpg'
+    else:
+        data = bytes(image)
+        extension = '.png' if data.startswith(b'\x89PNG') else '.jpg'
+
+    purge_expired()
+    image_id = hashlib.sha256(data).hexdigest()[:32]
+    path = _master_path(image_id, extension)
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as image_file:
+            image_file.write(data)
+        os.replace(tmp_path, path)
+    return image_id
+
+
+def image_url(image_id):
+    """Relative URL serving a stored image, see api_views.StoredImage."""
+    return reverse('stored-image', args=[image_id])
+
+
+def store_and_link(image):
+    """Stores an image and returns the id and URL to put in a JSON response."""
+    image_id = store_image(image)
+    return {'id': image_id, 'url': image_url(image_id)}
+
+
+def render(image_id, fmt='jpeg', quality=DEFAULT_QUALITY, max_dim=None):
+    """Encodes a stored image the way the client asked for it.
+
+    Args:
+        image_id (String): Id returned by store_image
+        fmt (String): jpeg, webp or png
+        quality (int): 1-100 for jpeg and webp, ignored for png
+        max_dim (int): Longest side in pixels, None keeps the stored size
+
+    Raises:
+        KeyError: Triggered when no image is stored under the id
+        ValueError: Triggered when the format is not supported
+
+    Returns:
+        tuple: (encoded bytes, content type)
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported format '{fmt}', use one of {', '.join(FORMATS)}")
+    key = (image_id, fmt, quality, max_dim)
+    cached = _variants.get(key)
+    if cached is not None:
+        return cached
+
+    path = _find_master(image_id)
+    if path is None:
+        raise KeyError(image_id)
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+
+    if max_dim and max(image.shape[:2]) > max_dim:
+        scale = max_dim / max(image.shape[:2])
+        size = (max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale)))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    extension, quality_flag, content_type = FORMATS[fmt]
+    params = [quality_flag, quality] if quality_flag is not None else []
+    _, buffer = cv2.imencode(extension, image, params)
+    entry = (buffer.tobytes(), content_type)
+    _variants.put(key, entry)
+    return entry
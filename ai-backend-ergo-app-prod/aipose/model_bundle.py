@@ -0,0 +1,255 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+
+import requests
+from django.conf import settings
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+MANIFEST_NAME = 'manifest.json'
+
+# Heavy MediaPipe solution graphs are not shipped in the wheel and are otherwise
+# downloaded, unverified, the first time a complexity-2 graph is built. They are
+# fetched into the bundle like any other model, then copied to these paths
+# inside the installed mediapipe package.
+MEDIAPIPE_SOLUTION_ASSETS = {
+    'pose_landmark_heavy': 'modules/pose_landmark/pose_landmark_heavy.tflite',
+}
+
+_manifest = None
+_verified = {}
+_lock = threading.Lock()
+
+
+class ModelBundleError(Exception):
+    """Raised when a bundled model is missing or does not match the manifest."""
+
+
+def bundle_dir():
+    """Returns the directory holding the versioned model bundle."""
+    return settings.MODEL_BUNDLE_DIR
+
+
+def load_manifest():
+    """Reads the bundle manifest once per process.
+
+    Returns:
+        dict: Bundle version and one entry per model with file, url and sha256
+    """
+    global _manifest
+    if _manifest is None:
+        with open(os.path.join(bundle_dir(), MANIFEST_NAME)) as manifest_file:
+            _manifest = json.load(manifest_file)
+    return _manifest
+
+
+def _entry(name):
+    try:
+        return load_manifest()['models'][name]
+    except KeyError:
+        raise ModelBundleError(f"Model '{name}' is not listed in {MANIFEST_NAME}")
+
+
+def unpinned(names):
+    """Lists the models whose manifest entry has no SHA-256 to check downloads against.
+
+    Args:
+        names (List): Model keys in the manifest
+
+    Returns:
+        List: The names without a pinned checksum
+    """
+    return [name for name in names if not _entry(name).get('sha256')]
+
+
+def file_sha256(path):
+    """Hashes a file through a read-only memory map instead of reading it into memory.
+
+    Args:
+        path (String): File to hash
+
+    Returns:
+        String: Hex SHA-256 digest
+    """
+    with open(path, 'rb') as model_file:
+        if os.fstat(model_file.fileno()).st_size == 0:
+            return hashlib.sha256().hexdigest()
+        with mmap.mmap(model_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.sha256(mapped).hexdigest()
+
+
+def model_path(name):
+    """Returns the local path of a bundled model after checking its checksum.
+
+    Never touches the network: a missing or mismatching file is an error that
+    has to be fixed at build time with `python manage.py fetch_models`.
+
+    Args:
+        name (String): Model key in the manifest
+
+    Raises:
+        ModelBundleError: Triggered when the file is missing, unpinned or corrupt
+
+    Returns:
+        String: Absolute path of the verified file
+    """
+    entry = _entry(name)
+    path = os.path.join(bundle_dir(), entry['file'])
+    if not os.path.exists(path):
+        raise ModelBundleError(f"Model file {path} is missing. Run `python manage.py fetch_models`.")
+    if not entry.get('sha256'):
+        raise ModelBundleError(f"Model '{name}' has no pinned checksum in {MANIFEST_NAME}")
+    stat = os.stat(path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    with _lock:
+        if _verified.get(path) != stamp:
+            digest = file_sha256(path)
+            if digest != entry['sha256']:
+                raise ModelBundleError(f"Checksum mismatch for {path}: expected {entry['sha256']}, got {digest}")
+            _verified[path] = stamp
+    return path
+
+
+def exported_path(name, extension):
+    """Returns the path of a graph exported from a bundled model by `manage.py export_models`.
+
+    Exported files are derived from checksummed bundle files at build time,
+    so they are not listed in the manifest.
+
+    Args:
+        name (String): Model key in the manifest the graph was exported from
+        extension (String): Extension of the exported format, e.g. '.onnx'
+
+    Raises:
+        ModelBundleError: Triggered when the graph was never exported
+
+    Returns:
+        String: Absolute path of the exported file
+    """
+    path = os.path.join(bundle_dir(), os.path.splitext(_entry(name)['file'])[0] + extension)
+    if not os.path.exists(path):
+        raise ModelBundleError(f"Exported model {path} is missing. Run `python manage.py export_models`.")
+    return path
+
+
+def model_dir(name):
+    """Returns the directory an archived model was extracted to.
+
+    Args:
+        name (String): Model key in the manifest, its entry must have extract_to
+
+    Raises:
+        ModelBundleError: Triggered when the archive was never extracted
+
+    Returns:
+        String: Absolute path of the extracted directory
+    """
+    entry = _entry(name)
+    path = os.path.join(bundle_dir(), entry['extract_to'])
+    if not os.path.isdir(path):
+        raise ModelBundleError(f"Model directory {path} is missing. Run `python manage.py fetch_models`.")
+    return path
+
+
+def model_files_dir(names):
+    """Returns the directory of a model stored as several files, after checking every file.
+
+    Used for transformers checkpoints, whose config, processor config and
+    weights are separate manifest entries in one folder.
+
+    Args:
+        names (List): Model keys in the manifest, all stored in the same directory
+
+    Raises:
+        ModelBundleError: Triggered when a file is missing, unpinned, corrupt or
+            not stored next to the others
+
+    Returns:
+        String: Absolute path of the verified directory
+    """
+    directories = {os.path.dirname(model_path(name)) for name in names}
+    if len(directories) != 1:
+        raise ModelBundleError(f"Models {', '.join(names)} are not stored in one directory")
+    return directories.pop()
+
+
+def _extract(archive_path, target):
+    """Unpacks a source tarball so its single top-level folder becomes target."""
+    with tempfile.TemporaryDirectory(dir=bundle_dir()) as scratch:
+        with tarfile.open(archive_path) as archive:
+            archive.extractall(scratch, filter='data')
+        (top,) = os.listdir(scratch)
+        shutil.rmtree(target, ignore_errors=True)
+        shutil.move(os.path.join(scratch, top), target)
+
+
+def fetch(name):
+    """Downloads one model into the bundle. Meant for image builds, not for requests.
+
+    Every entry must carry the SHA-256 published for the artifact; a download
+    is never trusted on its own.
+
+    Args:
+        name (String): Model key in the manifest
+
+    Raises:
+        ModelBundleError: Triggered when the entry has no pinned checksum or the
+            download does not match it
+
+    Returns:
+        String: Checksum of the file on disk
+    """
+    entry = _entry(name)
+    if not entry.get('sha256'):
+        raise ModelBundleError(f"Model '{name}' has no pinned checksum in {MANIFEST_NAME}")
+    path = os.path.join(bundle_dir(), entry['file'])
+    if not os.path.exists(path):
+        if not entry.get('url'):
+            raise ModelBundleError(f"Model '{name}' is missing and has no download url")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        logger.info(f"Downloading {entry['url']}")
+        response = requests.get(entry['url'], stream=True, timeout=60)
+        response.raise_for_status()
+        partial = path + '.part'
+        with open(partial, 'wb') as model_file:
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                model_file.write(chunk)
+        os.replace(partial, path)
+
+    digest = file_sha256(path)
+    if digest != entry['sha256']:
+        os.remove(path)
+        raise ModelBundleError(f"Checksum mismatch for {path}: expected {entry['sha256']}, got {digest}")
+
+    if entry.get('extract_to'):
+        _extract(path, os.path.join(bundle_dir(), entry['extract_to']))
+    return digest
+
+
+def fetch_mediapipe_assets():
+    """Installs the checksummed MediaPipe solution graphs into the mediapipe package at build time.
+
+    Raises:
+        ModelBundleError: Triggered when a graph is unpinned or does not match the manifest
+
+    Returns:
+        dict: Checksum per installed graph
+    """
+    import mediapipe
+
+    package_dir = os.path.dirname(mediapipe.__file__)
+    digests = {}
+    for name, asset in MEDIAPIPE_SOLUTION_ASSETS.items():
+        digests[name] = fetch(name)
+        target = os.path.join(package_dir, asset)
+        if not os.path.exists(target) or file_sha256(target) != digests[name]:
+            shutil.copyfile(model_path(name), target)
+    return digests
@@ -0,0 +1,224 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+from .analyzer_pool import AnalyzerPool
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+
+class ModelRegistry:
+    """Process-wide registry of the heavy detectors and pose graphs.
+
+    Each model is served by a bounded AnalyzerPool of up to MODEL_POOL_SIZE
+    instances, created the first time they are needed (or at boot through
+    warm_up). MediaPipe graphs and the YOLO model are not safe to call from
+    several threads at once, so callers borrow an instance with checkout(),
+    and concurrent requests get separate instances instead of queueing on one.
+    """
+
+    def __init__(self):
+        """Defines the parameters to be used in the operations for this class."""
+        self._factories = {}
+        self._sizes = {}
+        self._pools = {}
+        self._load_lock = threading.Lock()
+
+    @property
+    def load_times(self):
+        """Seconds taken to load the first instance of each loaded model."""
+        return {name: pool.load_time for name, pool in self._pools.items() if pool.load_time is not None}
+
+    def register(self, name, factory, pool_size=None):
+        """Registers a loader for a model without loading it.
+
+        Args:
+            name (String): Key the model is requested with
+            factory (Callable): Zero-argument function returning a new instance of the model
+            pool_size (int | String): Instances to keep at most, or the name of the setting
+                holding it, defaults to settings.MODEL_POOL_SIZE
+        """
+        with self._load_lock:
+            self._factories[name] = factory
+            self._sizes[name] = pool_size
+            self._pools.pop(name, None)
+
+    def pool(self, name):
+        """Returns the pool serving a model, creating it empty on first use.
+
+        Args:
+            name (String): Key the model was registered with
+
+        Raises:
+            KeyError: Triggered when no loader is registered under the name
+
+        Returns:
+            AnalyzerPool: Pool of instances of the model
+        """
+        pool = self._pools.get(name)
+        if pool is not None:
+            return pool
+        with self._load_lock:
+            pool = self._pools.get(name)
+            if pool is None:
+                if name not in self._factories:
+                    raise KeyError(f"No model registered under '{name}'")
+                from django.conf import settings
+                size = self._sizes[name] or getattr(settings, 'MODEL_POOL_SIZE', 1)
+                if isinstance(size, str):
+                    size = getattr(settings, size)
+                pool = self._pools[name] = AnalyzerPool(name, self._factories[name], size)
+        return pool
+
+    def get(self, name):
+        """Loads a model if needed and returns its first instance.
+
+        Meant for warm-up and load checks. Run inference through checkout() so
+        the instance is not shared with another thread.
+
+        Args:
+            name (String): Key the model was registered with
+
+        Raises:
+            KeyError: Triggered when no loader is registered under the name
+
+        Returns:
+            object: The first loaded instance of the model
+        """
+        return self.pool(name).first()
+
+    @contextmanager
+    def checkout(self, name, timeout=None):
+        """Borrows an instance of a model for exclusive use by the calling thread.
+
+        Args:
+            name (String): Key the model was registered with
+            timeout (float): Seconds to wait for a free instance, None waits forever
+
+        Yields:
+            object: A loaded instance, returned to the pool when the block exits
+        """
+        with self.pool(name).checkout(timeout) as model:
+            yield model
+
+    def warm_up(self, names=None, fill=False):
+        """Loads models ahead of the first request.
+
+        Args:
+            names (List): Keys to load, defaults to every registered model
+            fill (bool): Load every pooled instance instead of only the first one
+
+        Returns:
+            List: Keys of the models that failed to load
+        """
+        failed = []
+        for name in names or list(self._factories):
+            try:
+                if fill:
+                    self.pool(name).fill()
+                else:
+                    self.get(name)
+            except Exception as e:
+                logger.error(f"Warm-up failed for model '{name}': {e}")
+                failed.append(name)
+        return failed
+
+
+# CPU backends YOLO can run on, selected with settings.YOLO_BACKEND
+YOLO_BACKENDS = ('torch', 'onnx')
+
+
+def _load_yolov5s(backend=None):
+    """Loads YOLOv5s as eager fp32 PyTorch or as the exported ONNX graph.
+
+    The ONNX graph runs on onnxruntime through YOLOv5's own DetectMultiBackend,
+    so both backends return the same Detections objects.
+
+    Args:
+        backend (String): torch or onnx, defaults to settings.YOLO_BACKEND
+    """
+    import torch
+    from django.conf import settings
+    from .model_bundle import exported_path, model_dir, model_path
+
+    backend = backend or settings.YOLO_BACKEND
+    if backend not in YOLO_BACKENDS:
+        raise ValueError(f"Unknown YOLO backend '{backend}', use one of {', '.join(YOLO_BACKENDS)}")
+    weights = exported_path('yolov5s', '.onnx') if backend == 'onnx' else model_path('yolov5s')
+    # Hub code and weights both come from the local bundle, never from GitHub
+    return torch.hub.load(model_dir('yolov5_code'), 'custom', path=weights, source='local')
+
+
+def _load_holistic():
+    import mediapipe as mp
+    return mp.solutions.holistic.Holistic(
+        static_image_mode=True,
+        model_complexity=2,
+        enable_segmentation=True,
+        min_detection_confidence=0.5)
+
+
+def _load_pose_complexity2():
+    import mediapipe as mp
+    return mp.solutions.pose.Pose(
+        static_image_mode=True,
+        model_complexity=2,
+        min_detection_confidence=0.6,
+        min_tracking_confidence=0.6)
+
+
+def _load_hand_landmarker():
+    from mediapipe.tasks import python
+    from mediapipe.tasks.python import vision
+    from .model_bundle import model_path
+
+    # MediaPipe memory-maps model files given by path
+    base_options = python.BaseOptions(model_asset_path=model_path('hand_landmarker'))
+    options = vision.HandLandmarkerOptions(base_options=base_options, num_hands=2)
+    return vision.HandLandmarker.create_from_options(options)
+
+
+def _load_pose_tracking():
+    import mediapipe as mp
+    from django.conf import settings
+
+    # Video mode: the person detector only runs again when tracking is lost
+    return mp.solutions.pose.Pose(
+        static_image_mode=False,
+        model_complexity=settings.TRACKING_POSE_COMPLEXITY,
+        min_detection_confidence=0.6,
+        min_tracking_confidence=0.6)
+
+
+def _load_hand_tracker():
+    from mediapipe.tasks import python
+    from mediapipe.tasks.python import vision
+    from .model_bundle import model_path
+    from .tracking import HandTracker
+
+    base_options = python.BaseOptions(model_asset_path=model_path('hand_landmarker'))
+    options = vision.HandLandmarkerOptions(base_options=base_options, num_hands=2,
+                                           running_mode=vision.RunningMode.VIDEO)
+    return HandTracker(vision.HandLandmarker.create_from_options(options))
+
+
+def _load_face_detector():
+    import mediapipe as mp
+
+    # Short range BlazeFace, for the camera angle check of the quality gate
+    return mp.solutions.face_detection.FaceDetection(model_selection=0, min_detection_confidence=0.5)
+
+
+registry = ModelRegistry()
+# torch already spreads one YOLO forward pass over every core
+registry.register('yolov5s', _load_yolov5s, pool_size=1)
+registry.register('holistic', _load_holistic)
+registry.register('pose_complexity2', _load_pose_complexity2)
+registry.register('hand_landmarker', _load_hand_landmarker)
+registry.register('pose_tracking', _load_pose_tracking)
+# A live session keeps its tracking graph until the socket closes, so sessions
+# draw from a pool of their own, sized by the number of sessions allowed
+registry.register('pose_live', _load_pose_tracking, pool_size='LIVE_MAX_SESSIONS')
+registry.register('hand_tracker', _load_hand_tracker)
+registry.register('face_detector', _load_face_detector)
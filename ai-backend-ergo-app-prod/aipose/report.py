@@ -0,0 +1,245 @@
+import hashlib
+import io
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import Flowable, Paragraph, SimpleDocTemplate, Spacer
+
+from .mapping_index import CHECK_CATEGORIES, entries_for_verdicts, mapping_digest, mapping_index
+from .media_store import VariantCache
+from .timing import stage
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+# Bump when the report layout changes, so cached PDFs are rebuilt
+REPORT_VERSION = 1
+
+# Risk levels in the order the report lists them
+RISK_LEVELS = ('High', 'Medium', 'Low')
+
+# Width of an illustration on the page
+ILLUSTRATION_WIDTH = 60 * mm
+
+_styles = getSampleStyleSheet()
+_reports = VariantCache(settings.REPORT_CACHE_BYTES)
+
+# Reports being built with binary streams, and the useA85 value to restore after the last one
+_binary_builds = 0
+_saved_use_a85 = None
+_binary_lock = threading.Lock()
+
+
+class ReportAsset:
+    """An illustration checked and measured once per process.
+
+    The JPEG bytes are the preloaded, resized picture from the mapping index.
+    Illustration hands them to canvas.drawImage, which embeds a JPEG stream
+    as it is, without re-encoding it, and only once per document.
+    """
+    __slots__ = ('data', 'width', 'height')
+
+    def __init__(self, image):
+        """Defines the parameters to be used in the operations for this class.
+
+        Args:
+            image (ReportImage): Preloaded picture from the mapping index
+        """
+        if ImageReader(io.BytesIO(image.data)).jpeg_fh() is None:
+            raise ValueError(f"Report image {image.path} is not a JPEG")
+        self.data = image.data
+        self.width = image.width
+        self.height = image.height
+
+    def reader(self):
+        """A fresh ImageReader for one drawing, so concurrent renders never share a file position."""
+        return ImageReader(io.BytesIO(self.data))
+
+
+class Illustration(Flowable):
+    """Draws a shared ReportAsset through the public canvas API."""
+
+    def __init__(self, asset, width=ILLUSTRATION_WIDTH):
+        super().__init__()
+        self.asset = asset
+        self.width = width
+        self.height = width * asset.height / asset.width
+
+    def wrap(self, available_width, available_height):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.asset.reader(), 0, 0, self.width, self.height)
+
+
+def _build_assets():
+    assets = {}
+    for entry in mapping_index.values():
+        if entry.image is not None and entry.image.path not in assets:
+            try:
+                assets[entry.image.path] = ReportAsset(entry.image)
+            except ValueError as e:
+                logger.warning(str(e))
+    return assets
+
+
+# Image path to ReportAsset, built on the first report of the process
+_assets = None
+_assets_lock = threading.Lock()
+
+
+def report_assets():
+    """Returns the illustrations of every mapping, built once per process."""
+    global _assets
+    with _assets_lock:
+        if _assets is None:
+            _assets = _build_assets()
+    return _assets
+
+
+def resolve_answers(answers):
+    """Turns the verdicts of a report request into mapping entries.
+
+    Args:
+        answers (dict): Category (seated_posture...) or assessment check name
+            (seatedposture...) to the list of verdicts its analyzer returned
+
+    Raises:
+        ValueError: Triggered when a category or verdict has no mapping
+
+    Returns:
+        List: MappingEntry per verdict, in mappings order whatever the request order
+    """
+    if not isinstance(answers, dict) or not answers:
+        raise ValueError("answers must map categories to lists of verdicts")
+    entries = []
+    for category, verdicts in answers.items():
+        if not isinstance(verdicts, list) or not all(isinstance(verdict, str) for verdict in verdicts):
+            raise ValueError(f"Verdicts for '{category}' must be a list of strings")
+        try:
+            entries.extend(entries_for_verdicts(CHECK_CATEGORIES.get(category, category), verdicts))
+        except KeyError:
+            raise ValueError(f"Unknown category or verdict in '{category}': {verdicts}")
+    order = {key: position for position, key in enumerate(mapping_index)}
+    return sorted(entries, key=lambda entry: order[(entry.category, entry.item_id, entry.scenario)])
+
+
+def report_key(entries):
+    """Content hash of a report: its entries, the mappings text, the layout and the illustration size."""
+    answered = '|'.join(f"{entry.category}/{entry.item_id}/{entry.scenario}" for entry in entries)
+    return hashlib.sha256(
+        f"{answered}|{mapping_digest}|{REPORT_VERSION}|{settings.REPORT_IMAGE_EDGE}".encode()).hexdigest()[:32]
+
+
+def render_report(entries):
+    """Lays out the assessment report.
+
+    Risks come first, grouped by level, then the recommended adjustments with
+    their illustrations, then what the user already does well.
+
+    Args:
+        entries (List): MappingEntry per verdict, see resolve_answers
+
+    Returns:
+        bytes: The PDF
+    """
+    assets = report_assets()
+    findings = [entry for entry in entries if entry.scenario != 'neutral']
+    story = [Paragraph("Your personalized self assessment", _styles['Title'])]
+
+    story.append(Paragraph("Assessment Risk", _styles['Heading1']))
+    if not findings:
+        story.append(Paragraph("No posture risks were found in this assessment.", _styles['BodyText']))
+    for risk in RISK_LEVELS:
+        level = [entry for entry in findings if entry.fragment['risk'] == risk]
+        if not level:
+            continue
+        parts = dict.fromkeys(part for entry in level for part in entry.fragment['affected_parts'])
+        story.append(Paragraph(f"{risk} health risk: {', '.join(parts)}", _styles['Heading2']))
+        for entry in level:
+            fragment = entry.fragment
+            story.append(Paragraph(fragment['current_summary'], _styles['Heading3']))
+            story.append(Paragraph(f"Affected area: {', '.join(fragment['affected_parts'])}", _styles['BodyText']))
+            if fragment['conditions']:
+                story.append(Paragraph(f"Conditions: {', '.join(fragment['conditions'])}", _styles['BodyText']))
+            story.append(Paragraph(f"Likely caused by: {fragment['current']}", _styles['BodyText']))
+
+    actions = [entry for entry in findings if entry.fragment['recommendation']]
+    if actions:
+        story.append(Paragraph("For your action", _styles['Heading1']))
+        for entry in actions:
+            fragment = entry.fragment
+            story.append(Paragraph(fragment['recommendation_summary'], _styles['Heading3']))
+            story.append(Paragraph(fragment['recommendation'], _styles['BodyText']))
+            if entry.image is not None and entry.image.path in assets:
+                story.append(Spacer(1, 2 * mm))
+                story.append(Illustration(assets[entry.image.path]))
+
+    strengths = [entry for entry in entries if entry.scenario == 'neutral']
+    if strengths:
+        story.append(Paragraph("What you are doing well", _styles['Heading1']))
+        for entry in strengths:
+            story.append(Paragraph(entry.fragment['current'], _styles['BodyText']))
+
+    buffer = io.BytesIO()
+    # invariant drops the creation date and random document id, so equal answers give equal bytes
+    document = SimpleDocTemplate(buffer, pagesize=A4, title="Assessment report", invariant=True,
+                                 leftMargin=20 * mm, rightMargin=20 * mm, topMargin=20 * mm, bottomMargin=20 * mm)
+    with _binary_streams():
+        document.build(story)
+    return buffer.getvalue()
+
+
+@contextmanager
+def _binary_streams():
+    """Turns reportlab's ASCII85 stream encoding off while a report is built.
+
+    The illustration JPEGs are then embedded as binary streams. ASCII85 runs
+    in pure Python without the optional rl_accel extension and cost more than
+    the rest of the report. reportlab only reads the flag from its global
+    rl_config, so it is switched off for the first concurrent build and
+    restored when the last one ends.
+    """
+    global _binary_builds, _saved_use_a85
+    with _binary_lock:
+        if _binary_builds == 0:
+            _saved_use_a85 = rl_config.useA85
+            rl_config.useA85 = 0
+        _binary_builds += 1
+    try:
+        yield
+    finally:
+        with _binary_lock:
+            _binary_builds -= 1
+            if _binary_builds == 0:
+                rl_config.useA85 = _saved_use_a85
+
+
+def get_report(answers):
+    """Returns the PDF for a set of verdicts, rendering it only on a cache miss.
+
+    Args:
+        answers (dict): See resolve_answers
+
+    Raises:
+        ValueError: Triggered when the answers are not valid
+
+    Returns:
+        tuple: (content hash, PDF bytes)
+    """
+    entries = resolve_answers(answers)
+    key = report_key(entries)
+    cached = _reports.get(key)
+    if cached is not None:
+        return key, cached[0]
+    with stage('report'):
+        data = render_report(entries)
+    _reports.put(key, (data, 'application/pdf'))
+    return key, data
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+
+class ResultCache:
+    """Cache of analysis results keyed by image content and analyzer version.
+
+    Clients re-post the same photo (retries, the React flow, load tests), so
+    results are stored under the hash of the uploaded image together with the
+    endpoint, the analyzer and its rules version. Entries live in an in-process
+    LRU bounded by their JSON size and, when a directory is configured, in a
+    disk tier that every worker process shares.
+    """
+
+    def __init__(self, max_bytes, directory=None):
+        """Defines the parameters to be used in the operations for this class.
+
+        Args:
+            max_bytes (int): Budget of the in-memory tier, in bytes of JSON
+            directory (String): Root of the disk tier, None keeps results in memory only
+        """
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(image_key, endpoint, analyzer, version):
+        """Builds the cache key of one analysis.
+
+        Args:
+            image_key (String): SHA-256 of the upload (DecodedImage.key)
+            endpoint (String): API endpoint or check name
+            analyzer (String): Analyzer producing the result
+            version (object): Rules or model version of the analyzer
+
+        Returns:
+            String: Hex key
+        """
+        return hashlib.sha256(f"{image_key}|{endpoint}|{analyzer}|{version}".encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _remember(self, key, data):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            self._entries[key] = data
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def get(self, key):
+        """Returns a cached result, or None on a miss."""
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if data is None and self.directory:
+            try:
+                with open(self._path(key), 'rb') as cache_file:
+                    data = cache_file.read()
+                self._remember(key, data)
+                with self._lock:
+                    self.disk_hits += 1
+            except FileNotFoundError:
+                pass
+        if data is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return json.loads(data)
+
+    def put(self, key, value):
+        """Stores a JSON-serializable result in both tiers."""
+        data = json.dumps(value).encode()
+        self._remember(key, data)
+        if self.directory:
+            path = self._path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as cache_file:
+                cache_file.write(data)
+            os.replace(tmp_path, path)
+
+    def get_or_compute(self, image_key, endpoint, analyzer, version, compute):
+        """Returns the cached result of an analysis, running it on a miss.
+
+        Args:
+            image_key (String): SHA-256 of the upload (DecodedImage.key)
+            endpoint (String): API endpoint or check name
+            analyzer (String): Analyzer producing the result
+            version (object): Rules or model version of the analyzer
+            compute (Callable): Zero-argument function returning a JSON-serializable result
+
+        Returns:
+            object: The cached or freshly computed result
+        """
+        key = self.make_key(image_key, endpoint, analyzer, version)
+        result = self.get(key)
+        if result is None:
+            result = compute()
+            self.put(key, result)
+        return result
+
+    def stats(self):
+        """Hit/miss counters and the size of the in-memory tier."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+    def clear(self):
+        """Empties the in-memory tier, the disk tier is kept."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+
+def analysis_version(rules_version):
+    """Version tag of an analysis: its rules version, the model bundle version, the inference resolution and YOLO backend."""
+    from .model_bundle import load_manifest
+    return f"{rules_version}/{load_manifest()['version']}/{settings.INFERENCE_LONG_EDGE}/{settings.YOLO_BACKEND}"
+
+
+result_cache = ResultCache(settings.RESULT_CACHE_BYTES, settings.RESULT_CACHE_DIR)
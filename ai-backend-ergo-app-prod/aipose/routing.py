@@ -0,0 +1,8 @@
+from django.urls import path
+
+from .consumers import JobConsumer, LivePostureConsumer
+
+websocket_urlpatterns = [
+    path('ws/jobs/<slug:job_id>/', JobConsumer.as_asgi()),
+    path('ws/live/', LivePostureConsumer.as_asgi()),
+]
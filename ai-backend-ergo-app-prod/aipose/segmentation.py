@@ -0,0 +1,250 @@
+import io
+import logging
+
+import numpy as np
+from django.conf import settings
+
+from .image_buffer import DecodedImage
+from .model_registry import registry
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+SEGMENTATION_MODEL = "facebook/mask2former-swin-base-coco-panoptic"
+# Manifest entries holding the checkpoint above, loaded from the bundle without the hub
+SEGMENTATION_FILES = ('mask2former_config', 'mask2former_preprocessor', 'mask2former_weights')
+
+# CPU backends Mask2Former can run on, selected with settings.SEGMENTATION_BACKEND
+SEGMENTATION_BACKENDS = ('torch', 'int8')
+
+# COCO classes the client reads boxes for (person, chair, desk and screen)
+BOX_CLASSES = ('person', 'chair', 'dining table', 'tv', 'laptop')
+# Object ("thing") classes of the COCO panoptic label set, the ones boxes can be requested for
+COCO_THING_CLASSES = (
+    'person', 'bicycle', 'car', 'motorcycle', 'airplane', 'bus', 'train', 'truck', 'boat', 'traffic light',
+    'fire hydrant', 'stop sign', 'parking meter', 'bench', 'bird', 'cat', 'dog', 'horse', 'sheep', 'cow',
+    'elephant', 'bear', 'zebra', 'giraffe', 'backpack', 'umbrella', 'handbag', 'tie', 'suitcase', 'frisbee',
+    'skis', 'snowboard', 'sports ball', 'kite', 'baseball bat', 'baseball glove', 'skateboard', 'surfboard',
+    'tennis racket', 'bottle', 'wine glass', 'cup', 'fork', 'knife', 'spoon', 'bowl', 'banana', 'apple',
+    'sandwich', 'orange', 'broccoli', 'carrot', 'hot dog', 'pizza', 'donut', 'cake', 'chair', 'couch',
+    'potted plant', 'bed', 'dining table', 'toilet', 'tv', 'laptop', 'mouse', 'remote', 'keyboard', 'cell phone',
+    'microwave', 'oven', 'toaster', 'sink', 'refrigerator', 'book', 'clock', 'vase', 'scissors', 'teddy bear',
+    'hair drier', 'toothbrush',
+)
+# Same-class boxes overlapping more than this are one object seen by two queries
+DUPLICATE_IOU = 0.7
+
+
+def _load_mask2former(backend=None):
+    """Loads Mask2Former as fp32 PyTorch or with dynamically quantized INT8 linear layers.
+
+    Most of the swin-base backbone and transformer decoder time is spent in
+    nn.Linear, which dynamic quantization runs as INT8 GEMMs on the CPU.
+
+    The checkpoint is read from the model bundle only, a missing or corrupt
+    file fails here instead of falling back to a download.
+
+    Args:
+        backend (String): torch or int8, defaults to settings.SEGMENTATION_BACKEND
+    """
+    import torch
+    from transformers import AutoImageProcessor, Mask2FormerForUniversalSegmentation
+
+    from .model_bundle import model_files_dir
+
+    backend = backend or settings.SEGMENTATION_BACKEND
+    if backend not in SEGMENTATION_BACKENDS:
+        raise ValueError(f"Unknown segmentation backend '{backend}', use one of {', '.join(SEGMENTATION_BACKENDS)}")
+    checkpoint = model_files_dir(SEGMENTATION_FILES)
+    processor = AutoImageProcessor.from_pretrained(checkpoint, local_files_only=True)
+    model = Mask2FormerForUniversalSegmentation.from_pretrained(checkpoint, local_files_only=True)
+    model.eval()
+    if backend == 'int8':
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return processor, model
+
+
+# A Mask2Former forward pass already uses every core, one instance per process is enough
+registry.register('mask2former', _load_mask2former, pool_size=1)
+
+
+def segment_objects(image):
+    """Runs Mask2Former panoptic segmentation on an image.
+
+    Args:
+        image (DecodedImage | String | ndarray): Image to process
+
+    Returns:
+        tuple: (HxW segment id map, list of segments with id, label and score)
+    """
+    import torch
+
+    image = DecodedImage.coerce(image)
+    with registry.checkout('mask2former') as (processor, model):
+        inputs = processor(images=image.rgb, return_tensors="pt")
+        with torch.no_grad():
+            outputs = model(**inputs)
+        results = processor.post_process_panoptic_segmentation(outputs, target_sizes=[image.shape[:2]])[0]
+        id2label = model.config.id2label
+
+    segments = [
+        {
+            'id': int(segment['id']),
+            'label': id2label[segment['label_id']],
+            'score': float(segment['score']),
+        }
+        for segment in results['segments_info']
+    ]
+    return results['segmentation'].cpu().numpy(), segments
+
+
+def _iou(a, b):
+    width = min(a['x2'], b['x2']) - max(a['x1'], b['x1'])
+    height = min(a['y2'], b['y2']) - max(a['y1'], b['y1'])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    area = lambda box: (box['x2'] - box['x1']) * (box['y2'] - box['y1'])
+    return intersection / (area(a) + area(b) - intersection)
+
+
+def detect_object_boxes(image, classes=BOX_CLASSES, min_score=0.5):
+    """Returns Mask2Former object boxes without panoptic post-processing.
+
+    The model runs at SEGMENTATION_BOXES_EDGE instead of the processor's
+    800 px default. Only queries of the requested classes are kept, and their
+    boxes are read from the quarter-resolution mask logits. Masks are never
+    upsampled or merged into a full size segment map.
+
+    Args:
+        image (DecodedImage | String | ndarray): Image to process
+        classes (List): COCO class names to keep
+        min_score (float): Queries below this class probability are dropped
+
+    Returns:
+        List: Boxes sorted by score, each a dict with label, score, x1, y1, x2 and y2
+        in pixels of the full resolution image
+    """
+    return detect_object_boxes_batch([image], classes, min_score)[0]
+
+
+def detect_object_boxes_batch(images, classes=BOX_CLASSES, min_score=0.5):
+    """detect_object_boxes for several images in one forward pass.
+
+    The processor pads the batch to its largest image; each image's pixel
+    mask tells its own area apart from that padding.
+
+    Args:
+        images (List): DecodedImage, path or BGR array per picture
+        classes (List): COCO class names to keep
+        min_score (float): Queries below this class probability are dropped
+
+    Returns:
+        List: Boxes of each image in input order, see detect_object_boxes
+    """
+    import torch
+
+    images = [DecodedImage.coerce(image) for image in images]
+    edge = settings.SEGMENTATION_BOXES_EDGE
+    with registry.checkout('mask2former') as (processor, model):
+        inputs = processor(images=[image.inference_rgb for image in images],
+                           size={'shortest_edge': edge, 'longest_edge': edge * 5 // 3}, return_tensors="pt")
+        with torch.no_grad():
+            outputs = model(**inputs)
+        id2label = model.config.id2label
+
+    wanted = {label_id for label_id, label in id2label.items() if label in classes}
+    return [_boxes(outputs, inputs, index, image.shape[:2], id2label, wanted, min_score)
+            for index, image in enumerate(images)]
+
+
+def _boxes(outputs, inputs, index, size, id2label, wanted, min_score):
+    """Reads the boxes of one image of a Mask2Former batch from its mask logits."""
+    height, width = size
+    # The last class is "no object"
+    scores, label_ids = outputs.class_queries_logits[index].softmax(-1)[:, :-1].max(-1)
+    queries = [query for query in range(len(scores))
+               if int(label_ids[query]) in wanted and float(scores[query]) > min_score]
+    if not queries:
+        return []
+
+    # Mask logits cover the padded input at 1/4 scale, the pixel mask tells
+    # the resized image apart from the padding added at the bottom and right
+    masks = (outputs.masks_queries_logits[index, queries] > 0).cpu().numpy()
+    pixel_mask = inputs['pixel_mask'][index].cpu().numpy().astype(bool)
+    input_height, input_width = pixel_mask.shape
+    mask_height, mask_width = masks.shape[1:]
+    scale_x = input_width / mask_width * width / pixel_mask.any(axis=0).sum()
+    scale_y = input_height / mask_height * height / pixel_mask.any(axis=1).sum()
+
+    boxes = []
+    for query, mask in zip(queries, masks):
+        columns = np.flatnonzero(mask.any(axis=0))
+        rows = np.flatnonzero(mask.any(axis=1))
+        if not len(columns):
+            continue
+        boxes.append({
+            'label': id2label[int(label_ids[query])],
+            'score': float(scores[query]),
+            'x1': int(columns[0] * scale_x),
+            'y1': int(rows[0] * scale_y),
+            'x2': int(min(width, (columns[-1] + 1) * scale_x)),
+            'y2': int(min(height, (rows[-1] + 1) * scale_y)),
+        })
+    boxes.sort(key=lambda box: box['score'], reverse=True)
+
+    kept = []
+    for box in boxes:
+        if all(other['label'] != box['label'] or _iou(box, other) <= DUPLICATE_IOU for other in kept):
+            kept.append(box)
+    return kept
+
+
+def draw_panoptic_segmentation(segmentation, segments):
+    """Renders the segment map with a legend of the detected objects.
+
+    Args:
+        segmentation (ndarray): HxW segment id map
+        segments (List): Segments as returned by segment_objects
+
+    Returns:
+        bytes: PNG of the annotated segmentation
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import matplotlib.patches as mpatches
+
+    # Choose a basic colormap
+    cmap = plt.colormaps['viridis']
+
+    fig, ax = plt.subplots()
+    ax.imshow(segmentation)
+    instances_counter = {}
+    handles = []
+
+    for segment in segments:
+        instances_counter[segment['label']] = instances_counter.get(segment['label'], 0) + 1
+        label = f"{segment['label']}-{instances_counter[segment['label']]}"
+        handles.append(mpatches.Patch(color=cmap(segment['id']), label=label))
+
+    legend = ax.legend(handles=handles, bbox_to_anchor=(1.05, 1), loc='upper left')
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_extra_artists=(legend,), bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+def annotate_objects(image):
+    """Segments an image and renders the annotated result.
+
+    Args:
+        image (DecodedImage | String | ndarray): Image to process
+
+    Returns:
+        tuple: (PNG bytes of the annotated segmentation, list of segments)
+    """
+    segmentation, segments = segment_objects(image)
+    logger.info(f"Segmented {len(segments)} objects")
+    return draw_panoptic_segmentation(segmentation, segments), segments
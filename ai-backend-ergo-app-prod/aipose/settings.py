@@ -91,6 +91,7 @@ INSTALLED_APPS = [
 ROOT_URLCONF = 'aipose.urls'
 
 MIDDLEWARE = [
+    'aipose.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -103,6 +104,13 @@ MIDDLEWARE = [
 
 CORS_ALLOW_ALL_ORIGINS = True
 
+REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'aipose.timing.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -179,3 +187,139 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Keep uploads up to the nginx body limit in memory so analyzers can decode
+# them straight from the request bytes (see aipose/image_buffer.py)
+FILE_UPLOAD_MAX_MEMORY_SIZE = 40 * 1024 * 1024
+
+# Heavy models are loaded once per worker process. Set MODEL_WARMUP=1 to load
+# them when the worker boots instead of on the first request.
+MODEL_WARMUP = os.getenv('MODEL_WARMUP', '0') == '1'
+
+# Versioned model bundle, see models/manifest.json and `manage.py fetch_models`
+MODEL_BUNDLE_DIR = os.path.join(BASE_DIR, 'models')
+
+# Upper bound for loading every model at boot, checked by `manage.py check_models`
+MODEL_LOAD_BUDGET_SECONDS = float(os.getenv('MODEL_LOAD_BUDGET_SECONDS', '30'))
+
+# Instances of each model/analyzer a worker process keeps for concurrent requests
+# (one per gunicorn thread is enough, more only costs memory)
+MODEL_POOL_SIZE = int(os.getenv('MODEL_POOL_SIZE', '4'))
+
+# Heavy endpoints (arm/screen, object annotation) run as jobs in a local process
+# pool; state and output files live under JOBS_ROOT, see aipose/jobs.py
+JOBS_ROOT = os.path.join(MEDIA_ROOT, 'jobs')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_TTL_SECONDS = int(os.getenv('JOB_TTL_SECONDS', str(24 * 60 * 60)))
+JOB_POLL_INTERVAL = 0.5
+
+# Annotated images are stored once under their content hash and served by
+# /api/media/<id>/ in the encoding the client asks for, see aipose/media_store.py
+MEDIA_STORE_ROOT = os.path.join(MEDIA_ROOT, 'annotated')
+MEDIA_STORE_CACHE_BYTES = int(os.getenv('MEDIA_STORE_CACHE_BYTES', str(64 * 1024 * 1024)))
+# Stored images nobody re-stored for this long are deleted, like jobs after JOB_TTL_SECONDS
+MEDIA_STORE_TTL_SECONDS = int(os.getenv('MEDIA_STORE_TTL_SECONDS', str(24 * 60 * 60)))
+
+# Analysis results keyed by upload hash, analyzer and rules version, see
+# aipose/result_cache.py. Set RESULT_CACHE_DISK=1 to share them between worker
+# processes through files under MEDIA_ROOT.
+RESULT_CACHE_BYTES = int(os.getenv('RESULT_CACHE_BYTES', str(32 * 1024 * 1024)))
+RESULT_CACHE_DIR = os.path.join(MEDIA_ROOT, 'result_cache') if os.getenv('RESULT_CACHE_DISK', '0') == '1' else None
+
+# Per-stage request timings (decode, pose, yolo, rules, encode, serialize...),
+# see aipose/timing.py. SERVER_TIMING adds them to a Server-Timing response
+# header, METRICS_ENABLED keeps per-endpoint histograms for /metrics.
+SERVER_TIMING = os.getenv('SERVER_TIMING', '1') == '1'
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '0') == '1'
+
+# Long edge, in pixels, images are downscaled to before the pose and hand
+# models run (0 keeps the upload size). Large JPEGs are decoded straight at a
+# reduced scale for them. Landmarks are normalized, so annotations are still
+# drawn on the full resolution image. Off by default: benchmarks/check_downscale.py
+# still finds verdicts that change at every long edge, so only set it once that
+# check passes on the fixtures.
+INFERENCE_LONG_EDGE = int(os.getenv('INFERENCE_LONG_EDGE', '0'))
+
+# Shortest edge Mask2Former runs at in mode=boxes object annotation (the
+# panoptic mode keeps the processor's 800 px), see segmentation.detect_object_boxes
+SEGMENTATION_BOXES_EDGE = int(os.getenv('SEGMENTATION_BOXES_EDGE', '384'))
+
+# CPU inference backends, see `manage.py export_models` and
+# benchmarks/check_backends.py. YOLO_BACKEND is torch (eager fp32) or onnx
+# (onnxruntime on the exported graph). SEGMENTATION_BACKEND is torch (fp32) or
+# int8 (dynamically quantized linear layers).
+YOLO_BACKEND = os.getenv('YOLO_BACKEND', 'torch')
+SEGMENTATION_BACKEND = os.getenv('SEGMENTATION_BACKEND', 'torch')
+
+# Long edge, in pixels, the datajson image_path pictures are resized to when
+# aipose/mapping_index.py preloads them for reports (0 keeps the file size)
+REPORT_IMAGE_EDGE = int(os.getenv('REPORT_IMAGE_EDGE', '480'))
+
+# Budget, in bytes, of the in-process cache of rendered report PDFs, keyed by
+# the hash of the report answers, see aipose/report.py
+REPORT_CACHE_BYTES = int(os.getenv('REPORT_CACHE_BYTES', str(32 * 1024 * 1024)))
+
+# Multi-image batch endpoint, see aipose/batch.py. BATCH_SIZE images share one
+# YOLO and one Mask2Former forward pass; BATCH_WORKERS threads run the
+# per-image MediaPipe checks.
+BATCH_MAX_IMAGES = int(os.getenv('BATCH_MAX_IMAGES', '50'))
+BATCH_SIZE = int(os.getenv('BATCH_SIZE', '8'))
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', str(MODEL_POOL_SIZE)))
+
+# Video and burst analysis, see aipose/tracking.py. Clips are decoded at up to
+# VIDEO_SAMPLE_FPS for the first VIDEO_MAX_SECONDS; a sampled frame is tracked
+# when it moved (mean grey level change above VIDEO_MOTION_THRESHOLD) at least
+# VIDEO_MIN_GAP_MS after the last tracked one, or after VIDEO_MAX_GAP_MS
+# regardless, up to VIDEO_MAX_FRAMES tracked frames.
+TRACKING_POSE_COMPLEXITY = int(os.getenv('TRACKING_POSE_COMPLEXITY', '1'))
+VIDEO_SAMPLE_FPS = float(os.getenv('VIDEO_SAMPLE_FPS', '10'))
+VIDEO_MAX_SECONDS = float(os.getenv('VIDEO_MAX_SECONDS', '30'))
+VIDEO_MIN_GAP_MS = int(os.getenv('VIDEO_MIN_GAP_MS', '100'))
+VIDEO_MAX_GAP_MS = int(os.getenv('VIDEO_MAX_GAP_MS', '1000'))
+VIDEO_MOTION_THRESHOLD = float(os.getenv('VIDEO_MOTION_THRESHOLD', '2.0'))
+VIDEO_MAX_FRAMES = int(os.getenv('VIDEO_MAX_FRAMES', '30'))
+BURST_INTERVAL_MS = int(os.getenv('BURST_INTERVAL_MS', '200'))
+
+# Live webcam posture over the WebSocket `ws/live/`, see aipose/live.py. Each
+# session holds a tracking graph, up to LIVE_MAX_SESSIONS per process, and
+# LIVE_WORKERS threads run the frames of every session. A session analyses at
+# most LIVE_MAX_FPS frames per second, drops frames older than LIVE_STALE_MS,
+# and reports a verdict once it held for LIVE_STABLE_FRAMES analysed frames.
+LIVE_MAX_SESSIONS = int(os.getenv('LIVE_MAX_SESSIONS', '8'))
+LIVE_WORKERS = int(os.getenv('LIVE_WORKERS', str(MODEL_POOL_SIZE)))
+LIVE_MAX_FPS = float(os.getenv('LIVE_MAX_FPS', '5'))
+LIVE_STALE_MS = int(os.getenv('LIVE_STALE_MS', '500'))
+LIVE_STABLE_FRAMES = int(os.getenv('LIVE_STABLE_FRAMES', '2'))
+
+# Anthropic workspace analysis, see aipose/llm.py. One async client per process
+# keeps at most LLM_MAX_CONCURRENCY requests in flight and retries failures up
+# to LLM_MAX_RETRIES times with backoff. Uploads are shrunk to LLM_IMAGE_EDGE
+# pixels and recompressed at LLM_IMAGE_QUALITY before they are sent, and
+# answers are cached by image and prompt version. ANTHROPIC_BASE_URL points the
+# client at another server, e.g. benchmarks/stub_anthropic.py.
+ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
+ANTHROPIC_BASE_URL = os.getenv('ANTHROPIC_BASE_URL') or None
+LLM_MODEL = os.getenv('LLM_MODEL', 'claude-3-opus-20240229')
+LLM_MAX_TOKENS = int(os.getenv('LLM_MAX_TOKENS', '1024'))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '60'))
+LLM_IMAGE_EDGE = int(os.getenv('LLM_IMAGE_EDGE', '1024'))
+LLM_IMAGE_QUALITY = int(os.getenv('LLM_IMAGE_QUALITY', '80'))
+
+# Quality gate run before the analyzers, see aipose/quality_gate.py. Photos are
+# measured on a QUALITY_GATE_EDGE thumbnail and rejected when their short side
+# is below QUALITY_MIN_EDGE, their mean grey level is outside
+# QUALITY_MIN_BRIGHTNESS..QUALITY_MAX_BRIGHTNESS, their grey level standard
+# deviation is below QUALITY_MIN_CONTRAST, or the variance of their Laplacian is
+# below QUALITY_MIN_SHARPNESS. The thresholds apply to the thumbnail, so change
+# them together with QUALITY_GATE_EDGE. QUALITY_MAX_BRIGHTNESS only catches
+# washed out photos: the reference pictures are drawn on pure white and score
+# close to 250 themselves.
+QUALITY_GATE = os.getenv('QUALITY_GATE', '1') == '1'
+QUALITY_GATE_EDGE = int(os.getenv('QUALITY_GATE_EDGE', '256'))
+QUALITY_MIN_EDGE = int(os.getenv('QUALITY_MIN_EDGE', '480'))
+QUALITY_MIN_BRIGHTNESS = float(os.getenv('QUALITY_MIN_BRIGHTNESS', '40'))
+QUALITY_MAX_BRIGHTNESS = float(os.getenv('QUALITY_MAX_BRIGHTNESS', '250'))
+QUALITY_MIN_CONTRAST = float(os.getenv('QUALITY_MIN_CONTRAST', '10'))
+QUALITY_MIN_SHARPNESS = float(os.getenv('QUALITY_MIN_SHARPNESS', '50'))
@@ -5,9 +5,10 @@ import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 
 
-# Load Mask2Former model and processor
-processor = AutoImageProcessor.from_pretrained("facebook/mask2former-swin-base-coco-panoptic")
-model = Mask2FormerForUniversalSegmentation.from_pretrained("facebook/mask2former-swin-base-coco-panoptic")
+# Load Mask2Former model and processor from the model bundle (`python manage.py fetch_models`)
+checkpoint = "models/mask2former-swin-base-coco-panoptic"
+processor = AutoImageProcessor.from_pretrained(checkpoint, local_files_only=True)
+model = Mask2FormerForUniversalSegmentation.from_pretrained(checkpoint, local_files_only=True)
 
 # URL to the image
 url = "/home/yuvaraj0702/aipose/media/tmp/poipoi.jpeg"
@@ -0,0 +1,216 @@
+import bisect
+import contextvars
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+# Stage timings of the request being handled, None when nobody is collecting
+_collector = contextvars.ContextVar('stage_timings', default=None)
+
+# Upper bounds of the stage histograms, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_histograms = {}
+_responses = {}
+_metrics_lock = threading.Lock()
+
+
+class stage:
+    """Times a block of work as a named stage of the current request.
+
+    Durations of stages with the same name add up (two pose passes show as one
+    `pose` stage). Outside a request, or with both SERVER_TIMING and
+    METRICS_ENABLED off, entering a stage costs one context variable lookup.
+
+        with stage('pose'):
+            results = pose.process(image.rgb)
+    """
+    __slots__ = ('name', 'timings', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.timings = _collector.get()
+        if self.timings is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            self.timings[self.name] = self.timings.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+def collecting():
+    """Tells whether the current request collects stage timings."""
+    return _collector.get() is not None
+
+
+def run_timed(function, *args, **kwargs):
+    """Runs a function with a stage timings dict of its own, for work handed to another thread.
+
+    Tasks never write to the timings of the request that queued them, the
+    request adds them up with merge_timings once the tasks are done.
+
+    Returns:
+        tuple: (return value of the function, stage name to seconds)
+    """
+    timings = {}
+    token = _collector.set(timings)
+    try:
+        return function(*args, **kwargs), timings
+    finally:
+        _collector.reset(token)
+
+
+def merge_timings(timings):
+    """Adds stage timings returned by run_timed to the current request, see stage."""
+    current = _collector.get()
+    if current is not None:
+        for name, seconds in timings.items():
+            current[name] = current.get(name, 0.0) + seconds
+
+
+def timed(name):
+    """Decorator timing every call of a function as a stage, see stage."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Histogram:
+    """Cumulative Prometheus histogram with fixed buckets."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def observe(endpoint, timings, status_code):
+    """Adds the stage timings of one request to the per-endpoint histograms.
+
+    Args:
+        endpoint (String): URL name of the view that handled the request
+        timings (dict): Stage name to seconds, including `total`
+        status_code (int): Response status
+    """
+    with _metrics_lock:
+        for name, seconds in timings.items():
+            histogram = _histograms.get((endpoint, name))
+            if histogram is None:
+                histogram = _histograms[(endpoint, name)] = Histogram()
+            histogram.observe(seconds)
+        key = (endpoint, status_code)
+        _responses[key] = _responses.get(key, 0) + 1
+
+
+def render_metrics():
+    """Renders the collected metrics in the Prometheus text format.
+
+    Returns:
+        String: Exposition text, version 0.0.4
+    """
+    from . import llm
+    from .detection import detector
+    from .result_cache import result_cache
+
+    lines = [
+        '# HELP aipose_stage_seconds Time spent in each stage of a request.',
+        '# TYPE aipose_stage_seconds histogram',
+    ]
+    with _metrics_lock:
+        for (endpoint, name), histogram in sorted(_histograms.items()):
+            labels = f'endpoint="{endpoint}",stage="{name}"'
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                lines.append(f'aipose_stage_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'aipose_stage_seconds_sum{{{labels}}} {histogram.sum:.6f}')
+            lines.append(f'aipose_stage_seconds_count{{{labels}}} {histogram.count}')
+
+        lines += ['# HELP aipose_responses_total Responses by endpoint and status code.',
+                  '# TYPE aipose_responses_total counter']
+        for (endpoint, status_code), count in sorted(_responses.items()):
+            lines.append(f'aipose_responses_total{{endpoint="{endpoint}",status="{status_code}"}} {count}')
+
+    cache = result_cache.stats()
+    lines += ['# HELP aipose_result_cache_total Result cache lookups by outcome.',
+              '# TYPE aipose_result_cache_total counter']
+    for outcome in ('hits', 'disk_hits', 'misses'):
+        lines.append(f'aipose_result_cache_total{{outcome="{outcome}"}} {cache[outcome]}')
+    lines += ['# HELP aipose_detection_cache_total YOLO detection cache lookups by outcome.',
+              '# TYPE aipose_detection_cache_total counter',
+              f'aipose_detection_cache_total{{outcome="hits"}} {detector.hits}',
+              f'aipose_detection_cache_total{{outcome="misses"}} {detector.misses}']
+    llm_usage = llm.usage()
+    lines += ['# HELP aipose_llm_requests_total Anthropic Messages API calls by outcome.',
+              '# TYPE aipose_llm_requests_total counter',
+              f'aipose_llm_requests_total{{outcome="ok"}} {llm_usage["requests"]}',
+              f'aipose_llm_requests_total{{outcome="error"}} {llm_usage["errors"]}',
+              '# HELP aipose_llm_tokens_total Tokens billed by the Anthropic Messages API.',
+              '# TYPE aipose_llm_tokens_total counter',
+              f'aipose_llm_tokens_total{{kind="input"}} {llm_usage["input_tokens"]}',
+              f'aipose_llm_tokens_total{{kind="output"}} {llm_usage["output_tokens"]}']
+    return '\n'.join(lines) + '\n'
+
+
+def server_timing(timings):
+    """Formats stage timings as a Server-Timing header value (durations in ms)."""
+    return ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings.items())
+
+
+class ServerTimingMiddleware:
+    """Collects the stages of each request for the Server-Timing header and /metrics.
+
+    Does nothing when both SERVER_TIMING and METRICS_ENABLED are off.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.server_timing = settings.SERVER_TIMING
+        self.metrics_enabled = settings.METRICS_ENABLED
+
+    def __call__(self, request):
+        if not (self.server_timing or self.metrics_enabled):
+            return self.get_response(request)
+
+        timings = {}
+        token = _collector.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _collector.reset(token)
+        timings['total'] = time.perf_counter() - start
+
+        if self.server_timing:
+            response['Server-Timing'] = server_timing(timings)
+        match = request.resolver_match
+        endpoint = match.url_name if match is not None and match.url_name else 'unmatched'
+        if self.metrics_enabled and endpoint != 'metrics':
+            observe(endpoint, timings, response.status_code)
+        return response
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSON renderer that reports serialization as the `serialize` stage."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with stage('serialize'):
+            return super().render(data, accepted_media_type, renderer_context)
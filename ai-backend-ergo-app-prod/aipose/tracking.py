@@ -0,0 +1,332 @@
+import hashlib
+import logging
+import tempfile
+from collections import defaultdict
+from contextlib import ExitStack
+
+import cv2
+import numpy as np
+from django.conf import settings
+
+from .batch_rules import score_desk, score_hands, score_seated, stack_landmarks, verdict_lists
+from .handpose import hand_landmarks_array
+from .image_buffer import shrink
+from .landmarks import landmarks_array
+from .model_registry import registry
+from .timing import stage
+
+# Initialize logger
+logger = logging.getLogger('myapp')
+
+# Checks a clip can be scored on, with the batch rule scoring their landmarks
+POSE_CHECKS = {'seatedposture': score_seated, 'deskposition': score_desk}
+VIDEO_CHECKS = tuple(POSE_CHECKS) + ('handposition',)
+
+# Side of the grey thumbnails frames are compared on to measure motion
+MOTION_THUMBNAIL = 32
+
+
+class HandTracker:
+    """MediaPipe hand landmarker in VIDEO running mode.
+
+    VIDEO mode tracks the hands found in the previous frame instead of running
+    palm detection on every frame. It requires strictly increasing timestamps
+    for the lifetime of the landmarker, so each clip is shifted past the last
+    timestamp the instance has seen.
+    """
+
+    def __init__(self, landmarker):
+        self.landmarker = landmarker
+        self.last_timestamp_ms = 0
+        self.offset_ms = 0
+
+    def start_clip(self):
+        """Shifts the timestamps of the next clip past everything seen so far."""
+        self.offset_ms = self.last_timestamp_ms + 1
+
+    def detect(self, rgb, timestamp_ms):
+        """Tracks hands in one frame of the current clip.
+
+        Args:
+            rgb (ndarray): Contiguous RGB frame
+            timestamp_ms (int): Time of the frame within the clip
+
+        Returns:
+            List: (handedness, (21, 3) landmark array) for each hand
+        """
+        import mediapipe as mp
+
+        timestamp_ms = self.offset_ms + int(timestamp_ms)
+        result = self.landmarker.detect_for_video(mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb), timestamp_ms)
+        self.last_timestamp_ms = timestamp_ms
+        return [(handedness[0].category_name, hand_landmarks_array(landmarks))
+                for handedness, landmarks in zip(result.handedness, result.hand_landmarks) if handedness]
+
+
+class AdaptiveSampler:
+    """Decides which frames of a clip are worth a model pass.
+
+    A frame is analysed when at least min_gap_ms passed since the last
+    analysed one and the picture moved (mean grey level change above
+    motion_threshold), or when max_gap_ms passed whatever the motion. Skipped
+    frames count towards the weight of the last analysed one.
+    """
+
+    def __init__(self, min_gap_ms, max_gap_ms, motion_threshold):
+        self.min_gap_ms = min_gap_ms
+        self.max_gap_ms = max_gap_ms
+        self.motion_threshold = motion_threshold
+        self._last_timestamp = None
+        self._last_thumbnail = None
+
+    def accept(self, timestamp_ms, rgb):
+        if self._last_timestamp is not None:
+            elapsed = timestamp_ms - self._last_timestamp
+            if elapsed < self.min_gap_ms:
+                return False
+        thumbnail = cv2.resize(cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY), (MOTION_THUMBNAIL, MOTION_THUMBNAIL),
+                               interpolation=cv2.INTER_AREA).astype(np.int16)
+        if self._last_timestamp is not None and elapsed < self.max_gap_ms:
+            if np.abs(thumbnail - self._last_thumbnail).mean() < self.motion_threshold:
+                return False
+        self._last_timestamp = timestamp_ms
+        self._last_thumbnail = thumbnail
+        return True
+
+
+def clip_frames(data, sample_fps, max_seconds):
+    """Reads frames of a video clip at up to sample_fps.
+
+    Frames in between are only grabbed: they are never converted, resized or
+    handed to a model.
+
+    Args:
+        data (bytes): Encoded clip (MP4, WebM, MOV...)
+        sample_fps (float): Frames per second to decode at most
+        max_seconds (float): Length of clip read, the rest is ignored
+
+    Raises:
+        ValueError: Triggered when the clip cannot be read
+
+    Yields:
+        tuple: (timestamp in ms, RGB frame no larger than INFERENCE_LONG_EDGE)
+    """
+    # OpenCV only reads video from a path
+    with tempfile.NamedTemporaryFile(suffix='.video') as clip_file:
+        clip_file.write(data)
+        clip_file.flush()
+        capture = cv2.VideoCapture(clip_file.name)
+        try:
+            if not capture.isOpened():
+                raise ValueError("Invalid video file. Please upload an MP4, WebM or MOV clip.")
+            fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+            step_ms = 1000.0 / sample_fps
+            next_ms = 0.0
+            index = -1
+            while True:
+                # grab() still decodes the packet (later frames depend on it) but skips the conversion
+                with stage('decode'):
+                    if not capture.grab():
+                        break
+                index += 1
+                timestamp_ms = index * 1000.0 / fps
+                if timestamp_ms > max_seconds * 1000:
+                    break
+                if timestamp_ms + 1e-6 < next_ms:
+                    continue
+                while next_ms <= timestamp_ms + 1e-6:
+                    next_ms += step_ms
+                with stage('decode'):
+                    ok, bgr = capture.retrieve()
+                if not ok:
+                    break
+                if settings.INFERENCE_LONG_EDGE:
+                    with stage('downscale'):
+                        bgr = shrink(bgr, settings.INFERENCE_LONG_EDGE)
+                with stage('convert'):
+                    rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+                yield int(timestamp_ms), rgb
+            if index < 0:
+                raise ValueError("Invalid video file. Please upload an MP4, WebM or MOV clip.")
+        finally:
+            capture.release()
+
+
+def burst_frames(images, interval_ms):
+    """Turns a burst of still photos into timestamped frames.
+
+    Args:
+        images (List): DecodedImage per photo, in capture order
+        interval_ms (int): Time between two photos
+
+    Yields:
+        tuple: (timestamp in ms, RGB frame no larger than INFERENCE_LONG_EDGE)
+    """
+    for index, image in enumerate(images):
+        yield index * interval_ms, image.inference_rgb
+
+
+def smooth(frame_verdicts, weights):
+    """Weighted vote of per-frame verdicts, position by position.
+
+    Args:
+        frame_verdicts (List): Verdict list of each scored frame
+        weights (List): Number of sampled frames each scored frame stands for
+
+    Returns:
+        tuple: (winning verdict per position, share of the weight that agreed with it)
+    """
+    votes = defaultdict(lambda: defaultdict(float))
+    for verdicts, weight in zip(frame_verdicts, weights):
+        for position, verdict in enumerate(verdicts):
+            votes[position][verdict] += weight
+    smoothed, agreement = [], []
+    for position in sorted(votes):
+        verdict, weight = max(votes[position].items(), key=lambda item: item[1])
+        smoothed.append(verdict)
+        agreement.append(round(weight / sum(votes[position].values()), 3))
+    return smoothed, agreement
+
+
+def analyze_frames(frames, checks):
+    """Tracks pose and hands through a clip and returns time-smoothed verdicts.
+
+    Landmarks come from MediaPipe tracking graphs, which run the person and
+    palm detectors only when tracking is lost, on the frames AdaptiveSampler
+    keeps. Every kept frame is scored with the batch rules and the verdicts
+    are voted over time, each frame weighted by the sampled frames it stands for.
+
+    Args:
+        frames (Iterable): (timestamp in ms, RGB frame) pairs in time order
+        checks (List): Names from VIDEO_CHECKS
+
+    Returns:
+        dict: Smoothed verdicts and agreement per check, frame counts, a
+        per-frame timeline and errors for checks no frame could be scored on
+    """
+    sampler = AdaptiveSampler(settings.VIDEO_MIN_GAP_MS, settings.VIDEO_MAX_GAP_MS, settings.VIDEO_MOTION_THRESHOLD)
+    pose_checks = [check for check in checks if check in POSE_CHECKS]
+    timestamps, weights, poses, hands = [], [], [], []
+    sampled = 0
+
+    with ExitStack() as models:
+        pose = models.enter_context(registry.checkout('pose_tracking')) if pose_checks else None
+        hand_tracker = models.enter_context(registry.checkout('hand_tracker')) if 'handposition' in checks else None
+        # Tracking state must not leak from the previous clip these instances saw
+        if pose is not None:
+            pose.reset()
+        if hand_tracker is not None:
+            hand_tracker.start_clip()
+        for timestamp_ms, rgb in frames:
+            sampled += 1
+            if not sampler.accept(timestamp_ms, rgb):
+                if weights:
+                    weights[-1] += 1
+                continue
+            if len(timestamps) >= settings.VIDEO_MAX_FRAMES:
+                break
+            timestamps.append(timestamp_ms)
+            weights.append(1)
+            if pose is not None:
+                with stage('pose'):
+                    poses.append(landmarks_array(pose.process(rgb).pose_landmarks))
+            if hand_tracker is not None:
+                with stage('hands'):
+                    hands.append(hand_tracker.detect(rgb, timestamp_ms))
+
+    if not timestamps:
+        raise ValueError("No frames could be read from the upload.")
+
+    timeline = [{'timestamp_ms': timestamp_ms} for timestamp_ms in timestamps]
+    response = {}
+    errors = {}
+    with stage('rules'):
+        for check in pose_checks:
+            frame_verdicts = verdict_lists(POSE_CHECKS[check](stack_landmarks(poses)))
+            for entry, verdicts in zip(timeline, frame_verdicts):
+                entry[check] = verdicts
+            scored = [(verdicts, weight) for verdicts, weight in zip(frame_verdicts, weights) if verdicts]
+            if not scored:
+                errors[check] = "No frame showed a clear side view of the body. Please record from the side."
+                continue
+            smoothed, agreement = smooth(*zip(*scored))
+            response[check] = {'verdicts': smoothed, 'agreement': agreement, 'frames': len(scored)}
+
+        if 'handposition' in checks:
+            by_side = defaultdict(lambda: ([], []))
+            for entry, frame_hands, weight in zip(timeline, hands, weights):
+                if not frame_hands:
+                    continue
+                verdicts = score_hands(np.stack([landmarks for _, landmarks in frame_hands]))['verdicts'].tolist()
+                entry['handposition'] = {side: hand for (side, _), hand in zip(frame_hands, verdicts)}
+                for (side, _), hand in zip(frame_hands, verdicts):
+                    by_side[side][0].append(hand)
+                    by_side[side][1].append(weight)
+            if not by_side:
+                errors['handposition'] = "No hands detected in any frame. Please record your hands on the keyboard or mouse."
+            else:
+                response['handposition'] = {}
+                for side in sorted(by_side):
+                    smoothed, agreement = smooth(*by_side[side])
+                    response['handposition'][side] = {'verdicts': smoothed, 'agreement': agreement,
+                                                      'frames': len(by_side[side][0])}
+
+    logger.info(f"Tracked {len(timestamps)} of {sampled} sampled frames for {', '.join(checks)}")
+    response.update(frames_sampled=sampled, frames_analyzed=len(timestamps), timeline=timeline, errors=errors)
+    return response
+
+
+def tracking_version():
+    """Version results of the video endpoint are cached under: rules, tracking graph and sampling settings."""
+    from . import bodypose, deskpose, handpose
+    from .result_cache import analysis_version
+
+    rules = f"{bodypose.RULES_VERSION}.{deskpose.RULES_VERSION}.{handpose.RULES_VERSION}"
+    return analysis_version(
+        f"{rules}/{settings.TRACKING_POSE_COMPLEXITY}/{settings.VIDEO_SAMPLE_FPS}/{settings.VIDEO_MIN_GAP_MS}/"
+        f"{settings.VIDEO_MAX_GAP_MS}/{settings.VIDEO_MOTION_THRESHOLD}/{settings.VIDEO_MAX_FRAMES}")
+
+
+def analyze_clip(data, checks):
+    """Scores a video clip, reusing the result of an identical earlier upload.
+
+    Args:
+        data (bytes): Encoded clip
+        checks (List): Names from VIDEO_CHECKS
+
+    Raises:
+        ValueError: Triggered when the clip cannot be read
+
+    Returns:
+        dict: See analyze_frames
+    """
+    from .result_cache import result_cache
+
+    return result_cache.get_or_compute(
+        hashlib.sha256(data).hexdigest(), 'video', ','.join(checks), tracking_version(),
+        lambda: analyze_frames(clip_frames(data, settings.VIDEO_SAMPLE_FPS, settings.VIDEO_MAX_SECONDS), checks))
+
+
+def analyze_burst(images, interval_ms, checks):
+    """Scores a burst of photos as the frames of a clip, reusing earlier results for the same burst.
+
+    Args:
+        images (List): DecodedImage per photo, in capture order
+        interval_ms (int): Time between two photos, VIDEO mode needs increasing timestamps
+        checks (List): Names from VIDEO_CHECKS
+
+    Raises:
+        ValueError: Triggered when interval_ms is not positive
+
+    Returns:
+        dict: See analyze_frames
+    """
+    from .result_cache import result_cache
+
+    if interval_ms <= 0:
+        raise ValueError("interval_ms must be a positive number of milliseconds")
+
+    burst_key = hashlib.sha256(f"{interval_ms}|{'|'.join(image.key for image in images)}".encode()).hexdigest()
+    return result_cache.get_or_compute(
+        burst_key, 'burst', ','.join(checks), tracking_version(),
+        lambda: analyze_frames(burst_frames(images, interval_ms), checks))
@@ -3,10 +3,14 @@ from django.conf import settings
 from django.conf.urls.static import static
 from .views import (
     SeatedPosture, HandPosition, DeskPosition, 
-    Annotation, GenerateReport, AnnotateObject, 
-    AnthropicAnalysis, BackAngleAnalysis, ArmScreenAnalysis,
+    Annotation, GenerateReport, AnnotateObject,
+    BackAngleAnalysis, ArmScreenAnalysis,
     ImageQualityCheck, CameraAngleAnalysis
 )
+from .api_views import (
+    AnthropicAnalysis, BatchAnalysis, FullAssessment, JobStatus, JobSubmit, Metrics, ReportPDF,
+    StoredImage, VideoAnalysis
+)
 
 urlpatterns = [
     path('api/images/seatedposture/', SeatedPosture.as_view(), name='seated-posture'),
@@ -14,12 +18,20 @@ urlpatterns = [
     path('api/images/deskposition/', DeskPosition.as_view(), name='desk-position'),
     path('api/images/annotateimage/', Annotation.as_view(), name='annotate-image'),
     path('api/report/generate', GenerateReport.as_view(), name='generate-report'),
+    path('api/report/pdf/', ReportPDF.as_view(), name='report-pdf'),
     path('api/images/annotateobject/', AnnotateObject.as_view(), name='annotate-object'),
     path('api/images/anthropic-analysis/', AnthropicAnalysis.as_view(), name='anthropic-analysis'),
     path('api/analyze/back-angle/', BackAngleAnalysis.as_view(), name='back-angle-analysis'),
     path('api/analyze/arm-screen/', ArmScreenAnalysis.as_view(), name='arm-screen-analysis'),
     path('api/preprocess/check-quality/', ImageQualityCheck.as_view(), name='image-quality-check'),
     path('api/analyze/camera-angle/', CameraAngleAnalysis.as_view(), name='camera-angle-analysis'),
+    path('api/assessment/', FullAssessment.as_view(), name='full-assessment'),
+    path('api/batch/', BatchAnalysis.as_view(), name='batch-analysis'),
+    path('api/analyze/video/', VideoAnalysis.as_view(), name='video-analysis'),
+    path('api/jobs/submit/<slug:kind>/', JobSubmit.as_view(), name='job-submit'),
+    path('api/jobs/<slug:job_id>/', JobStatus.as_view(), name='job-status'),
+    path('api/media/<slug:image_id>/', StoredImage.as_view(), name='stored-image'),
+    path('metrics', Metrics.as_view(), name='metrics'),
 ]
 
 if settings.DEBUG:
@@ -9,8 +9,22 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aipose.settings')
 
 application = get_wsgi_application()
+
+if settings.MODEL_WARMUP:
+    import logging
+    import time
+    from aipose.model_registry import registry
+
+    start = time.perf_counter()
+    registry.warm_up()
+    elapsed = time.perf_counter() - start
+    logger = logging.getLogger('myapp')
+    logger.info(f"Model warm-up finished in {elapsed:.2f}s")
+    if elapsed > settings.MODEL_LOAD_BUDGET_SECONDS:
+        logger.warning(f"Model warm-up exceeded the {settings.MODEL_LOAD_BUDGET_SECONDS:.0f}s budget")
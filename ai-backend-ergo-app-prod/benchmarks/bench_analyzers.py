@@ -0,0 +1,264 @@
+"""
+Per-analyzer micro-benchmarks, run in-process against a fixture corpus.
+
+Every stage runs in its own spawned process so cold start and peak RSS are
+measured from a clean interpreter. For each stage the report holds the cold
+start (construction plus first call), p50/p95/p99 latency, throughput and peak
+RSS. Results can be saved as a JSON baseline and later runs compared against
+it, failing when a metric regresses past the tolerance.
+
+Usage (from the project root):
+    python benchmarks/bench_analyzers.py --save benchmarks/baselines/local.json
+    python benchmarks/bench_analyzers.py --baseline benchmarks/baselines/local.json --tolerance 0.2
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Fixture corpus: sample uploads and the reference pictures of the AI report
+FIXTURE_GLOBS = [
+    os.path.join(PROJECT_DIR, 'media', 'images', '*'),
+    os.path.join(PROJECT_DIR, 'aipose', 'For AI report', '*'),
+]
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Metrics compared with the baseline, and whether a higher value is better
+COMPARED_METRICS = {
+    'cold_start_s': False,
+    'p50_ms': False,
+    'p95_ms': False,
+    'throughput_per_s': True,
+    'peak_rss_mb': False,
+}
+
+
+def _setup_django():
+    sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'aipose.settings')
+    import django
+    django.setup()
+
+
+def _decode():
+    from aipose.image_buffer import DecodedImage
+    return lambda data: DecodedImage.from_bytes(data).bgr
+
+
+def _decode_inference():
+    from aipose.image_buffer import DecodedImage
+    return lambda data: DecodedImage.from_bytes(data).inference_rgb
+
+
+def _seated_posture():
+    from aipose.bodypose import PoseAnalyzer
+    analyzer = PoseAnalyzer()
+    return analyzer.analyze_pose
+
+
+def _desk_posture():
+    from aipose.deskpose import DeskPoseAnalyzer
+    analyzer = DeskPoseAnalyzer()
+    return analyzer.analyze_pose
+
+
+def _hand_pose():
+    from aipose.handpose import HandPoseAnalyzer
+    analyzer = HandPoseAnalyzer()
+    return analyzer.analyze_hand_pose
+
+
+def _back_angle():
+    from aipose.BackAngle import AdvancedPostureAnalyzer
+    analyzer = AdvancedPostureAnalyzer()
+    return analyzer.analyze_image
+
+
+def _arm_screen():
+    from aipose.armpose import detect_arm_and_screen
+    return detect_arm_and_screen
+
+
+def _mask2former():
+    from aipose.segmentation import segment_objects
+    return segment_objects
+
+
+# Stage name to a setup function returning the callable under test. Every
+# stage except the decodes receives a DecodedImage, decoded outside the timing.
+STAGES = {
+    'decode': _decode,
+    'decode_inference': _decode_inference,
+    'seated_posture': _seated_posture,
+    'desk_posture': _desk_posture,
+    'hand_pose': _hand_pose,
+    'back_angle': _back_angle,
+    'arm_screen': _arm_screen,
+    'mask2former': _mask2former,
+}
+
+
+def fixture_paths():
+    paths = []
+    for pattern in FIXTURE_GLOBS:
+        paths.extend(path for path in sorted(glob.glob(pattern)) if path.lower().endswith(IMAGE_EXTENSIONS))
+    return paths
+
+
+def run_stage(stage, paths, iterations, warmup):
+    """Benchmarks one stage, meant to run in a fresh process.
+
+    Args:
+        stage (String): Key of STAGES
+        paths (List): Fixture images
+        iterations (int): Timed passes over the corpus
+        warmup (int): Untimed passes over the corpus after the cold start
+
+    Returns:
+        dict: Metrics of the stage, or an error message
+    """
+    _setup_django()
+    from aipose.detection import detector
+    from aipose.image_buffer import DecodedImage
+
+    # Measure the analyzers, not the per-image detection cache
+    detector.cache_size = 0
+
+    payloads = [open(path, 'rb').read() for path in paths]
+
+    def decoded(data):
+        image = DecodedImage.from_bytes(data)
+        image.bgr, image.inference_rgb
+        return image
+
+    def inputs():
+        if stage.startswith('decode'):
+            return list(payloads)
+        return [decoded(data) for data in payloads]
+
+    try:
+        start = time.perf_counter()
+        run = STAGES[stage]()
+        run(inputs()[0])
+        cold_start = time.perf_counter() - start
+
+        for _ in range(warmup):
+            for item in inputs():
+                run(item)
+
+        latencies = []
+        for _ in range(iterations):
+            for item in inputs():
+                start = time.perf_counter()
+                run(item)
+                latencies.append(time.perf_counter() - start)
+    except Exception as e:
+        return {'error': f"{type(e).__name__}: {e}"}
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'calls': len(latencies),
+        'cold_start_s': round(cold_start, 4),
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies_ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(latencies_ms, 99)), 3),
+        'throughput_per_s': round(len(latencies) / (latencies_ms.sum() / 1000), 3),
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Lists the metrics that regressed past the tolerance.
+
+    Args:
+        results (dict): Stage name to metrics of this run
+        baseline (dict): Stage name to metrics of the baseline run
+        tolerance (float): Allowed relative regression, 0.2 for 20%
+
+    Returns:
+        List: Human readable regressions, empty when the run is within tolerance
+    """
+    regressions = []
+    for stage, reference in baseline.items():
+        current = results.get(stage)
+        if current is None or 'error' in reference:
+            continue
+        if 'error' in current:
+            regressions.append(f"{stage}: failed ({current['error']})")
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = reference.get(metric), current.get(metric)
+            if not before or after is None:
+                continue
+            change = (before - after) / before if higher_is_better else (after - before) / before
+            if change > tolerance:
+                regressions.append(f"{stage}.{metric}: {before} -> {after} ({change:+.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--iterations', type=int, default=5, help='timed passes over the corpus')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed passes after the cold start')
+    parser.add_argument('--limit', type=int, help='use only the first N fixture images')
+    parser.add_argument('--save', help='write the results as a JSON baseline')
+    parser.add_argument('--baseline', help='compare with a saved baseline and fail on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative regression')
+    args = parser.parse_args()
+
+    paths = fixture_paths()[:args.limit]
+    if not paths:
+        parser.error('No fixture images found')
+    print(f"{len(paths)} fixture images, {args.iterations} iterations")
+
+    results = {}
+    context = multiprocessing.get_context('spawn')
+    for stage in args.stages:
+        with context.Pool(1) as pool:
+            results[stage] = pool.apply(run_stage, (stage, paths, args.iterations, args.warmup))
+        metrics = results[stage]
+        if 'error' in metrics:
+            print(f"{stage:16} error: {metrics['error']}")
+        else:
+            print(f"{stage:16} cold {metrics['cold_start_s']:7.2f}s  p50 {metrics['p50_ms']:8.1f}ms  "
+                  f"p95 {metrics['p95_ms']:8.1f}ms  p99 {metrics['p99_ms']:8.1f}ms  "
+                  f"{metrics['throughput_per_s']:7.1f}/s  rss {metrics['peak_rss_mb']:7.1f}MB")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as baseline_file:
+            json.dump({
+                'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                            'cpus': os.cpu_count()},
+                'fixtures': [os.path.relpath(path, PROJECT_DIR) for path in paths],
+                'iterations': args.iterations,
+                'stages': results,
+            }, baseline_file, indent=2)
+        print(f"Baseline saved to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline['stages'], args.tolerance)
+        if regressions:
+            print(f"Regressions past {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regression past {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Latency and spend of the Anthropic workspace analysis, measured against a local stub.
+
+Starts benchmarks/stub_anthropic.py in-process and sends --requests analyses
+of the fixture photos (so photos repeat once every fixture was sent) from
+--threads threads, twice:
+
+- naive: a new client per call and the full-size upload, as the first
+  version of the analysis did
+- shared: aipose.llm.analyze_workspace, with one client bounded to
+  LLM_MAX_CONCURRENCY requests, shrunk images and the answer cache
+
+Prints wall time, p50/p95 latency, API calls, 429 answers, peak concurrency
+seen by the stub, and input tokens and image bytes billed.
+
+Usage (from the project root):
+    python benchmarks/bench_llm.py
+    python benchmarks/bench_llm.py --requests 120 --threads 16 --latency-ms 300 --rate-limit 0.05
+"""
+
+import argparse
+import base64
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from bench_analyzers import _setup_django, fixture_paths
+from stub_anthropic import start
+
+
+def run(label, call, payloads, threads, state):
+    """Sends every payload through call from a thread pool and prints what the stub saw."""
+    with state.lock:
+        before = dict(state.stats)
+    latencies = []
+
+    def timed(data):
+        start_time = time.perf_counter()
+        call(data)
+        latencies.append((time.perf_counter() - start_time) * 1000)
+
+    start_time = time.perf_counter()
+    errors = 0
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for future in [executor.submit(timed, data) for data in payloads]:
+            try:
+                future.result()
+            except Exception:
+                errors += 1
+    wall = time.perf_counter() - start_time
+    with state.lock:
+        seen = {name: state.stats[name] - before[name] for name in before if name != 'peak_concurrency'}
+        peak = state.stats['peak_concurrency']
+        state.stats['peak_concurrency'] = 0
+    p50, p95 = np.percentile(latencies, [50, 95]) if latencies else (float('nan'), float('nan'))
+    print(f"{label:8s} wall {wall:6.2f}s  p50 {p50:7.1f}ms  p95 {p95:7.1f}ms  failed {errors:3d}  "
+          f"calls {seen['requests'] - seen['rate_limited']:4d}  429s {seen['rate_limited']:3d}  peak {peak:2d}  "
+          f"input tokens {seen['input_tokens']:8d}  image MB {seen['image_bytes'] / 1e6:7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=60, help='analyses per run')
+    parser.add_argument('--threads', type=int, default=16, help='concurrent callers')
+    parser.add_argument('--latency-ms', type=float, default=300, help='base latency of the stub')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='share of stub answers that are 429')
+    parser.add_argument('--stub-concurrency', type=int, default=8, help='requests the stub serves at once')
+    args = parser.parse_args()
+
+    server, state = start(latency_ms=args.latency_ms, rate_limit=args.rate_limit,
+                          max_concurrency=args.stub_concurrency)
+    os.environ['ANTHROPIC_BASE_URL'] = f"http://127.0.0.1:{server.server_port}"
+    os.environ.setdefault('ANTHROPIC_API_KEY', 'stub')
+    _setup_django()
+    import anthropic
+    from django.conf import settings
+    from aipose import llm
+    from aipose.image_buffer import DecodedImage
+
+    paths = fixture_paths()
+    if not paths:
+        parser.error('No fixture images found')
+    payloads = []
+    for index in range(args.requests):
+        with open(paths[index % len(paths)], 'rb') as image_file:
+            payloads.append(image_file.read())
+
+    def naive(data):
+        client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY, base_url=settings.ANTHROPIC_BASE_URL)
+        client.messages.create(model=settings.LLM_MODEL, max_tokens=settings.LLM_MAX_TOKENS, messages=[{
+            'role': 'user',
+            'content': [
+                {'type': 'text', 'text': llm.WORKSPACE_PROMPT},
+                {'type': 'image', 'source': {'type': 'base64', 'media_type': 'image/jpeg',
+                                             'data': base64.b64encode(data).decode()}},
+            ],
+        }])
+
+    print(f"{args.requests} analyses of {len(paths)} photos from {args.threads} threads, "
+          f"stub serving {args.stub_concurrency} at once, LLM_MAX_CONCURRENCY={settings.LLM_MAX_CONCURRENCY}")
+    run('naive', naive, payloads, args.threads, state)
+    run('shared', lambda data: llm.analyze_workspace(DecodedImage.from_bytes(data)), payloads, args.threads, state)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Cost of scoring a burst with the tracking graphs against one call per frame.
+
+Turns each fixture into a burst of --frames slightly shifted, noisy copies (a
+person sitting still in front of a handheld phone), then times the seated and
+desk posture checks on every frame through the single-image analyzers and on
+the whole burst through tracking.analyze_frames. Reports both latencies, the
+speedup and whether the smoothed verdicts match the majority of the
+single-image ones.
+
+Usage (from the project root):
+    python benchmarks/bench_tracking.py
+    python benchmarks/bench_tracking.py --frames 10 --interval-ms 100 --shift 3
+"""
+
+import argparse
+import time
+from collections import Counter
+
+import cv2
+import numpy as np
+
+from bench_analyzers import _setup_django, fixture_paths
+
+
+def make_burst(path, frames, shift, noise, rng):
+    """Encoded JPEG frames of one fixture, each shifted by up to `shift` pixels with grain added."""
+    image = cv2.imread(path, cv2.IMREAD_COLOR)
+    height, width = image.shape[:2]
+    burst = []
+    for _ in range(frames):
+        dx, dy = rng.uniform(-shift, shift, 2)
+        frame = cv2.warpAffine(image, np.float32([[1, 0, dx], [0, 1, dy]]), (width, height),
+                               borderMode=cv2.BORDER_REPLICATE)
+        frame = np.clip(frame + rng.normal(0, noise, frame.shape), 0, 255).astype(np.uint8)
+        burst.append(cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes())
+    return burst
+
+
+def majority(frame_verdicts):
+    """Most frequent verdict per position over the frames that could be scored."""
+    scored = [verdicts for verdicts in frame_verdicts if verdicts]
+    if not scored:
+        return None
+    return [Counter(column).most_common(1)[0][0] for column in zip(*scored)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=10, help='frames per burst')
+    parser.add_argument('--interval-ms', type=int, default=100, help='time between burst frames')
+    parser.add_argument('--shift', type=float, default=2.0, help='largest camera shake in pixels')
+    parser.add_argument('--noise', type=float, default=2.0, help='standard deviation of the sensor grain')
+    args = parser.parse_args()
+
+    _setup_django()
+    from aipose.bodypose import evaluate_landmarks as seated_rules
+    from aipose.deskpose import evaluate_landmarks as desk_rules
+    from aipose.image_buffer import DecodedImage
+    from aipose.landmarks import pose_landmarks
+    from aipose.model_registry import registry
+    from aipose.tracking import analyze_frames, burst_frames
+
+    paths = fixture_paths()
+    if not paths:
+        parser.error('No fixture images found')
+    registry.warm_up(['pose_complexity2', 'pose_tracking'])
+    rng = np.random.default_rng(0)
+    rules = {'seatedposture': seated_rules, 'deskposition': desk_rules}
+
+    single_ms, tracked_ms, mismatches = [], [], []
+    for path in paths:
+        burst = make_burst(path, args.frames, args.shift, args.noise, rng)
+
+        start = time.perf_counter()
+        frame_verdicts = {check: [] for check in rules}
+        for data in burst:
+            landmarks = pose_landmarks(DecodedImage.from_bytes(data))
+            for check, evaluate in rules.items():
+                frame_verdicts[check].append(evaluate(landmarks) if landmarks is not None else None)
+        single_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        images = [DecodedImage.from_bytes(data) for data in burst]
+        result = analyze_frames(burst_frames(images, args.interval_ms), list(rules))
+        tracked_ms.append((time.perf_counter() - start) * 1000)
+
+        for check in rules:
+            expected = majority(frame_verdicts[check])
+            smoothed = result[check]['verdicts'] if check in result else None
+            if expected != smoothed:
+                mismatches.append(f"{path.rsplit('/', 1)[-1]}/{check}: single {expected} tracked {smoothed}")
+
+    single_p50, tracked_p50 = np.percentile(single_ms, 50), np.percentile(tracked_ms, 50)
+    print(f"{len(paths)} bursts of {args.frames} frames")
+    print(f"single-image p50 {single_p50:8.1f}ms  tracked p50 {tracked_p50:8.1f}ms  speedup {single_p50 / tracked_p50:4.2f}x")
+    print(f"{len(mismatches)} of {len(paths) * len(rules)} smoothed verdicts differ from the per-frame majority")
+    for mismatch in mismatches:
+        print(f"  {mismatch}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+"""
+Parity check and benchmark of the optimized CPU inference backends.
+
+Loads the fp32 PyTorch reference and the optimized backend of each model side
+by side (YOLOv5s on onnxruntime, Mask2Former with INT8 dynamic quantization),
+runs both over the fixture corpus and compares their boxes: every box of one
+backend above --min-confidence must have a box with the same label in the
+other (down to --min-confidence minus --margin) overlapping it by at least
+--min-iou. Reports p50 latency of both backends and exits with status 1 when
+a box has no match.
+
+The models are only ever loaded from the checksummed bundle, and the bundle
+version and SHA-256 of every file a model loads are printed first, so a
+recorded result can be traced to the exact weights it ran against.
+
+Usage (from the project root, after `python manage.py export_models`):
+    python benchmarks/check_backends.py
+    python benchmarks/check_backends.py --models yolov5s --min-iou 0.9
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from bench_analyzers import _setup_django, fixture_paths
+
+# Model to (reference backend, optimized backend)
+MODELS = {
+    'yolov5s': ('torch', 'onnx'),
+    'mask2former': ('torch', 'int8'),
+}
+
+
+def iou(a, b):
+    width = min(a['x2'], b['x2']) - max(a['x1'], b['x1'])
+    height = min(a['y2'], b['y2']) - max(a['y1'], b['y1'])
+    if width <= 0 or height <= 0:
+        return 0.0
+    intersection = width * height
+    area = lambda box: (box['x2'] - box['x1']) * (box['y2'] - box['y1'])
+    return intersection / (area(a) + area(b) - intersection)
+
+
+def unmatched(boxes, candidates, min_confidence, margin, min_iou):
+    """Returns the confident boxes with no same-label candidate overlapping them enough, and the IoUs of the others."""
+    missing, overlaps = [], []
+    for box in boxes:
+        if box['score'] < min_confidence:
+            continue
+        best = max((iou(box, other) for other in candidates
+                    if other['label'] == box['label'] and other['score'] >= min_confidence - margin), default=0.0)
+        if best < min_iou:
+            missing.append(box)
+        else:
+            overlaps.append(best)
+    return missing, overlaps
+
+
+def yolo_runner(backend):
+    from aipose.detection import ObjectDetector
+    from aipose.model_registry import _load_yolov5s, registry
+
+    name = f"yolov5s_{backend}"
+    registry.register(name, lambda: _load_yolov5s(backend), pool_size=1)
+    detector = ObjectDetector(model_name=name, cache_size=0)
+
+    def run(image):
+        return [{'label': d['name'], 'score': d['confidence'],
+                 'x1': d['xmin'], 'y1': d['ymin'], 'x2': d['xmax'], 'y2': d['ymax']}
+                for d in detector.detect(image, classes=None)]
+    return run
+
+
+def mask2former_runner(backend):
+    from aipose.model_registry import registry
+    from aipose.segmentation import _load_mask2former, detect_object_boxes
+
+    registry.register('mask2former', lambda: _load_mask2former(backend), pool_size=1)
+    return lambda image: detect_object_boxes(image, min_score=0.0)
+
+
+RUNNERS = {'yolov5s': yolo_runner, 'mask2former': mask2former_runner}
+
+
+def model_files(model):
+    """Returns (path, sha256) of every bundle file the backends of a model load.
+
+    Raises:
+        ModelBundleError: Triggered when a file is missing, unpinned or does not match the manifest
+    """
+    from aipose.model_bundle import bundle_dir, exported_path, file_sha256, load_manifest, model_path
+
+    if model == 'yolov5s':
+        paths = [model_path('yolov5s'), exported_path('yolov5s', '.onnx')]
+    else:
+        from aipose.segmentation import SEGMENTATION_FILES
+        paths = [model_path(name) for name in SEGMENTATION_FILES]
+    # model_path already checked these against the manifest, the exported graph has no manifest entry
+    manifest = load_manifest()['models']
+    digests = {os.path.join(bundle_dir(), entry['file']): entry['sha256'] for entry in manifest.values()}
+    return [(path, digests.get(path) or file_sha256(path)) for path in paths]
+
+
+def run_backend(model, backend, images):
+    """Runs one backend over the corpus, returning its boxes per image and its latencies."""
+    run = RUNNERS[model](backend)
+    run(images[0][1])
+    boxes, latencies = {}, []
+    for name, image in images:
+        start = time.perf_counter()
+        boxes[name] = run(image)
+        latencies.append(time.perf_counter() - start)
+    return boxes, np.array(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--models', nargs='+', choices=list(MODELS), default=list(MODELS))
+    parser.add_argument('--min-confidence', type=float, default=0.5, help='boxes below this score are not required to match')
+    parser.add_argument('--margin', type=float, default=0.1, help='score slack allowed for the matching box')
+    parser.add_argument('--min-iou', type=float, default=0.85, help='overlap a matching box needs')
+    args = parser.parse_args()
+
+    _setup_django()
+    from aipose.image_buffer import DecodedImage
+    from aipose.model_bundle import ModelBundleError, load_manifest
+
+    paths = fixture_paths()
+    if not paths:
+        parser.error('No fixture images found')
+    images = [(path.rsplit('/', 1)[-1], DecodedImage.from_path(path)) for path in paths]
+    print(f"{len(images)} fixture images, model bundle {load_manifest()['version']}")
+
+    failures = []
+    for model in args.models:
+        reference_backend, optimized_backend = MODELS[model]
+        try:
+            for path, digest in model_files(model):
+                print(f"{model:12} {os.path.relpath(path)} sha256 {digest}")
+        except ModelBundleError as e:
+            failures.append(f"{model}: not run, the bundle is incomplete ({e})")
+            continue
+        try:
+            reference, reference_ms = run_backend(model, reference_backend, images)
+            optimized, optimized_ms = run_backend(model, optimized_backend, images)
+        except Exception as e:
+            failures.append(f"{model}: could not run ({type(e).__name__}: {e})")
+            continue
+
+        overlaps = []
+        for name, _ in images:
+            missing, matched = unmatched(reference[name], optimized[name], args.min_confidence, args.margin, args.min_iou)
+            extra, _ = unmatched(optimized[name], reference[name], args.min_confidence, args.margin, args.min_iou)
+            overlaps.extend(matched)
+            failures.extend(f"{model}/{name}: {box['label']} {box['score']:.2f} missing in {optimized_backend}" for box in missing)
+            failures.extend(f"{model}/{name}: {box['label']} {box['score']:.2f} only in {optimized_backend}" for box in extra)
+
+        reference_p50, optimized_p50 = np.percentile(reference_ms, 50), np.percentile(optimized_ms, 50)
+        print(f"{model:12} {reference_backend} p50 {reference_p50:8.1f}ms  {optimized_backend} p50 {optimized_p50:8.1f}ms  "
+              f"speedup {reference_p50 / optimized_p50:4.2f}x  {len(overlaps)} boxes matched, "
+              f"mean IoU {np.mean(overlaps) if overlaps else float('nan'):.3f}")
+
+    if failures:
+        print("Parity check failed:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("Boxes and labels match the fp32 models")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+Benchmark and verdict parity check for INFERENCE_LONG_EDGE.
+
+Runs the seated posture, desk posture and hand analyzers over the fixture
+corpus once per long edge, each configuration in a fresh process, and reports
+latency and peak RSS. The fixtures are upscaled to phone camera size
+(--upscale-to) first, so every input is larger than the long edges checked and
+really goes through the downscale. The reference is the verdicts on those same
+inputs at full resolution. The script exits with status 1 when a long edge
+changes the verdict of any analyzer on any image, or when an input would not be
+downscaled at all.
+
+Usage (from the project root):
+    python benchmarks/check_downscale.py
+    python benchmarks/check_downscale.py --long-edges 1280 960 640 --upscale-to 4032
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from bench_analyzers import _setup_django, fixture_paths
+
+ANALYZERS = ('seated_posture', 'desk_posture', 'hand_pose')
+
+
+def load_corpus(paths, upscale_to):
+    """Reads the fixtures, upscaled so their long edge is at least upscale_to.
+
+    Returns:
+        List: (name, encoded bytes, long edge in pixels) of each image
+    """
+    corpus = []
+    for path in paths:
+        data = open(path, 'rb').read()
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        scale = upscale_to / max(image.shape[:2])
+        if scale > 1:
+            size = (round(image.shape[1] * scale), round(image.shape[0] * scale))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_CUBIC)
+            data = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, 90])[1].tobytes()
+        corpus.append((os.path.basename(path), data, max(image.shape[:2])))
+    return corpus
+
+
+def _verdict(result):
+    # Rejected pictures come back as (message, points, visibility)
+    return result[0] if isinstance(result, tuple) else result
+
+
+def run_config(long_edge, corpus, analyzers, iterations):
+    """Runs the analyzers at one long edge, meant to run in a fresh process.
+
+    Args:
+        long_edge (int): INFERENCE_LONG_EDGE for this process
+        corpus (List): (name, encoded bytes, long edge) of each image
+        analyzers (List): Keys of ANALYZERS to run
+        iterations (int): Timed passes over the corpus
+
+    Returns:
+        dict: Verdicts per analyzer and image, latencies and peak RSS
+    """
+    os.environ['INFERENCE_LONG_EDGE'] = str(long_edge)
+    _setup_django()
+    from aipose.bodypose import PoseAnalyzer
+    from aipose.deskpose import DeskPoseAnalyzer
+    from aipose.handpose import HandPoseAnalyzer
+    from aipose.image_buffer import DecodedImage
+
+    factories = {
+        'seated_posture': lambda: PoseAnalyzer().analyze_pose,
+        'desk_posture': lambda: DeskPoseAnalyzer().analyze_pose,
+        'hand_pose': lambda: HandPoseAnalyzer().analyze_hand_pose,
+    }
+    results = {}
+    for analyzer in analyzers:
+        try:
+            run = factories[analyzer]()
+            verdicts = {name: _verdict(run(DecodedImage.from_bytes(data))) for name, data, _ in corpus}
+            latencies = []
+            for _ in range(iterations):
+                for _, data, _ in corpus:
+                    # A fresh decode per call, so the downscale is part of the measurement
+                    image = DecodedImage.from_bytes(data)
+                    start = time.perf_counter()
+                    run(image)
+                    latencies.append(time.perf_counter() - start)
+        except Exception as e:
+            results[analyzer] = {'error': f"{type(e).__name__}: {e}"}
+            continue
+        latencies_ms = np.array(latencies) * 1000
+        results[analyzer] = {
+            'verdicts': verdicts,
+            'p50_ms': round(float(np.percentile(latencies_ms, 50)), 1),
+            'p95_ms': round(float(np.percentile(latencies_ms, 95)), 1),
+        }
+    # ru_maxrss is in kilobytes on Linux
+    return {'analyzers': results, 'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+
+
+def _run(context, long_edge, corpus, args):
+    with context.Pool(1) as pool:
+        return pool.apply(run_config, (long_edge, corpus, args.analyzers, args.iterations))
+
+
+def _changed(reference, run):
+    """Lists, per analyzer and image, the verdicts of a run that differ from the reference run.
+
+    An analyzer that fails in either run counts as a change, it cannot be compared.
+    """
+    changed = []
+    for analyzer, metrics in run['analyzers'].items():
+        expected = reference['analyzers'][analyzer]
+        if 'error' in expected or 'error' in metrics:
+            changed.append(f"{analyzer}: {expected.get('error') or metrics.get('error')}")
+            continue
+        changed.extend(f"{analyzer}/{name}: {expected['verdicts'][name]!r} -> {verdict!r}"
+                       for name, verdict in metrics['verdicts'].items() if verdict != expected['verdicts'][name])
+    return changed
+
+
+def _print_run(label, run):
+    print(f"\n{label}: peak rss {run['peak_rss_mb']} MB")
+    for analyzer, metrics in run['analyzers'].items():
+        if 'error' in metrics:
+            print(f"  {analyzer:16} error: {metrics['error']}")
+        else:
+            print(f"  {analyzer:16} p50 {metrics['p50_ms']:8.1f}ms  p95 {metrics['p95_ms']:8.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--long-edges', nargs='+', type=int, default=[1280], help='long edges to check')
+    parser.add_argument('--upscale-to', type=int, default=4032, help='long edge the fixtures are upscaled to')
+    parser.add_argument('--analyzers', nargs='+', choices=ANALYZERS, default=list(ANALYZERS))
+    parser.add_argument('--iterations', type=int, default=3, help='timed passes over the corpus')
+    args = parser.parse_args()
+
+    paths = fixture_paths()
+    if not paths:
+        parser.error('No fixture images found')
+    corpus = load_corpus(paths, args.upscale_to)
+    # An input no larger than the long edge is never downscaled and would pass vacuously
+    too_small = [f"{name} ({size}px)" for name, _, size in corpus if size <= max(args.long_edges)]
+    if too_small:
+        parser.error(f"Inputs not larger than long edge {max(args.long_edges)}: {', '.join(too_small)}. "
+                     f"Raise --upscale-to.")
+    context = multiprocessing.get_context('spawn')
+    failures = []
+
+    reference = _run(context, 0, corpus, args)
+    _print_run(f"{len(corpus)} fixtures upscaled to {args.upscale_to}px, full resolution (reference)", reference)
+    total = sum(len(metrics.get('verdicts', ())) for metrics in reference['analyzers'].values())
+
+    for long_edge in args.long_edges:
+        run = _run(context, long_edge, corpus, args)
+        _print_run(f"long edge {long_edge}", run)
+        changed = _changed(reference, run)
+        print(f"  {total - len(changed)}/{total} verdicts unchanged")
+        for change in changed:
+            print(f"  changed {change}")
+        failures.extend(f"{long_edge}/{change}" for change in changed)
+
+    if failures:
+        print("\nParity check failed:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\nParity check passed")
+
+
+if __name__ == '__main__':
+    main()
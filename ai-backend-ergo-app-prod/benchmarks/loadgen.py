@@ -0,0 +1,219 @@
+"""
+Concurrent HTTP load generator for the analysis endpoints.
+
+Sends a weighted mix of endpoints over one pooled HTTP client, either open
+loop (Poisson arrivals at --rate requests per second, independent of how fast
+the server answers) or closed loop (--concurrency clients back to back).
+Response bodies are streamed and discarded; only status, latency and size are
+kept. Reports latency histograms, percentiles, error rate and throughput per
+endpoint.
+
+Usage (from the project root, against a local server by default):
+    python benchmarks/loadgen.py --profile seatedposture=3,assessment=1 --rate 5 --duration 60
+    python benchmarks/loadgen.py --base-url http://10.0.0.5:8000 --concurrency 8 --duration 30
+"""
+
+import argparse
+import asyncio
+import glob
+import json
+import os
+import random
+import time
+from collections import defaultdict
+
+import httpx
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Endpoint name to (path, multipart field of the upload)
+ENDPOINTS = {
+    'seatedposture': ('/api/images/seatedposture/', 'image_file'),
+    'handposition': ('/api/images/handposition/', 'image_file'),
+    'deskposition': ('/api/images/deskposition/', 'image_file'),
+    'back-angle': ('/api/analyze/back-angle/', 'image'),
+    'arm-screen': ('/api/analyze/arm-screen/', 'image'),
+    'check-quality': ('/api/preprocess/check-quality/', 'image'),
+    'assessment': ('/api/assessment/', 'image'),
+    'arm-screen-job': ('/api/jobs/submit/arm_screen/', 'image'),
+}
+
+DEFAULT_IMAGES = [
+    os.path.join(PROJECT_DIR, 'media', 'images', '*.jpg'),
+    os.path.join(PROJECT_DIR, 'aipose', 'For AI report', '*.jpg'),
+]
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+BUCKETS_MS = [25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, float('inf')]
+
+
+def parse_profile(profile):
+    """Parses 'name=weight,name=weight' into a dict of weights."""
+    weights = {}
+    for item in profile.split(','):
+        name, _, weight = item.partition('=')
+        if name not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint '{name}', use one of {', '.join(ENDPOINTS)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def load_corpus(patterns):
+    paths = sorted({path for pattern in patterns for path in glob.glob(pattern)})
+    if not paths:
+        raise SystemExit('No images found for the corpus')
+    return [(os.path.basename(path), open(path, 'rb').read()) for path in paths]
+
+
+class Stats:
+    """Per-endpoint outcomes, without response bodies."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.requests = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.bytes = defaultdict(int)
+        self.dropped = 0
+
+    def record(self, endpoint, latency, status=None, size=0, error=None):
+        self.requests[endpoint] += 1
+        if error is not None:
+            self.errors[endpoint] += 1
+            self.statuses[endpoint][error] += 1
+            return
+        self.latencies[endpoint].append(latency)
+        self.statuses[endpoint][status] += 1
+        self.bytes[endpoint] += size
+        if status >= 400:
+            self.errors[endpoint] += 1
+
+    def report(self, elapsed):
+        report = {}
+        for endpoint in sorted(self.requests):
+            latencies_ms = np.array(self.latencies[endpoint]) * 1000
+            total = self.requests[endpoint]
+            entry = {
+                'requests': total,
+                'errors': self.errors[endpoint],
+                'error_rate': round(self.errors[endpoint] / total, 4) if total else 0.0,
+                'throughput_per_s': round(len(latencies_ms) / elapsed, 3),
+                'mean_response_kb': round(self.bytes[endpoint] / max(1, len(latencies_ms)) / 1024, 1),
+                'statuses': {str(status): count for status, count in self.statuses[endpoint].items()},
+            }
+            if len(latencies_ms):
+                entry.update({
+                    'p50_ms': round(float(np.percentile(latencies_ms, 50)), 1),
+                    'p90_ms': round(float(np.percentile(latencies_ms, 90)), 1),
+                    'p99_ms': round(float(np.percentile(latencies_ms, 99)), 1),
+                    'max_ms': round(float(latencies_ms.max()), 1),
+                    'histogram': dict(zip(
+                        [f"<={bound:g}ms" for bound in BUCKETS_MS[:-1]] + [f">{BUCKETS_MS[-2]:g}ms"],
+                        np.histogram(latencies_ms, bins=[0] + BUCKETS_MS)[0].tolist())),
+                })
+            report[endpoint] = entry
+        return report
+
+
+async def send(client, stats, endpoint, corpus):
+    path, field = ENDPOINTS[endpoint]
+    name, data = random.choice(corpus)
+    start = time.perf_counter()
+    try:
+        size = 0
+        async with client.stream('POST', path, files={field: (name, data, 'image/jpeg')}) as response:
+            async for chunk in response.aiter_raw():
+                size += len(chunk)
+        stats.record(endpoint, time.perf_counter() - start, response.status_code, size)
+    except httpx.HTTPError as e:
+        stats.record(endpoint, time.perf_counter() - start, error=type(e).__name__)
+
+
+async def open_loop(client, stats, weights, corpus, rate, duration, max_in_flight):
+    """Starts requests at Poisson arrival times, whether or not earlier ones finished."""
+    names, probabilities = list(weights), np.array(list(weights.values())) / sum(weights.values())
+    in_flight = set()
+    deadline = time.perf_counter() + duration
+    next_arrival = time.perf_counter()
+    while next_arrival < deadline:
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        if len(in_flight) >= max_in_flight:
+            # The client is the bottleneck now, count it instead of queueing silently
+            stats.dropped += 1
+        else:
+            task = asyncio.ensure_future(send(client, stats, np.random.choice(names, p=probabilities), corpus))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        next_arrival += random.expovariate(rate)
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+
+async def closed_loop(client, stats, weights, corpus, concurrency, duration):
+    """Keeps `concurrency` requests outstanding, each client sending its next one on completion."""
+    names, probabilities = list(weights), np.array(list(weights.values())) / sum(weights.values())
+    deadline = time.perf_counter() + duration
+
+    async def user():
+        while time.perf_counter() < deadline:
+            await send(client, stats, np.random.choice(names, p=probabilities), corpus)
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+
+
+async def run(args):
+    weights = parse_profile(args.profile)
+    corpus = load_corpus(args.images or DEFAULT_IMAGES)
+    stats = Stats()
+    limits = httpx.Limits(max_connections=args.connections, max_keepalive_connections=args.connections)
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+
+    # One client for the whole run, so connections are reused across requests
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=timeout) as client:
+        start = time.perf_counter()
+        if args.rate:
+            await open_loop(client, stats, weights, corpus, args.rate, args.duration, args.max_in_flight)
+        else:
+            await closed_loop(client, stats, weights, corpus, args.concurrency, args.duration)
+        elapsed = time.perf_counter() - start
+    return stats, elapsed
+
+
+def print_report(report, elapsed, dropped):
+    print(f"Ran for {elapsed:.1f}s" + (f", {dropped} arrivals dropped at the in-flight limit" if dropped else ''))
+    for endpoint, entry in report.items():
+        print(f"\n{endpoint}: {entry['requests']} requests, {entry['error_rate']:.1%} errors, "
+              f"{entry['throughput_per_s']:.2f}/s, {entry['mean_response_kb']} KB/response")
+        print(f"  statuses {entry['statuses']}")
+        if 'p50_ms' in entry:
+            print(f"  p50 {entry['p50_ms']}ms  p90 {entry['p90_ms']}ms  p99 {entry['p99_ms']}ms  max {entry['max_ms']}ms")
+            peak = max(entry['histogram'].values()) or 1
+            for bucket, count in entry['histogram'].items():
+                print(f"  {bucket:>10} {count:6d} {'#' * round(40 * count / peak)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--profile', default='seatedposture', help='weighted endpoint mix, e.g. seatedposture=3,assessment=1')
+    parser.add_argument('--rate', type=float, help='open loop: mean arrivals per second')
+    parser.add_argument('--concurrency', type=int, default=4, help='closed loop: concurrent clients when --rate is not set')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to generate load for')
+    parser.add_argument('--connections', type=int, default=32, help='size of the HTTP connection pool')
+    parser.add_argument('--max-in-flight', type=int, default=256, help='open loop: outstanding requests before arrivals are dropped')
+    parser.add_argument('--timeout', type=float, default=120, help='per-request timeout in seconds')
+    parser.add_argument('--images', nargs='+', help='glob patterns of the image corpus')
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    stats, elapsed = asyncio.run(run(args))
+    report = stats.report(elapsed)
+    print_report(report, elapsed, stats.dropped)
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump({'elapsed_s': elapsed, 'dropped': stats.dropped, 'endpoints': report}, report_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
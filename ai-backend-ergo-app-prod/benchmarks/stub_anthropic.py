@@ -0,0 +1,163 @@
+"""
+Local stand-in for the Anthropic Messages API, to measure the LLM path offline.
+
+Answers POST /v1/messages with a canned workspace analysis after a delay that
+grows with the size of the image sent. Input tokens are counted the way the
+API bills images (width * height / 750) plus about one token per four
+characters of text. A share of requests (--rate-limit) gets a 429 with a
+retry-after header. Requests above --max-concurrency are also rejected with a
+429, so a client that does not bound its concurrency shows up as errors.
+GET /stats returns the counters: requests, rate limited, peak concurrency and
+tokens.
+
+Usage (from the project root):
+    python benchmarks/stub_anthropic.py --port 8765 --latency-ms 800 --rate-limit 0.05
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=stub python manage.py runserver
+"""
+
+import argparse
+import base64
+import io
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+ANALYSIS = (
+    "Workspace analysis:\n\n"
+    "1. Location of keyboard relative to table edges:\nCentred, about 10 cm from the front edge.\n\n"
+    "2. Location of mouse relative to table edges:\nRight of the keyboard, about 12 cm from the front edge.\n\n"
+    "3. Whether keyboard and mouse are aligned:\nYes, both sit at the same depth.\n\n"
+    "4. Approximate measurements and distances:\nKeyboard 45 cm wide, mouse 5 cm from the keyboard."
+)
+
+
+class StubState:
+    """Counters shared by the handler threads."""
+
+    def __init__(self, latency_ms, ms_per_megapixel, rate_limit, max_concurrency):
+        self.latency_ms = latency_ms
+        self.ms_per_megapixel = ms_per_megapixel
+        self.rate_limit = rate_limit
+        self.max_concurrency = max_concurrency
+        self.lock = threading.Lock()
+        self.active = 0
+        self.stats = {'requests': 0, 'rate_limited': 0, 'peak_concurrency': 0,
+                      'input_tokens': 0, 'output_tokens': 0, 'image_bytes': 0}
+
+
+def message_tokens(body):
+    """Input tokens and image pixels of a Messages API request body."""
+    tokens, pixels, image_bytes = 0, 0, 0
+    for message in body['messages']:
+        for block in message['content']:
+            if block['type'] == 'text':
+                tokens += len(block['text']) // 4
+            elif block['type'] == 'image':
+                data = base64.b64decode(block['source']['data'])
+                with Image.open(io.BytesIO(data)) as image:
+                    width, height = image.size
+                tokens += width * height // 750
+                pixels += width * height
+                image_bytes += len(data)
+    return tokens, pixels, image_bytes
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def reply(self, status, payload, headers=()):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path != '/stats':
+                return self.reply(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': self.path}})
+            with state.lock:
+                self.reply(200, dict(state.stats))
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            if self.path.rstrip('/') != '/v1/messages':
+                return self.reply(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': self.path}})
+            with state.lock:
+                state.stats['requests'] += 1
+                limited = state.active >= state.max_concurrency or random.random() < state.rate_limit
+                if limited:
+                    state.stats['rate_limited'] += 1
+                else:
+                    state.active += 1
+                    state.stats['peak_concurrency'] = max(state.stats['peak_concurrency'], state.active)
+            if limited:
+                return self.reply(429, {'type': 'error', 'error': {'type': 'rate_limit_error', 'message': 'Stub rate limit'}},
+                                  headers=[('retry-after', '0.2')])
+            try:
+                input_tokens, pixels, image_bytes = message_tokens(body)
+                output_tokens = len(ANALYSIS) // 4
+                time.sleep((state.latency_ms + state.ms_per_megapixel * pixels / 1e6) / 1000)
+                with state.lock:
+                    state.stats['input_tokens'] += input_tokens
+                    state.stats['output_tokens'] += output_tokens
+                    state.stats['image_bytes'] += image_bytes
+            finally:
+                with state.lock:
+                    state.active -= 1
+            self.reply(200, {
+                'id': f"msg_stub_{state.stats['requests']}",
+                'type': 'message',
+                'role': 'assistant',
+                'model': body['model'],
+                'content': [{'type': 'text', 'text': ANALYSIS}],
+                'stop_reason': 'end_turn',
+                'stop_sequence': None,
+                'usage': {'input_tokens': input_tokens, 'output_tokens': output_tokens},
+            })
+
+    return Handler
+
+
+def start(port=0, latency_ms=800, ms_per_megapixel=400, rate_limit=0.0, max_concurrency=16):
+    """Starts the stub on a background thread.
+
+    Returns:
+        tuple: (server, state); the URL is http://127.0.0.1:<server.server_port>
+    """
+    state = StubState(latency_ms, ms_per_megapixel, rate_limit, max_concurrency)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=800, help='base time to answer')
+    parser.add_argument('--ms-per-megapixel', type=float, default=400, help='extra time per megapixel of image')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='share of requests answered with a 429')
+    parser.add_argument('--max-concurrency', type=int, default=16, help='requests in flight before answering 429')
+    args = parser.parse_args()
+
+    server, _ = start(args.port, args.latency_ms, args.ms_per_megapixel, args.rate_limit, args.max_concurrency)
+    print(f"Stub Messages API on http://127.0.0.1:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,11 @@
 import streamlit as st
 import anthropic
-from PIL import Image
+from PIL import Image, ImageOps
 import io
 import base64
+import hashlib
 import os
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -16,10 +18,61 @@ if not ANTHROPIC_API_KEY:
     st.error("❌ API Key not found. Please set the ANTHROPIC_API_KEY environment variable.")
     st.stop()
 
-def format_analysis(response):
-    # Extract the text content from the response
-    text = response.content[0].text
-    
+# Same prompt and image budget as aipose/llm.py; bump PROMPT_VERSION when the prompt changes
+PROMPT_VERSION = 1
+PROMPT = """Please analyze this workspace image and provide:
+1. Location of keyboard relative to table edges
+2. Location of mouse relative to table edges
+3. Whether keyboard and mouse are aligned
+4. Approximate measurements and distances"""
+IMAGE_EDGE = int(os.getenv("LLM_IMAGE_EDGE", "1024"))
+IMAGE_QUALITY = int(os.getenv("LLM_IMAGE_QUALITY", "80"))
+
+@st.cache_resource
+def get_client():
+    # One client, and one connection pool, for every session of the app
+    return anthropic.Anthropic(api_key=ANTHROPIC_API_KEY, base_url=os.getenv("ANTHROPIC_BASE_URL") or None,
+                               max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")))
+
+@st.cache_resource
+def get_slots():
+    # Bounds the requests all sessions have in flight at once
+    return threading.BoundedSemaphore(int(os.getenv("LLM_MAX_CONCURRENCY", "4")))
+
+def prepare_image(image):
+    # Shrink and recompress before upload: tokens and latency grow with the pixel count
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    image.thumbnail((IMAGE_EDGE, IMAGE_EDGE), Image.LANCZOS)
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=IMAGE_QUALITY)
+    return buffered.getvalue()
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def analyze(image_digest, prompt_version, _image):
+    # Cached by upload hash and prompt version, so re-clicking does not call the API again
+    image_data = prepare_image(_image)
+    with get_slots():
+        message = get_client().messages.create(
+            model=os.getenv("LLM_MODEL", "claude-3-opus-20240229"),
+            max_tokens=1024,
+            messages=[{
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": PROMPT},
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": "image/jpeg",
+                            "data": base64.b64encode(image_data).decode()
+                        }
+                    }
+                ]
+            }]
+        )
+    return message.content[0].text
+
+def format_analysis(text):
     # Split into sections
     sections = text.split('\n\n')
     
@@ -57,47 +110,15 @@ def main():
         image = Image.open(uploaded_file)
         st.image(image, caption="Uploaded Image", use_column_width=True)
         
-        # Convert image to base64
-        buffered = io.BytesIO()
-        image.save(buffered, format=image.format)
-        img_str = base64.b64encode(buffered.getvalue()).decode()
-        
-        # Initialize Anthropic client
-        client = anthropic.Client(api_key=ANTHROPIC_API_KEY)
-        
         if st.button("Analyze Workspace"):
             with st.spinner("🔍 Analyzing your workspace..."):
                 try:
-                    # Call Claude API
-                    message = client.messages.create(
-                        model="claude-3-opus-20240229",
-                        max_tokens=1024,
-                        messages=[{
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": """Please analyze this workspace image and provide:
-                                    1. Location of keyboard relative to table edges
-                                    2. Location of mouse relative to table edges
-                                    3. Whether keyboard and mouse are aligned
-                                    4. Approximate measurements and distances"""
-                                },
-                                {
-                                    "type": "image",
-                                    "source": {
-                                        "type": "base64",
-                                        "media_type": "image/jpeg",
-                                        "data": img_str
-                                    }
-                                }
-                            ]
-                        }]
-                    )
+                    digest = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+                    text = analyze(digest, PROMPT_VERSION, image)
                     
                     # Display formatted results
                     st.success("✅ Analysis Complete!")
-                    format_analysis(message)
+                    format_analysis(text)
                     
                 except Exception as e:
                     st.error(f"❌ An error occurred: {str(e)}")